@@ -1,12 +1,26 @@
+import time
+import uuid
+script_start = time.perf_counter()  # for time-to-interactive
+
 import streamlit as st
 import cv2
 import numpy as np
 from pathlib import Path
-import time
 
+# TensorFlow is imported by the model store on first model load, not here,
+# so the page renders before the model is ready
 from models.tfhub_recognizer import TFHubExerciseRecognizer
+from models.model_store import MODEL_VARIANTS, preferred_variant, warm_up, model_status
 from models.exercise_analyzer import ExerciseAnalyzer
 from utils.video_processor import VideoProcessor
+from utils.av_encoder import OUTPUT_PROFILES, DEFAULT_OUTPUT_PROFILE
+from utils.analysis_store import load_analysis
+from utils.frame_source import CameraSource
+from utils.live_session import LiveSession
+from utils.resource_governor import get_governor
+from utils.latency_controller import LatencyController
+from utils.result_cache import get_result_cache, summarize_histories
+from utils.storage_manager import estimate_job_bytes, get_storage_manager, touch
 from exercise_standards import SUPPORTED_EXERCISES, EXERCISE_STANDARDS
 
 st.set_page_config(
@@ -253,6 +267,21 @@ if 'tfhub_recognizer' not in st.session_state:
     st.session_state.tfhub_recognizer = None
 if 'webcam_running' not in st.session_state:
     st.session_state.webcam_running = False
+if 'storage_owner' not in st.session_state:
+    st.session_state.storage_owner = uuid.uuid4().hex
+
+# Shared by every session in this process - sets the TF / OpenCV thread
+# limits before the first model loads
+governor = get_governor()
+
+# Finished analyses, shared by every session so duplicate submissions are answered from it
+result_cache = get_result_cache()
+
+# Keeps uploads, outputs and caches within the disk budget
+storage = get_storage_manager()
+
+# Variant the webcam loop falls back to when it misses its latency target
+WEBCAM_FAST_VARIANT = 'lightning'
 
 def main():
     st.markdown('<h1 class="main-header">🏋️ AI FITNESS TRAINER</h1>', unsafe_allow_html=True)
@@ -276,6 +305,46 @@ def main():
             help="Select the exercise you want to analyze"
         )
         
+        model_variant = st.selectbox(
+            "🧠 Pose Model",
+            list(MODEL_VARIANTS),
+            index=list(MODEL_VARIANTS).index(preferred_variant()),
+            format_func=lambda x: f"{x} ({MODEL_VARIANTS[x]['input_size']}px)",
+            help="Lightning and TFLite builds are faster, Thunder is the most accurate"
+        )
+        
+        use_cascade = st.checkbox(
+            "⚡ Cascade (Lightning first)",
+            value=False,
+            help="Run Lightning on every frame and re-run only low-confidence frames on the selected model"
+        )
+        track_person = st.checkbox(
+            "🎯 Track Person",
+            value=False,
+            help="Crop the model input around the athlete - lets smaller models keep detail on high-resolution video"
+        )
+        
+        output_profile = st.selectbox(
+            "🎞️ Output Quality",
+            list(OUTPUT_PROFILES),
+            index=list(OUTPUT_PROFILES).index(DEFAULT_OUTPUT_PROFILE),
+            format_func=lambda x: f"{x} ({OUTPUT_PROFILES[x]['max_height'] or 'source'}"
+                                  f"{'p' if OUTPUT_PROFILES[x]['max_height'] else ''})",
+            help="Resolution and quality of the analyzed video - web is small and quick to encode"
+        )
+        
+        model_config = {
+            'variant': model_variant,
+            'fast_variant': 'lightning' if use_cascade and model_variant != 'lightning' else None,
+            'track_person': track_person
+        }
+        
+        # Load and warm the selected model(s) in the background while the user picks a video
+        warm_up(model_config['variant'])
+        if model_config['fast_variant']:
+            warm_up(model_config['fast_variant'])
+        status_placeholder = st.empty()
+        
         st.markdown("---")
         
         st.markdown("### 📊 Supported Exercises")
@@ -316,18 +385,34 @@ def main():
                 </div>
             """, unsafe_allow_html=True)
         
-        if uploaded_file is not None:
-            temp_file = Path("/tmp") / uploaded_file.name
-            with open(temp_file, 'wb') as f:
-                f.write(uploaded_file.read())
-            
+        temp_file = get_uploaded_path(uploaded_file) if uploaded_file is not None else None
+        pin_session_files(temp_file)
+        
+        if temp_file is not None:
             st.markdown("### 🎬 Preview")
             st.video(str(temp_file))
             
             col1, col2, col3 = st.columns([1, 2, 1])
             with col2:
+                analysis_only = st.checkbox(
+                    "📊 Analysis only (render video later)",
+                    value=False,
+                    help="Count reps and check form without drawing the annotated video - "
+                         "roughly twice as fast, the video can be rendered afterwards"
+                )
+                skip_still = st.checkbox(
+                    "💤 Skip still frames",
+                    value=False,
+                    help="Reuse the last pose on frames where the athlete did not move - faster on videos "
+                         "with long pauses, but slow reps can be missed"
+                )
                 if st.button("🚀 ANALYZE VIDEO", use_container_width=True):
-                    process_video(str(temp_file), exercise_type)
+                    process_video(str(temp_file), exercise_type, model_config, output_profile, analysis_only,
+                                  motion_gate=skip_still)
+            
+            stored = st.session_state.get('stored_analysis')
+            if stored and stored['video_path'] == str(temp_file):
+                show_render_controls(stored, output_profile)
     
     else:  # Webcam mode
         st.markdown("## 🎥 Real-time Webcam Analysis")
@@ -347,172 +432,236 @@ def main():
         
         col1, col2, col3 = st.columns([1, 2, 1])
         with col2:
+            latency_target = st.slider(
+                "⏱️ Latency Target (ms)",
+                min_value=50,
+                max_value=500,
+                value=150,
+                step=10,
+                help="Capture-to-display latency to hold - model, frame size, overlay and display rate are reduced when it is missed"
+            )
             if st.button("🎬 START WEBCAM", use_container_width=True):
-                process_webcam_realtime(exercise_type)
+                process_webcam_realtime(exercise_type, model_config, latency_target)
+    
+    show_model_status(status_placeholder, model_config)
+
+def show_model_status(placeholder, model_config):
+    """Model readiness and time-to-interactive for the sidebar"""
+    if 'time_to_interactive' not in st.session_state:
+        st.session_state.time_to_interactive = time.perf_counter() - script_start
+        print(f"Time to interactive: {st.session_state.time_to_interactive:.2f}s")
+    
+    status = model_status(model_config['variant'])
+    if status['state'] == 'ready':
+        warmed = f" (warmed in {status['seconds']:.1f}s)" if status['seconds'] is not None else ""
+        model_text = f"✅ Model ready{warmed}"
+    elif status['state'] == 'loading':
+        model_text = f"⏳ Loading model... {status['seconds']:.0f}s"
+    elif status['state'] == 'error':
+        model_text = f"❌ Model failed to load: {status['error']}"
+    else:
+        model_text = "💤 Model not loaded"
+    
+    placeholder.caption(f"{model_text}  \n⚡ Interactive in {st.session_state.time_to_interactive:.2f}s")
+
+def get_uploaded_path(uploaded_file):
+    """Path of the stored upload - ingested once per uploaded file, not on every rerun"""
+    upload_id = getattr(uploaded_file, 'file_id', None) or (uploaded_file.name, uploaded_file.size)
+    uploads = st.session_state.setdefault('uploaded_paths', {})
+    path = uploads.get(upload_id)
+    if path is None or not Path(path).exists():
+        if not storage.ensure_free(uploaded_file.size):
+            st.error("❌ Not enough disk space for this video right now - please try again later")
+            return None
+        with st.spinner("📥 Saving upload..."):
+            path = st.session_state.video_processor.save_uploaded_file(uploaded_file)
+        if path is None:
+            st.error("❌ Could not save the uploaded video")
+            return None
+        uploads[upload_id] = path
+    else:
+        touch(path)
+    return Path(path)
 
-def process_webcam_realtime(exercise_type):
-    """Real-time webcam processing with improved UI"""
+def pin_session_files(*paths):
+    """Keep the files this session shows from eviction; forget results whose files are gone"""
+    st.session_state.processed_videos = [
+        video for video in st.session_state.processed_videos
+        if video['path'] is None or Path(video['path']).exists()
+    ]
+    stored = st.session_state.get('stored_analysis')
+    if stored and not Path(stored['analysis_path']).exists():
+        st.session_state.pop('stored_analysis')
+        stored = None
+    
+    viewed = [video['path'] for video in st.session_state.processed_videos[-1:]]
+    if stored:
+        viewed += [stored['analysis_path'], stored.get('rendered_path')]
+    storage.pin(st.session_state.storage_owner, viewed + [str(path) for path in paths if path])
+
+def get_recognizer(model_config=None):
+    """Reuse the session's recognizer, replacing it when the model settings changed
+    
+    Recognizers only hold per-session state; the models behind them are loaded
+    once per process and shared by all sessions.
+    """
+    model_config = model_config or {'variant': preferred_variant()}
+    
+    if (st.session_state.tfhub_recognizer is None
+            or st.session_state.get('recognizer_config') != model_config):
+        st.session_state.tfhub_recognizer = TFHubExerciseRecognizer(**model_config)
+        st.session_state.recognizer_config = dict(model_config)
+    
+    return st.session_state.tfhub_recognizer
+
+def process_webcam_realtime(exercise_type, model_config=None, latency_target_ms=150):
+    """Real-time webcam processing with improved UI
+    
+    Capture-to-display latency is measured for every shown frame. When it
+    misses latency_target_ms a LatencyController steps down the work per
+    frame (faster model, smaller frames, lower display
+    rate) and steps back up once there is headroom.
+    """
     st.markdown("---")
     st.markdown("## 🎥 Real-time Analysis")
     
+    model_config = model_config or {'variant': preferred_variant()}
+    fast_config = dict(model_config, variant=WEBCAM_FAST_VARIANT, fast_variant=None)
+    
+    requested_at = time.perf_counter()
     with st.spinner("🤖 Initializing AI Model..."):
-        if st.session_state.tfhub_recognizer is None:
-            st.session_state.tfhub_recognizer = TFHubExerciseRecognizer()
-        recognizer = st.session_state.tfhub_recognizer
+        # Returns at once when the background warm-up already finished
+        recognizer = get_recognizer(model_config)
         exercise_analyzer = ExerciseAnalyzer(exercise_type=exercise_type)
-        time.sleep(0.5)
+        # The controller's fallback model loads in the background
+        warm_up(fast_config['variant'])
     
     st.success("✅ Ready! Starting webcam...")
     
     video_placeholder = st.empty()
+    first_frame_text = st.empty()
     metrics_placeholder = st.empty()
+    latency_text = st.empty()
+    histogram_placeholder = st.empty()
     
-    cap = cv2.VideoCapture(0)
+    source = CameraSource(0)
     
-    if not cap.isOpened():
+    if not source.is_opened():
         st.error("❌ Cannot access webcam. Please check permissions.")
+        source.close()
         return
     
+    fast_recognizer = None
+    
+    def get_fast_recognizer():
+        # Fast-model levels switch over once the faster variant has finished loading
+        nonlocal fast_recognizer
+        if fast_config['variant'] == model_config['variant'] or model_status(fast_config['variant'])['state'] != 'ready':
+            return None
+        if fast_recognizer is None:
+            fast_recognizer = TFHubExerciseRecognizer(**fast_config)
+        return fast_recognizer
+    
+    # Capture, inference and drawing run on overlapping threads; this loop only displays
+    session = LiveSession(source, recognizer, exercise_analyzer, LatencyController(latency_target_ms),
+                          fast_recognizer=get_fast_recognizer)
+    controller = session.controller
     frame_count = 0
+    frame_rgb = None  # reused display buffer
     
+    frames = session.frames()
     try:
-        while cap.isOpened():
-            ret, frame = cap.read()
-            if not ret:
-                break
-            
-            # Extract keypoints
-            keypoints = recognizer.extract_keypoints(frame)
-            
-            if keypoints is not None:
-                # Calculate angles
-                angles = recognizer.calculate_angles(keypoints)
-                
-                # Analyze frame
-                feedback, _ = exercise_analyzer.analyze_frame(
-                    angles, 
-                    detected_exercise=exercise_type,
-                    confidence=1.0
-                )
-                
-                # Draw skeleton
-                frame = recognizer.draw_keypoints(frame, keypoints)
+        for frame, info in frames:
+            # Reduced display rates skip the conversion and the send to the browser
+            if info['display']:
+                # Convert BGR to RGB for display
+                if frame_rgb is not None and frame_rgb.shape != frame.shape:
+                    frame_rgb = None  # frame size changed with the level
+                frame_rgb = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB, dst=frame_rgb)
                 
-                # ✅ IMPROVED UI - Larger fonts, better layout, English only
-                h, w = frame.shape[:2]
+                # Display frame
+                video_placeholder.image(frame_rgb, channels="RGB", use_container_width=True)
+                if frame_count == 0:
+                    first_frame_after = time.perf_counter() - requested_at
+                    print(f"Time to first analyzed frame: {first_frame_after:.2f}s")
+                    first_frame_text.caption(f"⚡ First analyzed frame after {first_frame_after:.2f}s")
                 
-                # Draw semi-transparent background (taller)
-                overlay = frame.copy()
-                cv2.rectangle(overlay, (0, 0), (w, 300), (0, 0, 0), -1)
-                cv2.addWeighted(overlay, 0.7, frame, 0.3, 0, frame)
+                # Update metrics
+                stats = session.get_stats()
+                with metrics_placeholder.container():
+                    col1, col2, col3, col4 = st.columns(4)
+                    with col1:
+                        st.metric("Current Reps", exercise_analyzer.rep_count)
+                    with col2:
+                        st.metric("Frames Processed", frame_count)
+                    with col3:
+                        st.metric("Frames Skipped", stats['gate']['skipped'])
+                    with col4:
+                        st.metric("Frames Dropped", stats['capture']['dropped'])
                 
-                y_offset = 55
-                
-                # 1. Exercise Name (Largest, English only, uppercase)
-                exercise_names = {
-                    'squat': 'SQUAT',
-                    'pushup': 'PUSH-UP',
-                    'plank': 'PLANK',
-                    'lunges': 'LUNGES',
-                    'jumping_jacks': 'JUMPING JACKS',
-                    'situp': 'SIT-UP',
-                    'high_knees': 'HIGH KNEES',
-                    'burpees': 'BURPEES',
-                    'mountain_climbers': 'MOUNTAIN CLIMBERS',
-                    'side_plank': 'SIDE PLANK',
-                    'running': 'RUNNING',
-                    'crunches': 'CRUNCHES',
-                    'leg_raises': 'LEG RAISES',
-                    'bicycle_crunches': 'BICYCLE CRUNCHES',
-                    'standing_knee_raises': 'KNEE RAISES',
-                    'wall_sit': 'WALL SIT',
-                    'glute_bridge': 'GLUTE BRIDGE',
-                    'jumping': 'JUMPING',
-                    'star_jumps': 'STAR JUMPS',
-                    'squat_jumps': 'SQUAT JUMPS'
-                }
-                
-                name = exercise_names.get(exercise_type, exercise_type.upper())
-                cv2.putText(frame, name, (30, y_offset),
-                           cv2.FONT_HERSHEY_DUPLEX, 1.6, (255, 255, 0), 4, cv2.LINE_AA)
-                y_offset += 70
-                
-                # 2. Feedback Messages (Larger with icons and colors)
-                for key, message in feedback.items():
-                    if key in ['detected', 'reps']:
-                        continue
-                    
-                    # Choose color based on feedback
-                    if "Perfect" in message or "Good" in message or "Excellent" in message:
-                        color = (0, 255, 0)  # Green
-                        icon = "✓"
-                    elif "Watch" in message or "Adjust" in message or "Keep" in message:
-                        color = (0, 165, 255)  # Orange
-                        icon = "!"
-                    else:
-                        color = (0, 0, 255)  # Red
-                        icon = "✗"
-                    
-                    # Draw message with icon (larger)
-                    display_text = f"{icon} {message}"
-                    cv2.putText(frame, display_text, (30, y_offset),
-                               cv2.FONT_HERSHEY_DUPLEX, 1.15, color, 3, cv2.LINE_AA)
-                    y_offset += 52
-                
-                # 3. Rep Counter (Largest with green box)
-                if 'reps' in feedback:
-                    # Draw green box background
-                    cv2.rectangle(frame, (20, y_offset - 38), (300, y_offset + 12), 
-                                 (0, 255, 0), 3)
-                    cv2.rectangle(frame, (22, y_offset - 36), (298, y_offset + 10), 
-                                 (0, 120, 0), -1)
-                    
-                    # Draw REPS text (white, very large)
-                    cv2.putText(frame, feedback['reps'], (35, y_offset - 5),
-                               cv2.FONT_HERSHEY_DUPLEX, 1.6, (255, 255, 255), 4, cv2.LINE_AA)
-            
-            else:
-                # No pose detected
-                cv2.putText(frame, "NO POSE DETECTED", (30, 70),
-                           cv2.FONT_HERSHEY_DUPLEX, 1.4, (0, 0, 255), 4, cv2.LINE_AA)
-                cv2.putText(frame, "Please step into frame", (30, 120),
-                           cv2.FONT_HERSHEY_DUPLEX, 1.0, (255, 255, 255), 3, cv2.LINE_AA)
-            
-            # Convert BGR to RGB for display
-            frame_rgb = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
-            
-            # Display frame
-            video_placeholder.image(frame_rgb, channels="RGB", use_container_width=True)
-            
-            # Update metrics
-            with metrics_placeholder.container():
-                col1, col2 = st.columns(2)
-                with col1:
-                    st.metric("Current Reps", exercise_analyzer.rep_count)
-                with col2:
-                    st.metric("Frames Processed", frame_count)
+                show_latency(latency_text, controller)
+                if controller.histogram.total and controller.histogram.total % 90 == 0:
+                    show_latency_histogram(histogram_placeholder, controller)
             
             frame_count += 1
             
-            # Control frame rate (~30 FPS)
-            time.sleep(0.03)
-            
     except Exception as e:
         st.error(f"❌ Error: {str(e)}")
     finally:
-        cap.release()
+        frames.close()
         cv2.destroyAllWindows()
 
-def process_video(video_path, exercise_type):
+def show_latency(placeholder, controller):
+    """Current latency and degradation level of the webcam loop"""
+    stats = controller.get_stats()
+    level = f"level {stats['level']}: {stats['level_name']}" if stats['level'] else "full quality"
+    icon = "🟢" if stats['last_ms'] <= stats['target_ms'] else "🔴"
+    placeholder.caption(
+        f"{icon} Latency {stats['last_ms']:.0f} ms (p50 {stats['p50_ms']:.0f} / p90 {stats['p90_ms']:.0f} ms, "
+        f"target {stats['target_ms']:.0f} ms) | ⚙️ {level}"
+    )
+
+def show_latency_histogram(placeholder, controller):
+    import plotly.graph_objects as go
+    
+    histogram = controller.histogram
+    fig = go.Figure(go.Bar(x=histogram.labels(), y=histogram.counts, marker_color='#667eea'))
+    fig.update_layout(
+        title="Capture-to-Display Latency",
+        xaxis_title="Latency",
+        yaxis_title="Frames",
+        template='plotly_white',
+        height=250,
+        margin=dict(t=40, b=40)
+    )
+    placeholder.plotly_chart(fig, use_container_width=True)
+
+def process_video(video_path, exercise_type, model_config=None, output_profile=DEFAULT_OUTPUT_PROFILE,
+                  analysis_only=False, motion_gate=False):
     st.markdown("---")
     st.markdown("## 🔄 Analysis in Progress")
     
-    with st.spinner("🤖 Initializing TensorFlow Hub MoveNet..."):
-        if st.session_state.tfhub_recognizer is None:
-            st.session_state.tfhub_recognizer = TFHubExerciseRecognizer()
-        recognizer = st.session_state.tfhub_recognizer
+    # Same video, exercise, standards and settings as a finished analysis: show that one
+    model_config = model_config or {'variant': preferred_variant()}
+    result_key = result_cache.key(video_path, exercise_type,
+                                  dict(model_config, output_profile=output_profile,
+                                       analysis_only=analysis_only, motion_gate=motion_gate))
+    cached = result_cache.load(result_key)
+    if cached is not None:
+        show_cached_result(cached, video_path, exercise_type)
+        return
+    
+    # Room for the output is made before the job starts, never mid-encode
+    pin_session_files(video_path, result_cache.path(result_key, '.pose' if analysis_only else '.mp4'))
+    if not storage.ensure_free(estimate_job_bytes(video_path)):
+        st.error("❌ Not enough disk space to analyze this video right now - please try again later")
+        return
+    
+    requested_at = time.perf_counter()
+    with st.spinner("🤖 Initializing MoveNet..."):
+        # Returns at once when the background warm-up already finished
+        recognizer = get_recognizer(model_config)
         exercise_analyzer = ExerciseAnalyzer(exercise_type=exercise_type)
-        time.sleep(0.5)
     
     st.success("✅ AI Model Ready!")
     
@@ -521,25 +670,73 @@ def process_video(video_path, exercise_type):
     time_text = st.empty()
     
     start_time = time.time()
+    first_frame_after = None
     
     def update_progress(progress):
+        nonlocal first_frame_after
+        if first_frame_after is None:
+            # Click to first analyzed frame, including any wait for the model
+            first_frame_after = time.perf_counter() - requested_at
+            print(f"Time to first analyzed frame: {first_frame_after:.2f}s")
         progress_bar.progress(progress)
         elapsed = time.time() - start_time
         eta = (elapsed / progress * 100) - elapsed if progress > 0 else 0
         status_text.markdown(f"**Processing:** {progress}%")
         time_text.markdown(f"⏱️ **Elapsed:** {elapsed:.1f}s | **ETA:** {eta:.1f}s")
     
+    def show_queue_position(position):
+        status_text.markdown(f"**Queued:** waiting for a free slot ({position} analyses ahead)")
+    
+    def show_duplicate_wait():
+        status_text.markdown("**Waiting:** the same analysis is already running - its result will be shown")
+    
     try:
-        output_path, analysis_data = st.session_state.video_processor.process_video_tfhub(
-            video_path,
-            recognizer,
-            exercise_analyzer,
-            progress_callback=update_progress
-        )
+        # A duplicate submission waits for the running one instead of repeating it
+        with result_cache.claim(result_key, on_wait=show_duplicate_wait):
+            cached = result_cache.load(result_key)
+            if cached is not None:
+                progress_bar.progress(100)
+                show_cached_result(cached, video_path, exercise_type)
+                return
+            
+            # Waits here while the server already runs as many analyses as it has cores for
+            with governor.job(on_wait=show_queue_position) as budget:
+                start_time = time.time()
+                if analysis_only:
+                    analysis_path, analysis_data = st.session_state.video_processor.analyze_video(
+                        video_path,
+                        recognizer,
+                        exercise_analyzer,
+                        progress_callback=update_progress,
+                        motion_gate=motion_gate,
+                        analysis_path=result_cache.path(result_key, '.pose'),
+                        budget=budget
+                    )
+                    output_path = None
+                    st.session_state.stored_analysis = {
+                        'video_path': video_path,
+                        'analysis_path': analysis_path
+                    }
+                else:
+                    output_path, analysis_data = st.session_state.video_processor.process_video_tfhub(
+                        video_path,
+                        recognizer,
+                        exercise_analyzer,
+                        progress_callback=update_progress,
+                        motion_gate=motion_gate,
+                        output_profile=output_profile,
+                        output_path=result_cache.path(result_key, '.mp4'),
+                        budget=budget
+                    )
+                    analysis_path = None
+                    st.session_state.pop('stored_analysis', None)
+            
+            result_cache.save(result_key, analysis_data, output_path, analysis_path)
         
         progress_bar.progress(100)
         status_text.markdown("**Status:** ✅ Complete!")
-        time_text.markdown(f"⏱️ **Total Time:** {time.time() - start_time:.1f}s")
+        first_frame = f" | **First Frame:** {first_frame_after:.2f}s" if first_frame_after is not None else ""
+        time_text.markdown(f"⏱️ **Total Time:** {time.time() - start_time:.1f}s{first_frame}")
         
         st.session_state.processed_videos.append({
             'path': output_path,
@@ -555,6 +752,96 @@ def process_video(video_path, exercise_type):
         st.error(f"❌ **Error:** {str(e)}")
         st.exception(e)
 
+def show_cached_result(cached, video_path, exercise_type):
+    """Results of an identical earlier analysis, shown without running anything"""
+    st.success("♻️ This video was already analyzed with the same exercise and settings - showing that result")
+    
+    analysis_data = cached['analysis_data']
+    if cached['analysis_path']:
+        # The cache keeps no per-frame histories - an analysis-only result rebuilds them from its frames
+        analysis = load_analysis(cached['analysis_path'])
+        try:
+            analysis_data = dict(analysis.analysis_data(), **analysis_data)
+        finally:
+            analysis.close()
+        st.session_state.stored_analysis = {
+            'video_path': video_path,
+            'analysis_path': cached['analysis_path']
+        }
+    else:
+        st.session_state.pop('stored_analysis', None)
+    
+    st.session_state.processed_videos.append({
+        'path': cached['output_path'],
+        'reps': analysis_data['summary']['total_reps'],
+        'exercise': exercise_type,
+        'timestamp': time.time()
+    })
+    pin_session_files(video_path)
+    
+    display_results(cached['output_path'], analysis_data, exercise_type)
+
+def show_video(output_path):
+    st.markdown("### 🎥 Analyzed Video")
+    st.video(output_path)
+    
+    col_dl1, col_dl2, col_dl3 = st.columns([1, 2, 1])
+    with col_dl2:
+        with open(output_path, 'rb') as f:
+            st.download_button(
+                label="📥 DOWNLOAD VIDEO",
+                data=f,
+                file_name=Path(output_path).name,
+                mime="video/mp4",
+                use_container_width=True
+            )
+
+def show_render_controls(stored, output_profile):
+    """Render the annotated video, or a part of it, from a stored analysis"""
+    st.markdown("### 🎨 Render Annotated Video")
+    st.caption("Drawn from the stored keypoints - the model does not run again")
+    
+    analysis = load_analysis(stored['analysis_path'])
+    try:
+        duration = max(analysis.duration, 0.1)
+        start_time, end_time = st.slider(
+            "Time range (s)",
+            min_value=0.0,
+            max_value=duration,
+            value=(0.0, duration),
+            step=0.1
+        )
+        
+        if st.button("🎬 RENDER VIDEO", use_container_width=True):
+            # The source and the output are pinned while it is written and offered for download
+            output_path = st.session_state.video_processor.render_output_path(analysis, start_time, end_time)
+            stored['rendered_path'] = str(output_path)
+            pin_session_files(analysis.meta['video_path'])
+            if not storage.ensure_free(estimate_job_bytes(analysis.meta['video_path'])):
+                st.error("❌ Not enough disk space to render right now - please try again later")
+                return
+            progress_bar = st.progress(0)
+            start = time.time()
+            with st.spinner("Rendering..."), governor.job() as budget:
+                output_path, output = st.session_state.video_processor.render_analysis(
+                    analysis,
+                    start_time=start_time,
+                    end_time=end_time,
+                    output_profile=output_profile,
+                    output_path=output_path,
+                    progress_callback=progress_bar.progress,
+                    budget=budget
+                )
+            progress_bar.progress(100)
+            st.caption(
+                f"🎞️ Rendered {output['frames_written']} frames in {time.time() - start:.1f}s "
+                f"({output['encoder']} {output['width']}x{output['height']}, {output['file_size_mb']:.1f} MB)"
+            )
+            show_video(output_path)
+    finally:
+        # A fresh handle per rerun - close its file and memory map
+        analysis.close()
+
 def display_results(output_path, analysis_data, exercise_type):
     st.markdown("---")
     st.markdown("## 🎯 Analysis Results")
@@ -632,35 +919,47 @@ def display_results(output_path, analysis_data, exercise_type):
     
     st.markdown("<br/>", unsafe_allow_html=True)
     
-    st.markdown("### 🎥 Analyzed Video")
-    st.video(output_path)
+    if analysis_data.get('keypoint_cache') == 'hit':
+        st.caption("♻️ Keypoints reused from an earlier analysis of this video - MoveNet did not run")
     
-    col_dl1, col_dl2, col_dl3 = st.columns([1, 2, 1])
-    with col_dl2:
-        with open(output_path, 'rb') as f:
-            st.download_button(
-                label="📥 DOWNLOAD VIDEO",
-                data=f,
-                file_name=Path(output_path).name,
-                mime="video/mp4",
-                use_container_width=True
-            )
+    cascade = analysis_data.get('cascade')
+    if cascade:
+        st.caption(
+            f"⚡ Cascade {cascade['fast_variant']} → {cascade['accurate_variant']}: "
+            f"{cascade['escalation_rate']:.1f}% of frames escalated, "
+            f"{cascade['cost_ms_per_frame']:.1f} ms model time per frame"
+        )
+    
+    gate = analysis_data.get('gate')
+    if gate:
+        st.caption(
+            f"💤 Skipped MoveNet on {gate['skipped']} of {gate['frames']} frames "
+            f"({gate['skipped_static']} static, {gate['skipped_empty']} empty)"
+        )
+    
+    output = analysis_data.get('output')
+    if output:
+        st.caption(
+            f"🎞️ {output['encoder']} {output['width']}x{output['height']} @ {output['fps']:.2f} fps, "
+            f"{output['file_size_mb']:.1f} MB, encoded in {output['encode_time_s']:.1f}s"
+        )
+    
+    if output_path is not None:
+        show_video(output_path)
     
     st.markdown("### 💡 Performance Feedback")
     
-    if len(analysis_data['feedback_history']) > 0:
-        feedback_summary = {}
-        for feedback in analysis_data['feedback_history']:
-            for key, value in feedback.items():
-                if key not in ['reps']:
-                    if value not in feedback_summary:
-                        feedback_summary[value] = 0
-                    feedback_summary[value] += 1
-        
-        sorted_feedback = sorted(feedback_summary.items(), key=lambda x: x[1], reverse=True)
+    # Results from the result cache carry a summary instead of the per-frame histories
+    if 'feedback_history' in analysis_data:
+        history = summarize_histories(analysis_data, max_samples=None)
+    else:
+        history = analysis_data.get('history_summary') or summarize_histories({})
+    
+    if history['feedback_frames'] > 0:
+        sorted_feedback = sorted(history['feedback_counts'].items(), key=lambda x: x[1], reverse=True)
         
         for feedback, count in sorted_feedback[:5]:
-            percentage = (count / len(analysis_data['feedback_history'])) * 100
+            percentage = (count / history['feedback_frames']) * 100
             
             if "Perfect" in feedback or "Good" in feedback or "Excellent" in feedback:
                 css_class = "feedback-positive"
@@ -681,19 +980,15 @@ def display_results(output_path, analysis_data, exercise_type):
                 </div>
             """, unsafe_allow_html=True)
     
-    if len(analysis_data['angle_history']) > 0:
+    angle_series = history['angle_series']
+    if len(angle_series['frames']) > 0:
         st.markdown("### 📈 Joint Angle Analysis")
         
         import plotly.graph_objects as go
         
-        knee_angles = []
-        elbow_angles = []
-        
-        for angles in analysis_data['angle_history']:
-            knee_angles.append((angles.get('left_knee', 0) + angles.get('right_knee', 0)) / 2)
-            elbow_angles.append((angles.get('left_elbow', 0) + angles.get('right_elbow', 0)) / 2)
-        
-        frames = list(range(len(knee_angles)))
+        knee_angles = angle_series['knee']
+        elbow_angles = angle_series['elbow']
+        frames = angle_series['frames']
         
         fig = go.Figure()
         
@@ -15,6 +15,8 @@ REFERENCES:
 VALIDATED EXERCISES:
 Only exercises with established biomechanical standards and sufficient research data
 """
+import hashlib
+import json
 
 # Complete Exercise Standards with Research-Backed Thresholds
 EXERCISE_STANDARDS = {
@@ -541,6 +543,31 @@ EXERCISE_CATEGORIES = {
     'cardio': ['jumping_jacks', 'high_knees', 'burpees', 'mountain_climbers', 'squat_jumps']
 }
 
+# MoveNet keypoints each exercise's analysis depends on
+# 5/6: shoulders, 7/8: elbows, 9/10: wrists, 11/12: hips, 13/14: knees, 15/16: ankles
+_ARM_KEYPOINTS = [5, 6, 7, 8, 9, 10]
+_LEG_KEYPOINTS = [11, 12, 13, 14, 15, 16]
+_HIP_KEYPOINTS = [5, 6, 11, 12, 13, 14]
+
+EXERCISE_KEYPOINTS = {
+    'squat': _LEG_KEYPOINTS,
+    'lunges': _LEG_KEYPOINTS,
+    'glute_bridge': _HIP_KEYPOINTS,
+    'wall_sit': _LEG_KEYPOINTS,
+    'pushup': _ARM_KEYPOINTS + [11, 12, 13, 14],
+    'plank': _ARM_KEYPOINTS + [11, 12, 13, 14],
+    'side_plank': _HIP_KEYPOINTS,
+    'situp': _HIP_KEYPOINTS,
+    'crunches': _HIP_KEYPOINTS,
+    'leg_raises': _LEG_KEYPOINTS,
+    'bicycle_crunches': _LEG_KEYPOINTS,
+    'jumping_jacks': _ARM_KEYPOINTS,
+    'high_knees': _LEG_KEYPOINTS,
+    'burpees': _ARM_KEYPOINTS + _LEG_KEYPOINTS,
+    'mountain_climbers': _LEG_KEYPOINTS,
+    'squat_jumps': _LEG_KEYPOINTS
+}
+
 # Exercises by difficulty
 EXERCISES_BY_DIFFICULTY = {
     'beginner': ['squat', 'pushup', 'plank', 'lunges', 'jumping_jacks', 
@@ -578,6 +605,18 @@ def get_feedback_criteria(exercise_key):
         return exercise['feedback']
     return None
 
+def get_required_keypoints(exercise_key):
+    """Get the MoveNet keypoint indices an exercise's analysis relies on"""
+    return EXERCISE_KEYPOINTS.get(exercise_key, _ARM_KEYPOINTS + _LEG_KEYPOINTS)
+
+def get_standards_fingerprint(exercise_key):
+    """Short hash of an exercise's standards and required keypoints - changes with any threshold"""
+    entry = {
+        'standards': EXERCISE_STANDARDS.get(exercise_key),
+        'keypoints': get_required_keypoints(exercise_key)
+    }
+    return hashlib.sha1(json.dumps(entry, sort_keys=True, default=str).encode()).hexdigest()[:16]
+
 def get_exercises_by_category(category):
     """Get all exercises in a category"""
     return EXERCISE_CATEGORIES.get(category, [])
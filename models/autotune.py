@@ -0,0 +1,275 @@
+"""
+MoveNet runtime auto-tuner
+
+Benchmarks candidate runtime settings for the locally available variants on
+a fixed set of sample frames and writes the fastest accurate configuration to
+the tuning file that models.model_store applies when loading a model:
+
+    python -m models.autotune sample.mp4 [--frames 32] [--variants thunder thunder_f16 ...]
+
+Candidates cover TF intra/inter-op thread counts and batch size for SavedModel
+variants, and thread count and XNNPACK on/off for the float16 / int8 TFLite
+builds. TF thread pools are fixed once TensorFlow initializes, so every
+candidate process is a fresh spawn, run one at a time so measurements don't
+compete for cores.
+
+Accuracy is keypoint agreement with the reference (Thunder SavedModel,
+default settings): the share of confidently detected reference keypoints a
+candidate places within AGREEMENT_RADIUS of the frame size.
+"""
+import argparse
+import multiprocessing
+import os
+import sys
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+
+import cv2
+import numpy as np
+
+from models.model_store import (MODEL_VARIANTS, DEFAULT_VARIANT, DEFAULT_TUNING_FILE, get_variant_info,
+                                is_available, load_model, machine_fingerprint, save_tuning)
+
+REFERENCE_VARIANT = 'thunder'
+REFERENCE_SETTINGS = {}
+AGREEMENT_RADIUS = 0.05
+MIN_REFERENCE_SCORE = 0.3
+DEFAULT_BATCH_SIZES = (1, 4, 8)
+
+def sample_frames(video_path, num_frames=32):
+    """Evenly spaced frames from a video"""
+    cap = cv2.VideoCapture(str(video_path))
+    total = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
+    wanted = set(np.linspace(0, max(total - 1, 0), num_frames).astype(int).tolist())
+
+    # Read sequentially - frame seeking is not exact for every codec
+    frames = []
+    index = 0
+    while len(frames) < len(wanted):
+        ret, frame = cap.read()
+        if not ret:
+            break
+        if index in wanted:
+            frames.append(frame)
+        index += 1
+
+    cap.release()
+    return frames
+
+def model_inputs(frames, size):
+    """Frames as the recognizer feeds them to the model: whole frame, resized, RGB"""
+    batch = np.empty((len(frames), size, size, 3), dtype=np.uint8)
+    for i, frame in enumerate(frames):
+        batch[i] = cv2.cvtColor(cv2.resize(frame, (size, size)), cv2.COLOR_BGR2RGB)
+    return batch
+
+def keypoint_agreement(keypoints, reference):
+    """Share of confident reference keypoints that keypoints match within AGREEMENT_RADIUS"""
+    confident = reference[..., 2] > MIN_REFERENCE_SCORE
+    if not confident.any():
+        return 0.0
+    distance = np.linalg.norm(keypoints[..., :2] - reference[..., :2], axis=-1)
+    return float(np.mean(distance[confident] < AGREEMENT_RADIUS))
+
+def _time_model(model, inputs, batch_size, repeats):
+    """Keypoints for all inputs and the median seconds per frame over repeats"""
+    def run():
+        keypoints = np.empty((len(inputs), 17, 3), dtype=np.float32)
+        for start in range(0, len(inputs), batch_size):
+            keypoints[start:start + batch_size] = model.infer(inputs[start:start + batch_size])
+        return keypoints
+
+    # First pass traces graphs / sets up delegates and is not timed
+    keypoints = run()
+
+    times = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        run()
+        times.append(time.perf_counter() - start)
+
+    return keypoints, float(np.median(times)) / len(inputs)
+
+def benchmark_worker(inputs_path, variant, model_dir, settings_list, batch_sizes, repeats):
+    """
+    Worker process: time one variant under each runtime setting and batch size
+
+    Returns:
+        list of dicts with settings, batch_size, seconds_per_frame and keypoints
+    """
+    inputs = np.load(inputs_path)
+
+    results = []
+    for settings in settings_list:
+        model = load_model(variant, model_dir, allow_download=False, settings=settings)
+        for batch_size in batch_sizes:
+            keypoints, seconds = _time_model(model, inputs, batch_size, repeats)
+            results.append({
+                'settings': settings,
+                'batch_size': batch_size,
+                'seconds_per_frame': seconds,
+                'keypoints': keypoints
+            })
+        del model
+
+    return results
+
+def _in_fresh_process(fn, *args):
+    """Run fn in a new spawned process so TensorFlow starts uninitialized"""
+    with ProcessPoolExecutor(max_workers=1, mp_context=multiprocessing.get_context('spawn')) as executor:
+        return executor.submit(fn, *args).result()
+
+def _thread_counts():
+    cores = os.cpu_count() or 1
+    return sorted({1, max(1, cores // 2), cores})
+
+def candidate_runs(variant, batch_sizes=DEFAULT_BATCH_SIZES):
+    """
+    Candidate groups for a variant as (settings_list, batch_sizes) per process
+
+    SavedModel thread pools are process-wide, so each thread setting gets its
+    own process. TFLite interpreters take their settings per instance and
+    run frames one at a time, so one process covers all of them at batch 1.
+    """
+    if get_variant_info(variant)['format'] == 'tflite':
+        settings_list = [
+            {'num_threads': threads, 'use_xnnpack': use_xnnpack}
+            for threads in _thread_counts()
+            for use_xnnpack in (True, False)
+        ]
+        return [(settings_list, (1,))]
+
+    return [
+        ([{'intra_op_threads': intra, 'inter_op_threads': inter}], tuple(batch_sizes))
+        for intra in _thread_counts()
+        for inter in (1, 2)
+    ]
+
+def _describe(settings):
+    return ', '.join(f"{key}={value}" for key, value in settings.items()) or 'defaults'
+
+def tune(video_path, variants=None, num_frames=32, batch_sizes=DEFAULT_BATCH_SIZES, repeats=3,
+         min_agreement=0.9, model_dir=None, output_path=None):
+    """
+    Benchmark every candidate and write the tuning file
+
+    Args:
+        variants: variants to tune, default every variant in the local store
+        min_agreement: keypoint agreement a variant needs to be picked as the
+                       overall recommendation
+
+    Returns:
+        the tuning dict that was written
+    """
+    if not is_available(REFERENCE_VARIANT, model_dir):
+        raise FileNotFoundError(f"Reference model '{REFERENCE_VARIANT}' missing - "
+                                f"run: python -m models.model_store fetch {REFERENCE_VARIANT}")
+
+    variants = variants or [variant for variant in MODEL_VARIANTS if is_available(variant, model_dir)]
+    frames = sample_frames(video_path, num_frames)
+    if not frames:
+        raise ValueError(f"No frames could be read from {video_path}")
+
+    print(f"Tuning {', '.join(variants)} on {len(frames)} frames of {video_path}")
+
+    results = []
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        inputs_paths = {}
+        for size in {get_variant_info(variant)['input_size'] for variant in variants + [REFERENCE_VARIANT]}:
+            inputs_paths[size] = str(Path(tmp_dir) / f"inputs_{size}.npy")
+            np.save(inputs_paths[size], model_inputs(frames, size))
+
+        reference = _in_fresh_process(
+            benchmark_worker, inputs_paths[get_variant_info(REFERENCE_VARIANT)['input_size']],
+            REFERENCE_VARIANT, model_dir, [REFERENCE_SETTINGS], (1,), 1
+        )[0]['keypoints']
+
+        for variant in variants:
+            inputs_path = inputs_paths[get_variant_info(variant)['input_size']]
+            for settings_list, sizes in candidate_runs(variant, batch_sizes):
+                try:
+                    runs = _in_fresh_process(benchmark_worker, inputs_path, variant, model_dir,
+                                             settings_list, sizes, repeats)
+                except Exception as e:
+                    print(f"Error benchmarking {variant} ({_describe(settings_list[0])}): {e}")
+                    continue
+
+                for run in runs:
+                    result = {
+                        'variant': variant,
+                        'settings': run['settings'],
+                        'batch_size': run['batch_size'],
+                        'ms_per_frame': run['seconds_per_frame'] * 1000,
+                        'fps': 1.0 / max(run['seconds_per_frame'], 1e-9),
+                        'agreement': keypoint_agreement(run['keypoints'], reference)
+                    }
+                    results.append(result)
+                    print(f"{variant:16s} {_describe(result['settings']):40s} batch {result['batch_size']:2d}  "
+                          f"{result['ms_per_frame']:7.1f} ms/frame  {result['fps']:6.1f} fps  "
+                          f"agreement {result['agreement']:6.1%}")
+
+    tuning = build_tuning(results, min_agreement)
+    tuning['sample'] = {'video': str(video_path), 'frames': len(frames)}
+    path = save_tuning(tuning, output_path)
+
+    print(f"✅ Recommended variant: {tuning['variant']} - written to {path}")
+    return tuning
+
+def build_tuning(results, min_agreement=0.9):
+    """
+    Pick the fastest settings per variant and the fastest accurate variant overall
+
+    A variant's settings are chosen among its candidates that reach
+    min_agreement, or among all of them when none does - so the tuned
+    settings still apply if that variant is selected by hand.
+    """
+    variants = {}
+    for variant in dict.fromkeys(result['variant'] for result in results):
+        candidates = [result for result in results if result['variant'] == variant]
+        accepted = [result for result in candidates if result['agreement'] >= min_agreement]
+        best = min(accepted or candidates, key=lambda result: result['ms_per_frame'])
+
+        variants[variant] = dict(best['settings'])
+        variants[variant].update({
+            'batch_size': best['batch_size'],
+            'ms_per_frame': best['ms_per_frame'],
+            'fps': best['fps'],
+            'agreement': best['agreement'],
+            'accepted': bool(accepted)
+        })
+
+    accepted = [variant for variant, entry in variants.items() if entry['accepted']]
+    recommended = min(accepted, key=lambda variant: variants[variant]['ms_per_frame']) if accepted else DEFAULT_VARIANT
+
+    return {
+        'machine': machine_fingerprint(),
+        'tuned_at': time.strftime('%Y-%m-%d %H:%M:%S'),
+        'reference': REFERENCE_VARIANT,
+        'min_agreement': min_agreement,
+        'variant': recommended,
+        'variants': variants,
+        'results': results
+    }
+
+def main(argv):
+    parser = argparse.ArgumentParser(prog='python -m models.autotune',
+                                     description='Benchmark MoveNet runtime settings and save the fastest')
+    parser.add_argument('video', help='sample video to benchmark on')
+    parser.add_argument('--variants', nargs='+', choices=list(MODEL_VARIANTS),
+                        help='variants to tune (default: all in the local store)')
+    parser.add_argument('--frames', type=int, default=32, help='number of sample frames')
+    parser.add_argument('--batch-sizes', type=int, nargs='+', default=list(DEFAULT_BATCH_SIZES))
+    parser.add_argument('--repeats', type=int, default=3, help='timed passes per candidate')
+    parser.add_argument('--min-agreement', type=float, default=0.9,
+                        help='keypoint agreement with the reference a variant needs to be recommended')
+    parser.add_argument('--output', default=str(DEFAULT_TUNING_FILE), help='tuning file to write')
+    args = parser.parse_args(argv)
+
+    tune(args.video, args.variants, args.frames, args.batch_sizes, args.repeats,
+         args.min_agreement, output_path=args.output)
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv[1:]))
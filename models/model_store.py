@@ -0,0 +1,437 @@
+"""
+Local MoveNet model store
+
+Models are kept in a versioned directory so a cold process loads from disk
+instead of tfhub.dev:
+
+    <model_dir>/<variant>/<version>/saved_model.pb   (SavedModel variants)
+    <model_dir>/<variant>/<version>/model.tflite     (TFLite variants)
+
+Populate it once with:
+
+    python -m models.model_store fetch thunder lightning_f16
+
+TensorFlow is only imported when a model is actually loaded, so importing the
+store (e.g. for MODEL_VARIANTS) stays cheap.
+
+Runtime settings (TF thread counts, TFLite threads / XNNPACK, batch size)
+measured on this machine by `python -m models.autotune` are kept in
+<model_dir>/tuning.json (or $MOVENET_TUNING_FILE) and applied on load.
+"""
+import json
+import os
+import shutil
+import sys
+import tempfile
+import threading
+import time
+import urllib.request
+from pathlib import Path
+
+import numpy as np
+
+MODEL_VARIANTS = {
+    'lightning': {
+        'format': 'saved_model',
+        'input_size': 192,
+        'version': 4,
+        'url': 'https://tfhub.dev/google/movenet/singlepose/lightning/4'
+    },
+    'thunder': {
+        'format': 'saved_model',
+        'input_size': 256,
+        'version': 4,
+        'url': 'https://tfhub.dev/google/movenet/singlepose/thunder/4'
+    },
+    'lightning_f16': {
+        'format': 'tflite',
+        'input_size': 192,
+        'version': 4,
+        'url': 'https://tfhub.dev/google/lite-model/movenet/singlepose/lightning/tflite/float16/4?lite-format=tflite'
+    },
+    'lightning_int8': {
+        'format': 'tflite',
+        'input_size': 192,
+        'version': 4,
+        'url': 'https://tfhub.dev/google/lite-model/movenet/singlepose/lightning/tflite/int8/4?lite-format=tflite'
+    },
+    'thunder_f16': {
+        'format': 'tflite',
+        'input_size': 256,
+        'version': 4,
+        'url': 'https://tfhub.dev/google/lite-model/movenet/singlepose/thunder/tflite/float16/4?lite-format=tflite'
+    },
+    'thunder_int8': {
+        'format': 'tflite',
+        'input_size': 256,
+        'version': 4,
+        'url': 'https://tfhub.dev/google/lite-model/movenet/singlepose/thunder/tflite/int8/4?lite-format=tflite'
+    }
+}
+
+DEFAULT_VARIANT = 'thunder'
+DEFAULT_MODEL_DIR = Path(os.environ.get('MOVENET_MODEL_DIR', Path(__file__).parent / 'artifacts'))
+DEFAULT_TUNING_FILE = Path(os.environ.get('MOVENET_TUNING_FILE', DEFAULT_MODEL_DIR / 'tuning.json'))
+
+def get_variant_info(variant):
+    """Get the store entry for a model variant"""
+    if variant not in MODEL_VARIANTS:
+        raise ValueError(f"Unknown model variant '{variant}'. Choose from: {', '.join(MODEL_VARIANTS)}")
+    return MODEL_VARIANTS[variant]
+
+def model_path(variant, model_dir=None):
+    """Local path of a variant's artifact (may not exist yet)"""
+    info = get_variant_info(variant)
+    version_dir = Path(model_dir or DEFAULT_MODEL_DIR) / variant / str(info['version'])
+    if info['format'] == 'tflite':
+        return version_dir / 'model.tflite'
+    return version_dir
+
+def is_available(variant, model_dir=None):
+    """Check whether a variant is already in the local store"""
+    path = model_path(variant, model_dir)
+    if get_variant_info(variant)['format'] == 'tflite':
+        return path.is_file()
+    return (path / 'saved_model.pb').is_file()
+
+def fetch_model(variant, model_dir=None):
+    """Download a variant into the local store (no-op if already present)"""
+    info = get_variant_info(variant)
+    path = model_path(variant, model_dir)
+
+    if is_available(variant, model_dir):
+        return path
+
+    print(f"Fetching MoveNet '{variant}' into {path}...")
+    path.parent.mkdir(parents=True, exist_ok=True)
+
+    # Download next to the target and rename, so a crash never leaves a half-written model
+    if info['format'] == 'tflite':
+        fd, tmp_path = tempfile.mkstemp(dir=path.parent, suffix='.tmp')
+        os.close(fd)
+        urllib.request.urlretrieve(info['url'], tmp_path)
+        os.replace(tmp_path, path)
+    else:
+        import tensorflow_hub as hub
+        cached = hub.resolve(info['url'])
+        tmp_dir = Path(tempfile.mkdtemp(dir=path.parent))
+        shutil.copytree(cached, tmp_dir / 'model')
+        os.replace(tmp_dir / 'model', path)
+        tmp_dir.rmdir()
+
+    return path
+
+_tuning_cache = {}
+
+def machine_fingerprint():
+    """Hardware the tuning results are valid for"""
+    import platform
+    return {
+        'cpu_count': os.cpu_count(),
+        'processor': platform.processor() or platform.machine(),
+        'system': platform.system()
+    }
+
+def load_tuning(path=None):
+    """
+    Tuned settings written by models.autotune, or None
+
+    Results measured on different hardware are ignored, so one image can be
+    deployed to mixed machines and each re-tunes itself.
+    """
+    path = Path(path or DEFAULT_TUNING_FILE)
+    if not path.is_file():
+        return None
+
+    # Re-read only when the file changed
+    mtime = path.stat().st_mtime
+    cached = _tuning_cache.get(path)
+    if cached is not None and cached[0] == mtime:
+        return cached[1]
+
+    try:
+        with open(path) as f:
+            tuning = json.load(f)
+    except (OSError, ValueError) as e:
+        print(f"Ignoring unreadable tuning file {path}: {e}")
+        tuning = None
+
+    if tuning is not None and tuning.get('machine') != machine_fingerprint():
+        print(f"Ignoring {path}: tuned on different hardware")
+        tuning = None
+
+    _tuning_cache[path] = (mtime, tuning)
+    return tuning
+
+def save_tuning(tuning, path=None):
+    """Write tuned settings atomically"""
+    path = Path(path or DEFAULT_TUNING_FILE)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=path.parent, suffix='.tmp')
+    with os.fdopen(fd, 'w') as f:
+        json.dump(tuning, f, indent=2)
+    os.replace(tmp_path, path)
+    return path
+
+def tuned_settings(variant):
+    """Tuned runtime settings for a variant ({} when untuned)"""
+    tuning = load_tuning()
+    if tuning is None:
+        return {}
+    return dict(tuning.get('variants', {}).get(variant, {}))
+
+def preferred_variant():
+    """Fastest variant that passed the tuner's accuracy check, else DEFAULT_VARIANT"""
+    tuning = load_tuning()
+    if tuning is None or tuning.get('variant') not in MODEL_VARIANTS:
+        return DEFAULT_VARIANT
+    return tuning['variant']
+
+_thread_limits = {}
+
+def set_thread_limits(intra_op_threads=None, inter_op_threads=None, num_threads=None):
+    """
+    Cap the thread settings models load with (see utils.resource_governor)
+
+    Applies to tuned / default settings; explicit settings passed to
+    load_model (the auto-tuner's candidates) are used as given.
+    """
+    _thread_limits.update({
+        'intra_op_threads': intra_op_threads,
+        'inter_op_threads': inter_op_threads,
+        'num_threads': num_threads
+    })
+
+def _limit_threads(settings):
+    settings = dict(settings)
+    for key, limit in _thread_limits.items():
+        if limit:
+            settings[key] = min(settings.get(key) or limit, limit)
+    return settings
+
+def _set_tf_threads(intra_op_threads=None, inter_op_threads=None):
+    """
+    Apply TF thread pools; only possible before TensorFlow runs its first op
+
+    Pools the process already configured itself (e.g. a shard worker limited
+    to its share of the cores) are left alone.
+    """
+    import tensorflow as tf
+    try:
+        if intra_op_threads and not tf.config.threading.get_intra_op_parallelism_threads():
+            tf.config.threading.set_intra_op_parallelism_threads(intra_op_threads)
+        if inter_op_threads and not tf.config.threading.get_inter_op_parallelism_threads():
+            tf.config.threading.set_inter_op_parallelism_threads(inter_op_threads)
+    except RuntimeError:
+        # TensorFlow was already initialized by an earlier model - keep its pools
+        print("TF thread settings not applied: TensorFlow already initialized")
+
+class SavedModelMoveNet:
+    """MoveNet SavedModel runner"""
+    def __init__(self, variant, path, intra_op_threads=None, inter_op_threads=None):
+        import tensorflow as tf
+        _set_tf_threads(intra_op_threads, inter_op_threads)
+
+        self.variant = variant
+        self.input_size = get_variant_info(variant)['input_size']
+
+        self.model = tf.saved_model.load(str(path))
+        self.movenet = self.model.signatures['serving_default']
+
+        # Compiled with a fixed input signature so every call reuses one traced
+        # graph. Input stays uint8 and is cast to int32 inside the graph.
+        size = self.input_size
+        self._infer_single = tf.function(
+            self._run_single,
+            input_signature=[tf.TensorSpec([1, size, size, 3], tf.uint8)]
+        )
+        # SinglePose signatures take a batch of one, so batched inference maps
+        # the signature over the batch inside a single compiled graph call
+        self._infer_batch = tf.function(
+            self._run_batch,
+            input_signature=[tf.TensorSpec([None, size, size, 3], tf.uint8)]
+        )
+
+    def _run_single(self, batch):
+        import tensorflow as tf
+        return self.movenet(tf.cast(batch, dtype=tf.int32))['output_0'][:, 0]
+
+    def _run_batch(self, batch):
+        import tensorflow as tf
+        return tf.map_fn(
+            lambda img: self.movenet(tf.cast(tf.expand_dims(img, axis=0), dtype=tf.int32))['output_0'][0, 0],
+            batch,
+            fn_output_signature=tf.float32,
+            parallel_iterations=8
+        )
+
+    def infer(self, batch):
+        """Run a uint8 (N, size, size, 3) RGB batch, returning (N, 17, 3) keypoints"""
+        if len(batch) == 1:
+            return self._infer_single(batch).numpy()
+        return self._infer_batch(batch).numpy()
+
+class TFLiteMoveNet:
+    """MoveNet TFLite (float16 / int8) runner
+
+    use_xnnpack=False runs the builtin kernels without the default XNNPACK delegate
+    """
+    def __init__(self, variant, path, num_threads=None, use_xnnpack=True):
+        import tensorflow as tf
+
+        self.variant = variant
+        self.input_size = get_variant_info(variant)['input_size']
+
+        resolver = (tf.lite.experimental.OpResolverType.AUTO if use_xnnpack
+                    else tf.lite.experimental.OpResolverType.BUILTIN_WITHOUT_DEFAULT_DELEGATES)
+        self.interpreter = tf.lite.Interpreter(model_path=str(path), num_threads=num_threads,
+                                               experimental_op_resolver_type=resolver)
+        self.interpreter.allocate_tensors()
+        self._input_index = self.interpreter.get_input_details()[0]['index']
+        self._output_index = self.interpreter.get_output_details()[0]['index']
+
+        # An interpreter has a single set of input/output tensors, so calls from
+        # different threads take turns
+        self._lock = threading.Lock()
+
+    def infer(self, batch):
+        """Run a uint8 (N, size, size, 3) RGB batch, returning (N, 17, 3) keypoints"""
+        keypoints = np.empty((len(batch), 17, 3), dtype=np.float32)
+        with self._lock:
+            for i in range(len(batch)):
+                # Write straight into the interpreter's input tensor instead of set_tensor's copy.
+                # Tensor views must not outlive invoke(), so they are fetched fresh each time.
+                np.copyto(self.interpreter.tensor(self._input_index)()[0], batch[i], casting='unsafe')
+                self.interpreter.invoke()
+                keypoints[i] = self.interpreter.tensor(self._output_index)()[0, 0]
+        return keypoints
+
+def load_model(variant=DEFAULT_VARIANT, model_dir=None, allow_download=True, settings=None):
+    """
+    Load a MoveNet variant from the local store
+
+    Args:
+        allow_download: fetch the variant into the store if it is missing;
+                        with False a missing model raises FileNotFoundError
+        settings: runtime settings (intra_op_threads / inter_op_threads for
+                  SavedModels, num_threads / use_xnnpack for TFLite); None
+                  uses the tuned settings for this machine, if any, within
+                  the limits of set_thread_limits
+    """
+    info = get_variant_info(variant)
+
+    if not is_available(variant, model_dir):
+        if not allow_download:
+            raise FileNotFoundError(f"MoveNet '{variant}' not found in {model_path(variant, model_dir)}")
+        fetch_model(variant, model_dir)
+
+    if settings is None:
+        settings = _limit_threads(tuned_settings(variant))
+
+    path = model_path(variant, model_dir)
+    if info['format'] == 'tflite':
+        return TFLiteMoveNet(variant, path, settings.get('num_threads'), settings.get('use_xnnpack', True))
+    return SavedModelMoveNet(variant, path, settings.get('intra_op_threads'), settings.get('inter_op_threads'))
+
+_shared_models = {}
+_load_locks = {}
+_warmup_status = {}
+_shared_lock = threading.Lock()
+
+def _model_key(variant, model_dir):
+    return (variant, str(Path(model_dir or DEFAULT_MODEL_DIR).resolve()))
+
+def get_shared_model(variant=DEFAULT_VARIANT, model_dir=None):
+    """
+    Process-wide model instance for a variant, loaded on first use
+
+    Every recognizer in the process (one per browser session, worker thread,
+    ...) shares the same weights instead of loading its own copy. Both
+    runners are safe to call from several threads at once. A caller asking
+    for a model that is still loading (e.g. by warm_up) waits for that load.
+    """
+    key = _model_key(variant, model_dir)
+    with _shared_lock:
+        model = _shared_models.get(key)
+        if model is not None:
+            return model
+        load_lock = _load_locks.setdefault(key, threading.Lock())
+
+    # Loads of different variants don't wait on each other
+    with load_lock:
+        with _shared_lock:
+            model = _shared_models.get(key)
+        if model is None:
+            print(f"Loading MoveNet {variant} model...")
+            model = load_model(variant, model_dir)
+            with _shared_lock:
+                _shared_models[key] = model
+            print("✅ Model loaded successfully!")
+    return model
+
+def warm_up(variant=DEFAULT_VARIANT, model_dir=None):
+    """
+    Load a shared model and run dummy inferences on a background thread
+
+    Returns immediately; poll model_status() for progress. Calling it again
+    for a variant that is loading or loaded does nothing.
+    """
+    key = _model_key(variant, model_dir)
+    with _shared_lock:
+        if key in _warmup_status:
+            return
+        _warmup_status[key] = {'state': 'loading', 'started': time.perf_counter(), 'seconds': None, 'error': None}
+
+    threading.Thread(target=_warm_up, args=(variant, model_dir, key), name=f"warmup-{variant}", daemon=True).start()
+
+def _warm_up(variant, model_dir, key):
+    status = _warmup_status[key]
+    try:
+        model = get_shared_model(variant, model_dir)
+        # Trace / allocate both the single-frame and the batched path
+        size = model.input_size
+        model.infer(np.zeros((1, size, size, 3), dtype=np.uint8))
+        model.infer(np.zeros((2, size, size, 3), dtype=np.uint8))
+        status['state'] = 'ready'
+    except Exception as e:
+        print(f"Error warming up MoveNet {variant}: {e}")
+        status['error'] = str(e)
+        status['state'] = 'error'
+    status['seconds'] = time.perf_counter() - status['started']
+
+def model_status(variant=DEFAULT_VARIANT, model_dir=None):
+    """
+    Load state of a shared model, cheap enough to poll from a UI
+
+    Returns:
+        dict with 'state' ('cold', 'loading', 'ready' or 'error'), 'seconds'
+        (warm-up duration once finished, elapsed time while loading) and 'error'
+    """
+    key = _model_key(variant, model_dir)
+    with _shared_lock:
+        status = _warmup_status.get(key)
+        loaded = key in _shared_models
+
+    if status is None:
+        return {'state': 'ready' if loaded else 'cold', 'seconds': None, 'error': None}
+    if status['state'] == 'loading':
+        return {'state': 'loading', 'seconds': time.perf_counter() - status['started'], 'error': None}
+    return {'state': status['state'], 'seconds': status['seconds'], 'error': status['error']}
+
+def main(argv):
+    if len(argv) < 1 or argv[0] not in ('fetch', 'list'):
+        print("Usage: python -m models.model_store fetch <variant> [<variant> ...] | list")
+        return 1
+
+    if argv[0] == 'list':
+        for variant, info in MODEL_VARIANTS.items():
+            status = 'available' if is_available(variant) else 'missing'
+            print(f"{variant:16s} {info['format']:12s} {info['input_size']}px  v{info['version']}  {status}")
+        return 0
+
+    for variant in argv[1:] or [DEFAULT_VARIANT]:
+        print(f"✅ {variant}: {fetch_model(variant)}")
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv[1:]))
@@ -0,0 +1,282 @@
+import time
+from collections import deque
+
+import numpy as np
+import cv2
+
+from models.model_store import get_shared_model, preferred_variant, tuned_settings
+from models.pose_backend import PoseBackend
+from exercise_standards import get_required_keypoints
+from utils.crop_region import CropTracker, crop_and_resize
+
+class MoveNetBackend(PoseBackend):
+    """MoveNet SinglePose backend
+    
+    Models come from the process-wide cache in models.model_store; a backend
+    instance only holds one stream's crop tracking, cascade counters and
+    preprocessing buffers.
+    """
+    def __init__(self, variant=None, model_dir=None, fast_variant=None, escalation_threshold=0.4,
+                 track_person=False, escalation_history=None):
+        """Attach to the shared MoveNet model(s), loading them on first use
+        
+        Args:
+            variant: 'lightning', 'thunder', or a TFLite build such as
+                     'lightning_f16' / 'thunder_int8' (see models.model_store).
+                     None picks the variant recommended by `python -m models.autotune`,
+                     or Thunder on an untuned machine
+            model_dir: model store root, defaults to models/artifacts or $MOVENET_MODEL_DIR
+            fast_variant: enables cascade mode - every frame runs on this cheaper
+                          variant first and only frames whose required keypoints
+                          average below escalation_threshold confidence are
+                          re-run on `variant`
+            track_person: crop the model input to a box around the person found
+                          in the previous frame instead of squashing the whole frame
+            escalation_history: keep the per-frame escalation flags of the last
+                                this many frames only (None keeps the whole run)
+        """
+        self.variant = variant or preferred_variant()
+        self.name = self.variant
+        self.model = get_shared_model(self.variant, model_dir)
+        self.input_size = self.model.input_size
+        
+        # Tuned frames per model call for this machine (None when untuned); a
+        # tracked crop comes from the previous frame, so tracking runs frame by frame
+        self.batch_size = 1 if track_person else tuned_settings(self.variant).get('batch_size')
+        
+        # Cascade
+        self.fast_variant = fast_variant
+        self.fast_model = get_shared_model(fast_variant, model_dir) if fast_variant else None
+        self.escalation_threshold = escalation_threshold
+        self.escalation_history = escalation_history
+        self.required_keypoints = get_required_keypoints(None)
+        self.reset_cascade_stats()
+        
+        # Person tracking
+        self.track_person = track_person
+        self.crop_tracker = CropTracker() if track_person else None
+        
+        # Preallocated preprocessing buffers, keyed by input size
+        self._input_buffers = {}
+        self._resize_buffers = {}
+    
+    def preprocess_image(self, image):
+        """Preprocess image for MoveNet"""
+        return self.preprocess_batch([image])
+    
+    def extract_keypoints(self, image):
+        """Extract keypoints from image using MoveNet"""
+        return self._infer([image])[0]
+    
+    def preprocess_batch(self, images, size=None, crop_region=None):
+        """Resize and convert frames to one uint8 (N, size, size, 3) RGB batch, by default at the model's input size
+        
+        With a crop_region only that (square, normalized) box of each frame is used.
+        The batch is a view of a reused input buffer - it is only valid until the next call.
+        """
+        size = size or self.input_size
+        batch = self._input_buffer(len(images), size)
+        scratch = self._resize_buffer(size)
+        for i, image in enumerate(images):
+            if crop_region is not None:
+                crop_and_resize(image, crop_region, size, out=batch[i], scratch=scratch)
+            else:
+                cv2.resize(image, (size, size), dst=scratch)
+                cv2.cvtColor(scratch, cv2.COLOR_BGR2RGB, dst=batch[i])
+        
+        return batch
+    
+    def _input_buffer(self, n, size):
+        """Reusable model input buffer, grown only when a larger batch comes in"""
+        buffer = self._input_buffers.get(size)
+        if buffer is None or len(buffer) < n:
+            buffer = self._input_buffers[size] = np.empty((n, size, size, 3), dtype=np.uint8)
+        return buffer[:n]
+    
+    def _resize_buffer(self, size):
+        buffer = self._resize_buffers.get(size)
+        if buffer is None:
+            buffer = self._resize_buffers[size] = np.empty((size, size, 3), dtype=np.uint8)
+        return buffer
+    
+    def extract_keypoints_batch(self, images):
+        """Extract keypoints for a list of frames with one model call
+        
+        Returns:
+            np.ndarray of shape (N, 17, 3) holding (y, x, confidence) per joint
+        """
+        if len(images) == 0:
+            return self.empty_batch()
+        
+        return self._infer(images)
+    
+    def _infer(self, images):
+        """Run the model (or the cascade) on frames, returning full-frame keypoints
+        
+        With person tracking each frame's crop region comes from the frame
+        before it, so a batch is run one frame at a time.
+        """
+        if self.crop_tracker is not None and len(images) > 1:
+            return np.concatenate([self._infer(images[i:i + 1]) for i in range(len(images))])
+        
+        crop_region = None
+        if self.crop_tracker is not None:
+            crop_region = self.crop_tracker.region(*images[0].shape[:2])
+        
+        if self.fast_model is None:
+            keypoints = self.model.infer(self.preprocess_batch(images, crop_region=crop_region))
+        else:
+            keypoints = self._infer_cascade(
+                len(images),
+                lambda size, indices: self.preprocess_batch([images[i] for i in indices], size, crop_region)
+            )
+        
+        if crop_region is not None:
+            keypoints = self.crop_tracker.to_frame_coordinates(keypoints, crop_region)
+            self.crop_tracker.update(keypoints[-1])
+        
+        return keypoints
+    
+    def _infer_cascade(self, count, prepare):
+        """Fast model on every frame, accurate model only on the uncertain ones
+        
+        prepare(size, indices) returns the model input batch for those frames at that size.
+        """
+        start = time.perf_counter()
+        keypoints = self.fast_model.infer(prepare(self.fast_model.input_size, range(count)))
+        self.cascade_stats['fast_time'] += time.perf_counter() - start
+        
+        # Escalate frames where the keypoints this exercise needs are uncertain
+        confidence = keypoints[:, self.required_keypoints, 2].mean(axis=1)
+        hard = np.flatnonzero(confidence < self.escalation_threshold)
+        
+        if len(hard) > 0:
+            start = time.perf_counter()
+            keypoints[hard] = self.model.infer(prepare(self.input_size, hard))
+            self.cascade_stats['accurate_time'] += time.perf_counter() - start
+        
+        escalated = np.zeros(count, dtype=bool)
+        escalated[hard] = True
+        self.cascade_stats['frames'] += count
+        self.cascade_stats['escalated'] += len(hard)
+        self.cascade_stats['escalation_flags'].extend(zip(self._take_frame_indices(count), escalated.tolist()))
+        
+        return keypoints
+    
+    @property
+    def accepts_prepared(self):
+        """Pre-scaled input works unless person tracking needs the full frame to crop from"""
+        return self.crop_tracker is None
+    
+    def extract_keypoints_prepared(self, images):
+        """Keypoints for frames already decoded to (input_size, input_size, 3) RGB uint8
+        
+        Skips resizing and color conversion; in cascade mode frames are only
+        rescaled for the fast model.
+        """
+        if len(images) == 0:
+            return self.empty_batch()
+        
+        batch = self._input_buffer(len(images), self.input_size)
+        for i, image in enumerate(images):
+            batch[i] = image
+        
+        if self.fast_model is None:
+            return self.model.infer(batch)
+        return self._infer_cascade(len(batch), lambda size, indices: self._rescale_batch(batch, indices, size))
+    
+    def _rescale_batch(self, batch, indices, size):
+        """Prepared frames at another model's input size"""
+        indices = np.asarray(indices)
+        if size == batch.shape[1]:
+            return batch[indices]
+        
+        out = self._input_buffer(len(indices), size)
+        for i, index in enumerate(indices):
+            cv2.resize(batch[index], (size, size), dst=out[i])
+        return out
+    
+    def set_frame_indices(self, indices):
+        """Source frame index of each frame in the next extract call - cascade flags are recorded against them"""
+        self._frame_indices = list(indices)
+    
+    def _take_frame_indices(self, count):
+        """Source frame indices of the next count inferred frames
+        
+        Without indices from set_frame_indices they count on from the last known one.
+        """
+        given, self._frame_indices = self._frame_indices[:count], self._frame_indices[count:]
+        next_index = given[-1] + 1 if given else self._next_index
+        indices = given + list(range(next_index, next_index + count - len(given)))
+        self._next_index = indices[-1] + 1
+        return indices
+    
+    def limit_history(self, max_frames):
+        """Keep the escalation flags of the last max_frames frames only, None for the whole run"""
+        if max_frames != self.escalation_history:
+            self.escalation_history = max_frames
+            self.cascade_stats['escalation_flags'] = deque(self.cascade_stats['escalation_flags'], maxlen=max_frames)
+    
+    def set_exercise(self, exercise_type):
+        """Use the selected exercise's keypoints when deciding cascade escalation"""
+        self.required_keypoints = get_required_keypoints(exercise_type)
+    
+    def settings(self):
+        """Variant(s), escalation rule and tracking - everything that changes the keypoints"""
+        settings = super().settings()
+        settings['track_person'] = self.track_person
+        if self.fast_model is not None:
+            settings.update(fast_variant=self.fast_variant, escalation_threshold=self.escalation_threshold,
+                            required_keypoints=list(self.required_keypoints))
+        return settings
+    
+    def reset_cascade_stats(self):
+        """Clear cascade counters"""
+        self.cascade_stats = {
+            'frames': 0,
+            'escalated': 0,
+            'fast_time': 0.0,
+            'accurate_time': 0.0,
+            'escalation_flags': deque(maxlen=self.escalation_history)
+        }
+        self._frame_indices = []
+        self._next_index = 0
+    
+    def get_cascade_stats(self):
+        """Escalation rate and blended model cost per frame, or None outside cascade mode
+        
+        escalation_flags holds (source frame index, escalated) for each inferred frame.
+        """
+        if self.fast_model is None:
+            return None
+        
+        stats = self.cascade_stats
+        frames = max(stats['frames'], 1)
+        return {
+            'fast_variant': self.fast_model.variant,
+            'accurate_variant': self.variant,
+            'frames': stats['frames'],
+            'escalated': stats['escalated'],
+            'escalation_rate': stats['escalated'] / frames * 100,
+            'fast_ms_per_frame': stats['fast_time'] / frames * 1000,
+            'accurate_ms_per_escalation': stats['accurate_time'] / max(stats['escalated'], 1) * 1000,
+            'cost_ms_per_frame': (stats['fast_time'] + stats['accurate_time']) / frames * 1000,
+            'escalation_flags': [list(flag) for flag in stats['escalation_flags']]
+        }
+    
+    
+    def reset(self):
+        """Reset cascade counters and person tracking"""
+        self.reset_cascade_stats()
+        if self.crop_tracker is not None:
+            self.crop_tracker.reset()
+    
+    def get_stats(self):
+        """Cascade and tracking stats when those modes are on"""
+        stats = {}
+        cascade = self.get_cascade_stats()
+        if cascade is not None:
+            stats['cascade'] = cascade
+        if self.crop_tracker is not None:
+            stats['tracking'] = self.crop_tracker.get_stats()
+        return stats
@@ -0,0 +1,85 @@
+"""
+Pose-estimation backend interface
+
+TFHubExerciseRecognizer gets keypoints from a backend and does everything
+else (angles, classification, rep analysis downstream) itself, so the whole
+pipeline runs on any backend with this interface:
+
+    name                             identifies the backend / model variant
+    input_size                       model input resolution in pixels
+    keypoint_names                   keypoint layout, KEYPOINT_NAMES
+    extract_keypoints(image)         BGR frame -> (17, 3) float32
+    extract_keypoints_batch(images)  list of BGR frames -> (N, 17, 3) float32
+    settings()                       what the keypoints depend on besides the
+                                     frames, keys the utils.keypoint_cache
+    set_frame_indices(indices)       source frame index of each frame in the
+                                     next extract call (optional)
+    limit_history(max_frames)        bound per-frame stats for endless streams
+                                     (optional)
+
+Backends with accepts_prepared also take frames the decoder already scaled
+to the model input (see utils.av_decoder):
+
+    extract_keypoints_prepared(images)  (input_size, input_size, 3) RGB frames -> (N, 17, 3)
+
+Each keypoint is (y, x, confidence) with y and x normalized to the full frame,
+in the MoveNet / COCO order of KEYPOINT_NAMES.
+
+Implementations: models.movenet_backend.MoveNetBackend (the real model) and
+models.synthetic_backend.SyntheticPoseBackend (scripted, model-free).
+"""
+import numpy as np
+
+KEYPOINT_NAMES = [
+    'nose', 'left_eye', 'right_eye', 'left_ear', 'right_ear',
+    'left_shoulder', 'right_shoulder', 'left_elbow', 'right_elbow',
+    'left_wrist', 'right_wrist', 'left_hip', 'right_hip',
+    'left_knee', 'right_knee', 'left_ankle', 'right_ankle'
+]
+
+class PoseBackend:
+    """Base class for pose backends - subclasses implement extract_keypoints_batch"""
+    name = None
+    input_size = None
+    keypoint_names = KEYPOINT_NAMES
+
+    # Preferred frames per extract_keypoints_batch call, None for no preference
+    batch_size = None
+
+    # Whether extract_keypoints_prepared can be used
+    accepts_prepared = False
+
+    def extract_keypoints(self, image):
+        """Keypoints for one BGR frame, shape (17, 3)"""
+        return self.extract_keypoints_batch([image])[0]
+
+    def extract_keypoints_batch(self, images):
+        """Keypoints for a list of BGR frames, shape (N, 17, 3)"""
+        raise NotImplementedError
+
+    def extract_keypoints_prepared(self, images):
+        """Keypoints for frames pre-scaled to (input_size, input_size, 3) RGB, shape (N, 17, 3)"""
+        raise NotImplementedError
+
+    def empty_batch(self):
+        return np.zeros((0, len(self.keypoint_names), 3), dtype=np.float32)
+
+    def set_exercise(self, exercise_type):
+        """Exercise being analyzed, for backends that adapt to it"""
+
+    def set_frame_indices(self, indices):
+        """Source frame index of each frame in the next extract call, for backends timed by frame"""
+
+    def limit_history(self, max_frames):
+        """Keep per-frame stats of the last max_frames frames only (None: the whole run), for endless streams"""
+
+    def reset(self):
+        """Drop per-stream state at the start of a new video or stream"""
+
+    def settings(self):
+        """JSON-able settings that change the keypoints extracted from a frame"""
+        return {'name': self.name, 'input_size': self.input_size}
+
+    def get_stats(self):
+        """Backend counters to report with the analysis, keyed by name"""
+        return {}
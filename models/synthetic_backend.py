@@ -0,0 +1,263 @@
+"""
+Synthetic pose backend
+
+Produces scripted, deterministic keypoint trajectories for an exercise
+without looking at the frames, so VideoProcessor, the recognizer and
+ExerciseAnalyzer can be benchmarked and load-tested with no model at all:
+
+    recognizer = TFHubExerciseRecognizer(backend=SyntheticPoseBackend())
+
+or, for a model-free throughput run of the full video pipeline:
+
+    python -m models.synthetic_backend video.mp4 [exercise]
+
+A side-view skeleton is posed by forward kinematics from joint angles. Each
+exercise script names a posture and the joints that move between an
+extended and a flexed angle; one rep takes rep_period seconds: hold
+extended, move quickly, hold flexed, move back. A frame is posed by its
+source frame index, which the video pipeline passes in with
+set_frame_indices(), so stride-decimated and motion-gated runs see the
+trajectory at the right time; without indices the backend counts the frames
+it is asked about. The same index always gets the same keypoints (noise is
+seeded per frame).
+"""
+import math
+import sys
+import time
+
+import numpy as np
+
+from models.pose_backend import PoseBackend, KEYPOINT_NAMES
+
+# Segment lengths in frame-normalized units
+TORSO, NECK = 0.26, 0.08
+THIGH, SHIN = 0.21, 0.21
+UPPER_ARM, FOREARM = 0.14, 0.13
+SIDE_OFFSET = 0.015
+FLOOR_Y = 0.92
+
+# Posture: absolute torso direction (degrees, counter-clockwise from facing
+# right) or, with 'thigh', a fixed thigh direction the torso pivots around;
+# 'arm' is the resting upper-arm direction relative to the torso and 'lean'
+# how far the torso tips forward per degree of hip flexion
+POSTURES = {
+    'standing': {'torso': 90, 'arm': 180, 'lean': 0.4},
+    'prone': {'torso': 180, 'arm': 90},
+    'supine': {'torso': 180, 'arm': 180},
+    'supine_bent': {'thigh': 30, 'arm': 180}
+}
+
+# posture, {joint: (extended angle, flexed angle)}. Joints: knee / hip / elbow
+# (both sides) or left_* / right_*, and arm_raise (shoulder, 0 = resting)
+EXERCISE_SCRIPTS = {
+    'squat': ('standing', {'knee': (178, 70), 'hip': (178, 80)}),
+    'squat_jumps': ('standing', {'knee': (178, 75), 'hip': (178, 85)}),
+    'lunges': ('standing', {'left_knee': (178, 80), 'right_knee': (178, 125)}),
+    'wall_sit': ('standing', {'knee': (95, 90), 'hip': (95, 90)}),
+    'pushup': ('prone', {'elbow': (178, 70)}),
+    'plank': ('prone', {'elbow': (90, 88)}),
+    'side_plank': ('prone', {'elbow': (178, 175)}),
+    'mountain_climbers': ('prone', {'left_knee': (178, 70), 'left_hip': (178, 80)}),
+    'situp': ('supine_bent', {'hip': (160, 60), 'knee': (80, 80)}),
+    'crunches': ('supine_bent', {'hip': (150, 105), 'knee': (80, 80)}),
+    'bicycle_crunches': ('supine_bent', {'left_knee': (170, 70), 'hip': (150, 110)}),
+    'leg_raises': ('supine', {'hip': (178, 90)}),
+    'glute_bridge': ('supine_bent', {'hip': (120, 175), 'knee': (80, 90)}),
+    'jumping_jacks': ('standing', {'arm_raise': (10, 170), 'knee': (178, 165)}),
+    'star_jumps': ('standing', {'arm_raise': (10, 170), 'elbow': (178, 170), 'knee': (178, 160)}),
+    'high_knees': ('standing', {'left_knee': (178, 60), 'left_hip': (178, 80)}),
+    'standing_knee_raises': ('standing', {'left_knee': (178, 80), 'left_hip': (178, 90)}),
+    'running': ('standing', {'left_knee': (170, 70), 'elbow': (100, 80)}),
+    'walking': ('standing', {'left_knee': (178, 150), 'elbow': (170, 160)}),
+    'burpees': ('standing', {'knee': (178, 60), 'hip': (178, 60)}),
+    'jumping': ('standing', {'knee': (178, 120)})
+}
+
+DEFAULT_SCRIPT = EXERCISE_SCRIPTS['squat']
+
+def _direction(degrees):
+    """Unit vector (dy, dx) in image coordinates for a direction angle"""
+    radians = math.radians(degrees)
+    return np.array([-math.sin(radians), math.cos(radians)])
+
+def rep_phase(t, move_fraction=0.15):
+    """0 (extended) .. 1 (flexed) for a rep phase t in [0, 1): hold, move, hold, move back"""
+    t = t % 1.0
+    hold = 0.5 - move_fraction
+    if t < hold:
+        return 0.0
+    if t < 0.5:
+        return 0.5 - 0.5 * math.cos(math.pi * (t - hold) / move_fraction)
+    if t < 0.5 + hold:
+        return 1.0
+    return 0.5 + 0.5 * math.cos(math.pi * (t - 0.5 - hold) / move_fraction)
+
+def pose_keypoints(posture, angles, confidence=0.9):
+    """
+    Side-view (17, 3) keypoints from joint angles
+
+    Args:
+        posture: key of POSTURES
+        angles: per-side joint angles in degrees, e.g. {'left_knee': 90, ...},
+                plus 'arm_raise'; missing joints are fully extended
+    """
+    spec = POSTURES[posture]
+    keypoints = np.zeros((len(KEYPOINT_NAMES), 3))
+    keypoints[:, 2] = confidence
+
+    def angle(name):
+        return angles.get(name, 180.0)
+
+    hip_mean = (angle('left_hip') + angle('right_hip')) / 2
+    if 'thigh' in spec:
+        torso_dir = spec['thigh'] + hip_mean
+    else:
+        torso_dir = spec['torso'] - (180 - hip_mean) * spec.get('lean', 0.0)
+
+    hip = np.zeros(2)
+    shoulder = hip + TORSO * _direction(torso_dir)
+    nose = shoulder + NECK * _direction(torso_dir - 20)
+
+    for side, sign in (('left', 1), ('right', -1)):
+        offset = np.array([0.0, sign * SIDE_OFFSET])
+        index = {name: KEYPOINT_NAMES.index(f"{side}_{name}") for name in
+                 ('shoulder', 'elbow', 'wrist', 'hip', 'knee', 'ankle', 'eye', 'ear')}
+
+        thigh_dir = spec['thigh'] if 'thigh' in spec else torso_dir - angle(f"{side}_hip")
+        shin_dir = thigh_dir + 180 + angle(f"{side}_knee")
+        knee = hip + THIGH * _direction(thigh_dir)
+        ankle = knee + SHIN * _direction(shin_dir)
+
+        arm_dir = torso_dir + spec['arm'] + angles.get('arm_raise', 0.0)
+        forearm_dir = arm_dir + 180 + angle(f"{side}_elbow")
+        elbow = shoulder + UPPER_ARM * _direction(arm_dir)
+        wrist = elbow + FOREARM * _direction(forearm_dir)
+
+        for name, point in (('shoulder', shoulder), ('elbow', elbow), ('wrist', wrist),
+                            ('hip', hip), ('knee', knee), ('ankle', ankle)):
+            keypoints[index[name], :2] = point + offset
+        keypoints[index['eye'], :2] = nose + offset + [-0.01, -0.005]
+        keypoints[index['ear'], :2] = nose + offset + [-0.005, -0.03]
+
+    keypoints[0, :2] = nose
+
+    # Stand the skeleton on the floor, centered on the hips
+    keypoints[:, 0] += FLOOR_Y - keypoints[:, 0].max()
+    keypoints[:, 1] += 0.5 - hip[1]
+    keypoints[:, :2] = np.clip(keypoints[:, :2], 0.0, 1.0)
+    return keypoints.astype(np.float32)
+
+class SyntheticPoseBackend(PoseBackend):
+    """Model-free backend replaying a scripted exercise"""
+    name = 'synthetic'
+    accepts_prepared = True
+
+    def __init__(self, exercise_type=None, fps=30.0, rep_period=2.0, noise=0.0, confidence=0.9,
+                 seed=0, input_size=256, delay=0.0):
+        """
+        Args:
+            exercise_type: exercise to script; None follows set_exercise(),
+                           i.e. the exercise selected for analysis
+            fps: frame rate the trajectory is timed against
+            rep_period: seconds per rep
+            noise: std-dev of Gaussian jitter on keypoint positions
+            confidence: score reported for every keypoint
+            input_size: nominal input size to report - frames are never read
+            delay: seconds each extract call sleeps, to stand in for model time
+        """
+        self.exercise_type = exercise_type
+        self.follow_exercise = exercise_type is None
+        self.fps = fps
+        self.rep_period = rep_period
+        self.noise = noise
+        self.confidence = confidence
+        self.seed = seed
+        self.input_size = input_size
+        self.delay = delay
+        self.frame_index = 0
+        self.frames_extracted = 0
+        self._frame_indices = None
+
+    def set_exercise(self, exercise_type):
+        if self.follow_exercise:
+            self.exercise_type = exercise_type
+
+    def settings(self):
+        settings = super().settings()
+        settings.update(exercise_type=self.exercise_type, fps=self.fps, rep_period=self.rep_period,
+                        noise=self.noise, confidence=self.confidence, seed=self.seed)
+        return settings
+
+    def reset(self):
+        """Restart the trajectory from the first frame"""
+        self.frame_index = 0
+        self.frames_extracted = 0
+        self._frame_indices = None
+
+    def set_frame_indices(self, indices):
+        self._frame_indices = list(indices)
+
+    def keypoints_at(self, frame_index):
+        """Keypoints of the scripted trajectory at a frame index"""
+        posture, joints = EXERCISE_SCRIPTS.get(self.exercise_type, DEFAULT_SCRIPT)
+        phase = rep_phase(frame_index / (self.fps * self.rep_period))
+
+        angles = {}
+        for joint, (extended, flexed) in joints.items():
+            value = extended + (flexed - extended) * phase
+            if joint in ('knee', 'hip', 'elbow'):
+                angles[f"left_{joint}"] = angles[f"right_{joint}"] = value
+            else:
+                angles[joint] = value
+
+        keypoints = pose_keypoints(posture, angles, self.confidence)
+        if self.noise > 0:
+            rng = np.random.default_rng((self.seed, frame_index))
+            keypoints[:, :2] += rng.normal(0.0, self.noise, size=(len(keypoints), 2)).astype(np.float32)
+        return keypoints
+
+    def extract_keypoints_batch(self, images):
+        if self.delay:
+            time.sleep(self.delay)
+        indices, self._frame_indices = self._frame_indices, None
+        if indices is None or len(indices) != len(images):
+            indices = range(self.frame_index, self.frame_index + len(images))
+
+        keypoints = np.empty((len(images), len(self.keypoint_names), 3), dtype=np.float32)
+        for i, frame_index in enumerate(indices):
+            keypoints[i] = self.keypoints_at(frame_index)
+            self.frame_index = frame_index + 1
+        self.frames_extracted += len(images)
+        return keypoints
+
+    def extract_keypoints_prepared(self, images):
+        return self.extract_keypoints_batch(images)
+
+    def get_stats(self):
+        return {'synthetic': {'exercise': self.exercise_type, 'frames': self.frames_extracted}}
+
+def main(argv):
+    if len(argv) < 1:
+        print("Usage: python -m models.synthetic_backend <video> [exercise]")
+        return 1
+
+    from models.exercise_analyzer import ExerciseAnalyzer
+    from models.tfhub_recognizer import TFHubExerciseRecognizer
+    from utils.video_processor import VideoProcessor
+
+    exercise_type = argv[1] if len(argv) > 1 else 'squat'
+    recognizer = TFHubExerciseRecognizer(backend=SyntheticPoseBackend())
+
+    start = time.perf_counter()
+    output_path, analysis_data = VideoProcessor().process_video_tfhub(
+        argv[0], recognizer, ExerciseAnalyzer(exercise_type=exercise_type)
+    )
+    elapsed = time.perf_counter() - start
+
+    frames = analysis_data['frames_analyzed']
+    print(f"{frames} frames in {elapsed:.2f}s ({frames / max(elapsed, 1e-9):.1f} fps without a model), "
+          f"{analysis_data['summary']['total_reps']} reps -> {output_path}")
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv[1:]))
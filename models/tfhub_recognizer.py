@@ -1,51 +1,91 @@
-import tensorflow as tf
-import tensorflow_hub as hub
 import numpy as np
-import cv2
+
+from models.movenet_backend import MoveNetBackend
+from utils.pose_drawing import draw_keypoints
 
 class TFHubExerciseRecognizer:
-    def __init__(self):
-        """Initialize TensorFlow Hub MoveNet model"""
-        print("Loading TensorFlow Hub MoveNet model...")
-        
-        # Load MoveNet Single Pose Thunder model
-        self.model = hub.load('https://tfhub.dev/google/movenet/singlepose/thunder/4')
-        self.movenet = self.model.signatures['serving_default']
+    """Per-stream pose recognizer
+    
+    Keypoints come from a pose backend (see models.pose_backend) - MoveNet by
+    default, whose models are shared process-wide - and the recognizer adds
+    joint angles and exercise classification on top. It only carries one
+    stream's state and is cheap to create per session. Use one recognizer
+    per stream / thread.
+    """
+    def __init__(self, variant=None, model_dir=None, fast_variant=None, escalation_threshold=0.4,
+                 track_person=False, min_pose_confidence=0.1, backend=None, escalation_history=None):
+        """Set up a recognizer on MoveNet or on the given backend
+        
+        Args:
+            variant, model_dir, fast_variant, escalation_threshold, track_person, escalation_history:
+                MoveNet settings, see models.movenet_backend.MoveNetBackend
+            min_pose_confidence: mean keypoint confidence below which a frame
+                                 is reported as having no pose
+            backend: a models.pose_backend.PoseBackend to use instead of MoveNet,
+                     e.g. models.synthetic_backend.SyntheticPoseBackend; the
+                     MoveNet settings are ignored then
+        """
+        self.backend = backend or MoveNetBackend(variant, model_dir, fast_variant, escalation_threshold,
+                                                    track_person, escalation_history)
+        self.variant = self.backend.name
+        self.input_size = self.backend.input_size
+        self.batch_size = self.backend.batch_size
+        
+        self.min_pose_confidence = min_pose_confidence
         
         # Exercise classification based on pose patterns
         self.exercise_history = []
         self.history_size = 30
-        
-        print("✅ Model loaded successfully!")
     
-    def preprocess_image(self, image):
-        """Preprocess image for MoveNet"""
-        # Resize to 256x256
-        img = cv2.resize(image, (256, 256))
-        
-        # Convert to RGB
-        img = cv2.cvtColor(img, cv2.COLOR_BGR2RGB)
-        
-        # Normalize to [0, 1]
-        img = tf.cast(img, dtype=tf.int32)
-        
-        # Add batch dimension
-        img = tf.expand_dims(img, axis=0)
-        
-        return img
+    def extract_keypoints(self, image, prepared=False):
+        """Extract keypoints from image using the pose backend"""
+        if prepared:
+            return self.backend.extract_keypoints_prepared([image])[0]
+        return self.backend.extract_keypoints(image)
     
-    def extract_keypoints(self, image):
-        """Extract keypoints from image using MoveNet"""
-        # Preprocess
-        input_image = self.preprocess_image(image)
+    def extract_keypoints_batch(self, images, prepared=False):
+        """Extract keypoints for a list of frames with one backend call
         
-        # Run inference
-        outputs = self.movenet(input_image)
+        prepared: frames are already model-size RGB from the decoder (only
+                  when accepts_prepared(); see utils.av_decoder)
         
-        # Extract keypoints
-        keypoints = outputs['output_0'].numpy()[0, 0, :, :]
+        Returns:
+            np.ndarray of shape (N, 17, 3) holding (y, x, confidence) per joint
+        """
+        if len(images) == 0:
+            return self.backend.empty_batch()
         
-        return keypoints
+        if prepared:
+            return self.backend.extract_keypoints_prepared(images)
+        return self.backend.extract_keypoints_batch(images)
+    
+    def accepts_prepared(self):
+        """Whether frames decoded straight to the model input size can be used"""
+        return self.backend.accepts_prepared
+    
+    def set_exercise(self, exercise_type):
+        """Tell the backend which exercise is analyzed (MoveNet uses it for cascade escalation)"""
+        self.backend.set_exercise(exercise_type)
+    
+    def set_frame_indices(self, indices):
+        """Pass the source frame index of each frame in the next extraction to the backend"""
+        self.backend.set_frame_indices(indices)
+    
+    def limit_history(self, max_frames):
+        """Bound the backend's per-frame stats to the last max_frames frames, None to keep the whole run"""
+        self.backend.limit_history(max_frames)
+    
+    def get_backend_stats(self):
+        """Backend counters, e.g. 'cascade' and 'tracking' for MoveNet"""
+        return self.backend.get_stats()
+    
+    def cache_settings(self):
+        """Backend settings plus the pose threshold - the keypoint cache key's extraction part"""
+        return dict(self.backend.settings(), min_pose_confidence=self.min_pose_confidence)
+    
+    def get_cascade_stats(self):
+        """Escalation rate and blended model cost per frame, or None outside cascade mode"""
+        return self.get_backend_stats().get('cascade')
     
     def calculate_angles(self, keypoints):
         """Calculate joint angles from keypoints"""
@@ -369,56 +409,67 @@ class TFHubExerciseRecognizer:
         
         return exercise, confidence
     
-    def detect_exercise(self, image):
+    def has_pose(self, keypoints):
+        """A person is in frame when the mean keypoint confidence clears min_pose_confidence"""
+        return keypoints is not None and float(np.mean(keypoints[:, 2])) >= self.min_pose_confidence
+    
+    def _detection_from_keypoints(self, keypoints):
+        """Angles and classification for one frame's keypoints"""
+        if not self.has_pose(keypoints):
+            return 'no_pose', 0.0, None, {}
+        
+        # Calculate angles
+        angles = self.calculate_angles(keypoints)
+        
+        # Classify exercise
+        exercise, confidence = self.classify_exercise(keypoints, angles)
+        
+        return exercise, confidence, keypoints, angles
+    
+    def detection_from_cached(self, keypoints):
+        """detect_exercise() tuple for keypoints from the keypoint cache - no model call"""
+        if keypoints is None:
+            return 'no_pose', 0.0, None, {}
+        
+        angles = self.calculate_angles(keypoints)
+        exercise, confidence = self.classify_exercise(keypoints, angles)
+        return exercise, confidence, keypoints, angles
+    
+    def detect_exercise(self, image, prepared=False):
         """Main detection function"""
         try:
             # Extract keypoints
-            keypoints = self.extract_keypoints(image)
+            keypoints = self.extract_keypoints(image, prepared)
             
-            # Calculate angles
-            angles = self.calculate_angles(keypoints)
-            
-            # Classify exercise
-            exercise, confidence = self.classify_exercise(keypoints, angles)
-            
-            return exercise, confidence, keypoints, angles
+            return self._detection_from_keypoints(keypoints)
             
         except Exception as e:
             print(f"Error in detection: {e}")
             return 'error', 0.0, None, {}
     
+    def detect_exercise_batch(self, images, prepared=False):
+        """Batched detection - returns one detect_exercise() tuple per frame, in order"""
+        try:
+            keypoints_batch = self.extract_keypoints_batch(images, prepared)
+        except Exception as e:
+            print(f"Error in batch detection: {e}")
+            return [self.detect_exercise(image, prepared) for image in images]
+        
+        results = []
+        for keypoints in keypoints_batch:
+            try:
+                results.append(self._detection_from_keypoints(keypoints))
+            except Exception as e:
+                print(f"Error in detection: {e}")
+                results.append(('error', 0.0, None, {}))
+        
+        return results
+    
     def reset(self):
         """Reset history"""
         self.exercise_history = []
+        self.backend.reset()
     
     def draw_keypoints(self, image, keypoints):
         """Draw keypoints on image"""
-        h, w = image.shape[:2]
-        
-        # Draw connections
-        connections = [
-            (5, 7), (7, 9),    # Left arm
-            (6, 8), (8, 10),   # Right arm
-            (11, 13), (13, 15),  # Left leg
-            (12, 14), (14, 16),  # Right leg
-            (5, 6),             # Shoulders
-            (11, 12),           # Hips
-            (5, 11), (6, 12)    # Torso
-        ]
-        
-        for connection in connections:
-            y1, x1, conf1 = keypoints[connection[0]]
-            y2, x2, conf2 = keypoints[connection[1]]
-            
-            if conf1 > 0.3 and conf2 > 0.3:
-                pt1 = (int(x1 * w), int(y1 * h))
-                pt2 = (int(x2 * w), int(y2 * h))
-                cv2.line(image, pt1, pt2, (0, 255, 0), 2)
-        
-        # Draw keypoints
-        for i, (y, x, conf) in enumerate(keypoints):
-            if conf > 0.3:
-                pt = (int(x * w), int(y * h))
-                cv2.circle(image, pt, 5, (0, 255, 255), -1)
-        
-        return image
\ No newline at end of file
+        return draw_keypoints(image, keypoints)
\ No newline at end of file
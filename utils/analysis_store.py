@@ -0,0 +1,104 @@
+"""
+Stored per-frame analysis
+
+VideoProcessor.analyze_video runs pose inference and rep analysis without
+drawing or encoding a single frame, and saves everything the overlay needs -
+keypoints, joint angles and the analyzer's feedback for each frame - with
+the run's summary. VideoProcessor.render_analysis draws the annotated video,
+or a time range of it, from that file later without running the model again.
+
+One utils.pose_store file (.pose) per analysis: the frames are streamed to
+disk while the analysis runs and read back from a memory map, so neither
+side holds more than a chunk of frames. Its metadata holds the source
+video and its properties, the exercise and the analysis_data of the run.
+"""
+import numpy as np
+
+from utils.pose_store import PoseStore, PoseStoreWriter
+
+ANALYSIS_VERSION = 2
+
+class AnalysisRecorder:
+    """Streams (keypoints, angles, feedback) per frame in stream order to a .pose file"""
+    def __init__(self, path):
+        self.writer = PoseStoreWriter(path)
+
+    def add(self, keypoints, angles, feedback):
+        self.writer.append(keypoints, angles, feedback)
+
+    def __len__(self):
+        return len(self.writer)
+
+    def save(self, meta):
+        """Finish the file with meta; returns its path"""
+        return self.writer.close(dict(meta, version=ANALYSIS_VERSION))
+
+    def discard(self):
+        """Drop a run that did not finish"""
+        self.writer.discard()
+
+class StoredAnalysis:
+    """A saved analysis, as loaded by load_analysis"""
+    def __init__(self, store):
+        self.store = store
+        self.path = store.path
+        self.meta = store.meta
+        self.angle_names = store.angle_names
+
+    def __len__(self):
+        return len(self.store)
+
+    @property
+    def fps(self):
+        return self.meta.get('fps') or 30.0
+
+    @property
+    def duration(self):
+        return len(self) / self.fps
+
+    def frame_range(self, start_time=None, end_time=None):
+        """(start, end) frame indices for a time range in seconds, clamped to the video"""
+        start = 0 if start_time is None else int(round(start_time * self.fps))
+        end = len(self) if end_time is None else int(round(end_time * self.fps))
+        start = min(max(start, 0), len(self))
+        return start, min(max(end, start), len(self))
+
+    def frame_results(self, start=0, end=None):
+        """Yield (keypoints, feedback) for frames [start, end), keypoints None without a pose"""
+        for block_start, block_end in self.store.blocks(start, end):
+            keypoints = self.store.keypoints(block_start, block_end)
+            for frame_keypoints, feedback in zip(keypoints, self.store.feedback(block_start, block_end)):
+                yield (None if np.isnan(frame_keypoints[0, 0]) else frame_keypoints), feedback
+
+    def frame_angles(self, index):
+        """Joint angles of one frame as the recognizer's dict"""
+        return self._angle_dict(self.store.angles(index, index + 1)[0])
+
+    def _angle_dict(self, values):
+        return {name: float(value) for name, value in zip(self.angle_names, values) if not np.isnan(value)}
+
+    def analysis_data(self):
+        """The run's analysis_data, with feedback_history / angle_history rebuilt from the frames"""
+        analysis_data = dict(self.meta['analysis'])
+        analysis_data['feedback_history'] = []
+        analysis_data['angle_history'] = []
+        for block_start, block_end in self.store.blocks():
+            with_pose = self.store.has_pose(block_start, block_end)
+            feedback = self.store.feedback(block_start, block_end)
+            angles = self.store.angles(block_start, block_end)
+            for i in np.flatnonzero(with_pose):
+                analysis_data['feedback_history'].append(feedback[i])
+                analysis_data['angle_history'].append(self._angle_dict(angles[i]))
+        return analysis_data
+
+    def close(self):
+        self.store.close()
+
+def load_analysis(path):
+    """Open an analysis written by AnalysisRecorder"""
+    store = PoseStore(path)
+    version = store.meta.get('version')
+    if version != ANALYSIS_VERSION:
+        store.close()
+        raise ValueError(f"Unsupported analysis file version {version} in {path}")
+    return StoredAnalysis(store)
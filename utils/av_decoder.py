@@ -0,0 +1,98 @@
+"""
+PyAV (FFmpeg) video decoder
+
+An alternative to cv2.VideoCapture for VideoProcessor. The codec decodes with
+FFmpeg's frame and slice threading, and libswscale converts each key frame
+straight to the model's input resolution in RGB - for a 4K upload that
+replaces a full-resolution BGR conversion plus a cv2.resize / cvtColor per
+frame. The full-resolution BGR frame is only produced when something
+downstream draws on it (an annotated output video).
+
+Rotation from the stream's display matrix (phone videos shot upright are
+stored sideways) is applied to both, the way OpenCV's capture does, so
+keypoints, rendered frames and keypoints cached from either decoder agree.
+"""
+import cv2
+
+# Clockwise rotation that shows a stream upright -> cv2.rotate code
+ROTATE_CODES = {
+    90: cv2.ROTATE_90_CLOCKWISE,
+    180: cv2.ROTATE_180,
+    270: cv2.ROTATE_90_COUNTERCLOCKWISE
+}
+
+def av_available():
+    """True when PyAV can be imported"""
+    try:
+        import av  # noqa: F401
+    except ImportError:
+        return False
+    return True
+
+def upright_rotation(stream, av_frame):
+    """Clockwise degrees (0, 90, 180 or 270) to turn the decoded frames upright"""
+    # Counter-clockwise display matrix angle: per frame on PyAV 14+, stream side data before
+    angle = getattr(av_frame, 'rotation', None)
+    if angle is None:
+        side_data = getattr(stream, 'side_data', None) or {}
+        angle = side_data.get('DISPLAYMATRIX') or 0
+    return int(round(-float(angle) / 90.0)) * 90 % 360
+
+class AVFrameReader:
+    """Decode a video file with PyAV, yielding the frames VideoProcessor's pipeline consumes"""
+    def __init__(self, video_path, model_size=None, full_frames=True, thread_count=0):
+        """
+        Args:
+            model_size: edge of the square RGB model input to produce for key
+                        frames, or None when the model needs full frames
+            full_frames: also produce full-resolution BGR frames (for rendering)
+            thread_count: decoder threads, 0 lets FFmpeg pick one per core
+        """
+        import av
+
+        self.model_size = model_size
+        self.full_frames = full_frames or model_size is None
+
+        self.container = av.open(str(video_path))
+        self.stream = self.container.streams.video[0]
+        self.stream.thread_type = 'AUTO'  # frame + slice threading
+        self.stream.thread_count = thread_count
+
+        self.frames_decoded = 0
+        self.rotation = None
+
+    def frames(self, stride=1, retrieve_skipped=True):
+        """
+        Yield (frame, is_key, model_input) in order, like VideoProcessor._read_frames
+
+        frame is the full-resolution BGR image (None when full frames are off,
+        or for a non-key frame without retrieve_skipped); model_input is the
+        (model_size, model_size, 3) RGB image for key frames, else None.
+        Every frame is still decoded - inter-coded streams need them - but
+        skipped frames are never converted.
+        """
+        for av_frame in self.container.decode(self.stream):
+            is_key = self.frames_decoded % stride == 0
+            self.frames_decoded += 1
+            if self.rotation is None:
+                self.rotation = upright_rotation(self.stream, av_frame)
+            rotate = ROTATE_CODES.get(self.rotation)
+
+            frame = None
+            if self.full_frames and (is_key or retrieve_skipped):
+                frame = av_frame.to_ndarray(format='bgr24')
+                if rotate is not None:
+                    frame = cv2.rotate(frame, rotate)
+
+            model_input = None
+            if is_key and self.model_size:
+                # Square, so scaling first and rotating after gives the same image
+                model_input = av_frame.reformat(width=self.model_size, height=self.model_size,
+                                                format='rgb24').to_ndarray()
+                if rotate is not None:
+                    model_input = cv2.rotate(model_input, rotate)
+
+            yield frame, is_key, model_input
+
+    def close(self):
+        self.container.close()
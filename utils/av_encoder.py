@@ -0,0 +1,204 @@
+"""
+Output video encoding
+
+Annotated videos are encoded to H.264 (yuv420p, faststart MP4) through PyAV
+so they play in browsers as-is. libx264 uses all cores, and libswscale
+downscales and converts to YUV in one pass. An output profile picks the
+target resolution, frame rate, quality and speed. The default 'web'
+profile favors small files that are quick to encode and serve.
+
+When PyAV or libx264 is unavailable the writer falls back to
+cv2.VideoWriter (mp4v) at the profile's resolution.
+"""
+import time
+from fractions import Fraction
+from pathlib import Path
+
+import cv2
+
+OUTPUT_PROFILES = {
+    'web': {
+        'max_height': 720,
+        'fps': None,
+        'crf': 28,
+        'bitrate': None,
+        'preset': 'veryfast'
+    },
+    'preview': {
+        'max_height': 480,
+        'fps': 15,
+        'crf': 32,
+        'bitrate': None,
+        'preset': 'ultrafast'
+    },
+    'high': {
+        'max_height': 1080,
+        'fps': None,
+        'crf': 22,
+        'bitrate': None,
+        'preset': 'medium'
+    },
+    'source': {
+        'max_height': None,
+        'fps': None,
+        'crf': 18,
+        'bitrate': None,
+        'preset': 'fast'
+    }
+}
+
+DEFAULT_OUTPUT_PROFILE = 'web'
+
+def get_output_profile(profile):
+    """Resolve a profile name or dict into a full settings dict
+
+    A dict is laid over the 'web' defaults, so {'crf': 24} is a valid profile.
+    max_height / fps of None keep the source's; bitrate (bits/s) replaces crf.
+    """
+    if isinstance(profile, dict):
+        settings = dict(OUTPUT_PROFILES[DEFAULT_OUTPUT_PROFILE])
+        settings.update(profile)
+        return settings
+    if profile not in OUTPUT_PROFILES:
+        raise ValueError(f"Unknown output profile '{profile}'. Choose from: {', '.join(OUTPUT_PROFILES)}")
+    return dict(OUTPUT_PROFILES[profile])
+
+def output_size(width, height, max_height=None):
+    """Output resolution: source aspect, capped to max_height, even dimensions for yuv420p"""
+    if max_height and height > max_height:
+        width = width * max_height / height
+        height = max_height
+    return max(2, int(round(width / 2)) * 2), max(2, int(round(height / 2)) * 2)
+
+def exact_fps(fps):
+    """Frame rate as a fraction - 29.97 becomes 30000/1001 instead of 29"""
+    if not fps or fps <= 0:
+        return Fraction(30)
+    return Fraction(fps).limit_denominator(1001)
+
+class _FrameRateReducer:
+    """Decide which source frames to keep for a lower output frame rate"""
+    def __init__(self, source_fps, target_fps):
+        self.step = float(source_fps) / float(target_fps) if target_fps and target_fps < source_fps else 1.0
+        self.index = 0
+        self.next_kept = 0.0
+
+    def keep(self):
+        keep = self.index >= self.next_kept - 1e-6
+        if keep:
+            self.next_kept += self.step
+        self.index += 1
+        return keep
+
+class AVVideoWriter:
+    """H.264 writer with the cv2.VideoWriter write() / release() interface"""
+    encoder = 'libx264'
+
+    def __init__(self, path, width, height, fps, profile=DEFAULT_OUTPUT_PROFILE, threads=0):
+        import av
+        self._av = av
+
+        settings = get_output_profile(profile)
+        source_fps = exact_fps(fps)
+        self.fps = exact_fps(settings['fps']) if settings['fps'] and settings['fps'] < source_fps else source_fps
+        self.width, self.height = output_size(width, height, settings['max_height'])
+        self._rate = _FrameRateReducer(source_fps, self.fps)
+
+        self.container = av.open(str(path), 'w', options={'movflags': '+faststart'})
+        self.stream = self.container.add_stream('libx264', rate=self.fps)
+        self.stream.width = self.width
+        self.stream.height = self.height
+        self.stream.pix_fmt = 'yuv420p'
+        self.stream.thread_type = 'AUTO'
+        self.stream.thread_count = threads  # 0 = one per core
+
+        options = {'preset': settings['preset']}
+        if settings['bitrate']:
+            self.stream.bit_rate = int(settings['bitrate'])
+        else:
+            options['crf'] = str(settings['crf'])
+        self.stream.options = options
+
+        self.frames_written = 0
+        self.encode_time = 0.0
+
+    def write(self, frame):
+        """Encode one BGR frame (dropped when the profile lowers the frame rate)"""
+        if not self._rate.keep():
+            return
+
+        start = time.perf_counter()
+        av_frame = self._av.VideoFrame.from_ndarray(frame, format='bgr24')
+        av_frame = av_frame.reformat(width=self.width, height=self.height, format='yuv420p')
+        av_frame.pts = self.frames_written  # stream time base is 1 / fps
+        for packet in self.stream.encode(av_frame):
+            self.container.mux(packet)
+        self.frames_written += 1
+        self.encode_time += time.perf_counter() - start
+
+    def release(self):
+        start = time.perf_counter()
+        for packet in self.stream.encode():
+            self.container.mux(packet)
+        self.container.close()
+        self.encode_time += time.perf_counter() - start
+
+class CV2VideoWriter:
+    """Fallback mp4v writer applying the profile's resolution and frame rate"""
+    encoder = 'mp4v'
+
+    def __init__(self, path, width, height, fps, profile=DEFAULT_OUTPUT_PROFILE, threads=0):
+        settings = get_output_profile(profile)
+        source_fps = exact_fps(fps)
+        self.fps = exact_fps(settings['fps']) if settings['fps'] and settings['fps'] < source_fps else source_fps
+        self.width, self.height = output_size(width, height, settings['max_height'])
+        self._rate = _FrameRateReducer(source_fps, self.fps)
+        self._resize = (self.width, self.height) != (width, height)
+        self._scaled = None
+
+        fourcc = cv2.VideoWriter_fourcc(*'mp4v')
+        self.out = cv2.VideoWriter(str(path), fourcc, float(self.fps), (self.width, self.height))
+
+        self.frames_written = 0
+        self.encode_time = 0.0
+
+    def write(self, frame):
+        if not self._rate.keep():
+            return
+
+        start = time.perf_counter()
+        if self._resize:
+            frame = self._scaled = cv2.resize(frame, (self.width, self.height), dst=self._scaled,
+                                              interpolation=cv2.INTER_AREA)
+        self.out.write(frame)
+        self.frames_written += 1
+        self.encode_time += time.perf_counter() - start
+
+    def release(self):
+        self.out.release()
+
+def open_video_writer(path, width, height, fps, profile=DEFAULT_OUTPUT_PROFILE, threads=0):
+    """H.264 writer for an output profile, or the OpenCV mp4v fallback
+
+    threads: encoder threads, 0 for one per core
+    """
+    try:
+        import av
+        av.codec.Codec('libx264', 'w')
+    except Exception as e:
+        print(f"H.264 encoding unavailable ({e}) - writing mp4v with OpenCV")
+        return CV2VideoWriter(path, width, height, fps, profile, threads)
+
+    return AVVideoWriter(path, width, height, fps, profile, threads)
+
+def writer_stats(writer, path):
+    """Encoder, output format and cost of a finished writer"""
+    return {
+        'encoder': writer.encoder,
+        'width': writer.width,
+        'height': writer.height,
+        'fps': float(writer.fps),
+        'frames_written': writer.frames_written,
+        'encode_time_s': writer.encode_time,
+        'file_size_mb': Path(path).stat().st_size / (1024 * 1024) if Path(path).exists() else 0.0
+    }
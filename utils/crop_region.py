@@ -0,0 +1,155 @@
+"""
+Person-tracking crop region for MoveNet
+
+Follows the cropping algorithm from the MoveNet model card / tutorial: the
+previous frame's keypoints define a square, aspect-preserving box around the
+person, and the model runs on that box instead of the whole frame. When the
+torso is not visible the region falls back to the full (padded) frame.
+
+Crop regions are in normalized full-frame coordinates and may extend past
+the frame edges; the out-of-frame part is padded with black.
+"""
+import cv2
+import numpy as np
+
+MIN_CROP_KEYPOINT_SCORE = 0.2
+
+# MoveNet keypoint indices
+LEFT_SHOULDER, RIGHT_SHOULDER = 5, 6
+LEFT_HIP, RIGHT_HIP = 11, 12
+TORSO_KEYPOINTS = [LEFT_SHOULDER, RIGHT_SHOULDER, LEFT_HIP, RIGHT_HIP]
+
+def init_crop_region(image_height, image_width):
+    """Square region covering the whole frame, centered, padded on the short side"""
+    if image_width > image_height:
+        box_height = image_width / image_height
+        box_width = 1.0
+        y_min = (image_height / 2 - image_width / 2) / image_height
+        x_min = 0.0
+    else:
+        box_height = 1.0
+        box_width = image_height / image_width
+        y_min = 0.0
+        x_min = (image_width / 2 - image_height / 2) / image_width
+
+    return {
+        'y_min': y_min,
+        'x_min': x_min,
+        'y_max': y_min + box_height,
+        'x_max': x_min + box_width,
+        'height': box_height,
+        'width': box_width
+    }
+
+def torso_visible(keypoints):
+    """At least one shoulder and one hip are confidently detected"""
+    scores = keypoints[:, 2]
+    return ((scores[LEFT_HIP] > MIN_CROP_KEYPOINT_SCORE or scores[RIGHT_HIP] > MIN_CROP_KEYPOINT_SCORE) and
+            (scores[LEFT_SHOULDER] > MIN_CROP_KEYPOINT_SCORE or scores[RIGHT_SHOULDER] > MIN_CROP_KEYPOINT_SCORE))
+
+def determine_crop_region(keypoints, image_height, image_width):
+    """
+    Crop region for the next frame from this frame's full-frame keypoints
+
+    Centers on the hips and sizes the square from the torso and body extents,
+    falling back to the full frame when the torso is not visible.
+    """
+    if not torso_visible(keypoints):
+        return init_crop_region(image_height, image_width)
+
+    points = keypoints[:, :2] * np.array([image_height, image_width])
+    center_y = (points[LEFT_HIP, 0] + points[RIGHT_HIP, 0]) / 2
+    center_x = (points[LEFT_HIP, 1] + points[RIGHT_HIP, 1]) / 2
+
+    torso = points[TORSO_KEYPOINTS]
+    max_torso_yrange = np.max(np.abs(center_y - torso[:, 0]))
+    max_torso_xrange = np.max(np.abs(center_x - torso[:, 1]))
+
+    visible = points[keypoints[:, 2] > MIN_CROP_KEYPOINT_SCORE]
+    max_body_yrange = np.max(np.abs(center_y - visible[:, 0]))
+    max_body_xrange = np.max(np.abs(center_x - visible[:, 1]))
+
+    crop_length_half = max(max_torso_xrange * 1.9, max_torso_yrange * 1.9,
+                           max_body_yrange * 1.2, max_body_xrange * 1.2)
+    crop_length_half = min(crop_length_half, max(center_x, image_width - center_x,
+                                                 center_y, image_height - center_y))
+
+    if crop_length_half > max(image_width, image_height) / 2:
+        return init_crop_region(image_height, image_width)
+
+    crop_length = crop_length_half * 2
+    y_min = (center_y - crop_length_half) / image_height
+    x_min = (center_x - crop_length_half) / image_width
+
+    return {
+        'y_min': y_min,
+        'x_min': x_min,
+        'y_max': y_min + crop_length / image_height,
+        'x_max': x_min + crop_length / image_width,
+        'height': crop_length / image_height,
+        'width': crop_length / image_width
+    }
+
+def crop_and_resize(image, crop_region, size, out=None, scratch=None):
+    """
+    Cut the crop region out of a BGR frame and resize it to a (size, size) RGB model input
+
+    out / scratch: optional preallocated (size, size, 3) uint8 buffers for the
+                   RGB result and the intermediate BGR crop
+    """
+    h, w = image.shape[:2]
+    scale = size / (crop_region['height'] * h)
+
+    # One affine warp does the crop, the resize and the black padding outside the frame
+    matrix = np.array([
+        [scale, 0, -crop_region['x_min'] * w * scale],
+        [0, scale, -crop_region['y_min'] * h * scale]
+    ], dtype=np.float32)
+    cropped = cv2.warpAffine(image, matrix, (size, size), dst=scratch, flags=cv2.INTER_LINEAR,
+                             borderMode=cv2.BORDER_CONSTANT, borderValue=(0, 0, 0))
+
+    return cv2.cvtColor(cropped, cv2.COLOR_BGR2RGB, dst=out)
+
+class CropTracker:
+    """Per-stream crop region that follows the person from frame to frame"""
+    def __init__(self):
+        self.crop_region = None
+        self.frame_shape = None
+        self.frames_tracked = 0
+        self.frames_full = 0
+
+    def region(self, image_height, image_width):
+        """Crop region to use for the next frame"""
+        if self.crop_region is None or self.frame_shape != (image_height, image_width):
+            self.frame_shape = (image_height, image_width)
+            self.crop_region = init_crop_region(image_height, image_width)
+        return self.crop_region
+
+    def to_frame_coordinates(self, keypoints, crop_region):
+        """Map keypoints predicted on the crop back to normalized full-frame coordinates"""
+        mapped = np.array(keypoints, dtype=np.float32, copy=True)
+        mapped[..., 0] = crop_region['y_min'] + mapped[..., 0] * crop_region['height']
+        mapped[..., 1] = crop_region['x_min'] + mapped[..., 1] * crop_region['width']
+        return mapped
+
+    def update(self, keypoints):
+        """Pick the next frame's region from full-frame keypoints"""
+        image_height, image_width = self.frame_shape
+        if torso_visible(keypoints):
+            self.frames_tracked += 1
+        else:
+            self.frames_full += 1
+        self.crop_region = determine_crop_region(keypoints, image_height, image_width)
+
+    def reset(self):
+        """Drop tracking, e.g. at the start of a new video"""
+        self.crop_region = None
+        self.frame_shape = None
+        self.frames_tracked = 0
+        self.frames_full = 0
+
+    def get_stats(self):
+        return {
+            'frames_tracked': self.frames_tracked,
+            'frames_full_frame': self.frames_full
+        }
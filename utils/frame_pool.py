@@ -0,0 +1,83 @@
+import threading
+import tracemalloc
+
+import numpy as np
+
+class FramePool:
+    """
+    Recycles decoded frame buffers so steady-state decoding allocates nothing
+
+    The decoder acquires a buffer per frame and reads into it; whoever consumes
+    the frame last (the encoder, or the analysis loop) releases it. The pool
+    only grows while more frames are in flight than it holds - with bounded
+    batches and queues that stops after the first few frames.
+    """
+    def __init__(self, shape, dtype=np.uint8):
+        self.shape = tuple(shape)
+        self.dtype = np.dtype(dtype)
+        self.allocated = 0
+        self._free = []
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        """Get a free buffer, allocating only when none is available"""
+        with self._lock:
+            if self._free:
+                return self._free.pop()
+            self.allocated += 1
+        return np.empty(self.shape, dtype=self.dtype)
+
+    def release(self, frame):
+        """Return a buffer once nothing downstream holds it any more"""
+        if frame is None or frame.shape != self.shape or frame.dtype != self.dtype:
+            return
+        with self._lock:
+            self._free.append(frame)
+
+class AllocationProbe:
+    """
+    Measure Python-heap allocations per frame with tracemalloc
+
+    Covers NumPy and OpenCV arrays (both allocate through NumPy, which reports
+    to tracemalloc); TensorFlow's own allocator is not visible. transient
+    bytes are everything allocated and freed again within a frame, retained
+    bytes what a frame left behind.
+    """
+    def __init__(self):
+        self.frames = 0
+        self.transient_total = 0
+        self.transient_max = 0
+        self.retained_total = 0
+        self._base = 0
+        self._started_tracing = False
+
+    def start(self):
+        if not tracemalloc.is_tracing():
+            tracemalloc.start()
+            self._started_tracing = True
+
+    def stop(self):
+        if self._started_tracing:
+            tracemalloc.stop()
+            self._started_tracing = False
+
+    def begin_frame(self):
+        tracemalloc.reset_peak()
+        self._base = tracemalloc.get_traced_memory()[0]
+
+    def end_frame(self):
+        current, peak = tracemalloc.get_traced_memory()
+        transient = max(peak - self._base, 0)
+        self.frames += 1
+        self.transient_total += transient
+        self.transient_max = max(self.transient_max, transient)
+        self.retained_total += current - self._base
+
+    def get_stats(self):
+        frames = max(self.frames, 1)
+        return {
+            'frames': self.frames,
+            'avg_transient_bytes_per_frame': self.transient_total / frames,
+            'max_transient_bytes_per_frame': self.transient_max,
+            'avg_retained_bytes_per_frame': self.retained_total / frames
+        }
@@ -0,0 +1,199 @@
+"""
+Live frame sources and latest-frame-wins capture
+
+A FrameSource delivers frames at its own pace, the way a camera does:
+
+    CameraSource      a cv2.VideoCapture device
+    VideoFileSource   a video file played back in real time (optionally looped)
+    SyntheticSource   a drawn stick figure doing a scripted exercise, no camera
+                      or file needed (pairs with models.synthetic_backend)
+
+LatestFrameCapture reads a source on its own thread and keeps only the newest
+frame. A consumer that falls behind gets the most recent frame instead of a
+backlog of stale ones; every frame it never saw counts as dropped.
+"""
+import threading
+import time
+
+import cv2
+import numpy as np
+
+from utils.frame_pool import FramePool
+from utils.pose_drawing import draw_keypoints
+
+class FrameSource:
+    """Base class - read() blocks until the next frame is due, like a camera"""
+    name = None
+    fps = 30.0
+
+    def read(self, buffer=None):
+        """Next BGR frame (decoded into buffer when given), or None when the source ended"""
+        raise NotImplementedError
+
+    def close(self):
+        pass
+
+class CameraSource(FrameSource):
+    """A camera opened with cv2.VideoCapture"""
+    def __init__(self, index=0):
+        self.name = f"camera {index}"
+        self.cap = cv2.VideoCapture(index)
+        # Keep the driver from queuing frames on top of the capture thread
+        self.cap.set(cv2.CAP_PROP_BUFFERSIZE, 1)
+        self.fps = self.cap.get(cv2.CAP_PROP_FPS) or 30.0
+
+    def is_opened(self):
+        return self.cap.isOpened()
+
+    def read(self, buffer=None):
+        ret, frame = self.cap.read(buffer)
+        return frame if ret else None
+
+    def close(self):
+        self.cap.release()
+
+class _Pacer:
+    """Sleeps so frames come out at a fixed rate from the first one on"""
+    def __init__(self, fps):
+        self.interval = 1.0 / fps
+        self.start = None
+        self.count = 0
+
+    def wait(self):
+        if self.start is None:
+            self.start = time.perf_counter()
+        delay = self.start + self.count * self.interval - time.perf_counter()
+        if delay > 0:
+            time.sleep(delay)
+        self.count += 1
+
+class VideoFileSource(FrameSource):
+    """A video file played back at its frame rate, as if it were a camera"""
+    def __init__(self, path, loop=False, realtime=True):
+        self.name = str(path)
+        self.cap = cv2.VideoCapture(str(path))
+        self.fps = self.cap.get(cv2.CAP_PROP_FPS) or 30.0
+        self.loop = loop
+        self.pacer = _Pacer(self.fps) if realtime else None
+
+    def read(self, buffer=None):
+        if self.pacer is not None:
+            self.pacer.wait()
+        ret, frame = self.cap.read(buffer)
+        if not ret and self.loop:
+            self.cap.set(cv2.CAP_PROP_POS_FRAMES, 0)
+            ret, frame = self.cap.read(buffer)
+        return frame if ret else None
+
+    def close(self):
+        self.cap.release()
+
+class SyntheticSource(FrameSource):
+    """
+    Frames of a stick figure following a models.synthetic_backend script
+
+    Exercises capture, motion gating, rendering and display at camera pace
+    without a camera; pair it with SyntheticPoseBackend for keypoints that
+    match the drawing.
+    """
+    name = 'synthetic'
+
+    def __init__(self, exercise_type='squat', width=640, height=480, fps=30.0, num_frames=None):
+        from models.synthetic_backend import SyntheticPoseBackend
+
+        self.backend = SyntheticPoseBackend(exercise_type, fps=fps)
+        self.shape = (height, width, 3)
+        self.fps = fps
+        self.num_frames = num_frames
+        self.pacer = _Pacer(fps)
+        self.index = 0
+
+    def read(self, buffer=None):
+        if self.num_frames is not None and self.index >= self.num_frames:
+            return None
+        self.pacer.wait()
+
+        frame = buffer if buffer is not None and buffer.shape == self.shape else np.empty(self.shape, np.uint8)
+        frame[:] = 48
+        draw_keypoints(frame, self.backend.keypoints_at(self.index))
+        self.index += 1
+        return frame
+
+class LatestFrameCapture:
+    """
+    Read a FrameSource on a dedicated thread, always handing out the newest frame
+
+    Frames are decoded into recycled buffers; give each frame back with
+    release() once it is no longer needed.
+    """
+    def __init__(self, source):
+        self.source = source
+        self.captured = 0
+        self.delivered = 0
+        self.dropped = 0
+
+        self._pool = None
+        self._latest = None
+        self._ended = False
+        self._cond = threading.Condition()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="frame-capture", daemon=True)
+        self._thread.start()
+
+    def _run(self):
+        try:
+            while not self._stop.is_set():
+                buffer = self._pool.acquire() if self._pool is not None else None
+                frame = self.source.read(buffer)
+                if frame is None:
+                    break
+                if self._pool is None:
+                    self._pool = FramePool(frame.shape, frame.dtype)
+
+                with self._cond:
+                    if self._latest is not None:
+                        # Never picked up - the consumer moved on to a newer frame
+                        self.dropped += 1
+                        self._pool.release(self._latest[0])
+                    self._latest = (frame, time.perf_counter(), self.captured)
+                    self.captured += 1
+                    self._cond.notify_all()
+        finally:
+            with self._cond:
+                self._ended = True
+                self._cond.notify_all()
+
+    def latest(self, timeout=None):
+        """
+        Wait for a frame newer than the last one returned
+
+        Returns:
+            (frame, captured_at, index), or None once the source has ended
+            (or after timeout seconds without a new frame)
+        """
+        with self._cond:
+            if not self._cond.wait_for(lambda: self._latest is not None or self._ended, timeout):
+                return None
+            item, self._latest = self._latest, None
+            if item is not None:
+                self.delivered += 1
+            return item
+
+    def release(self, frame):
+        """Return a frame's buffer for the capture thread to reuse"""
+        if self._pool is not None:
+            self._pool.release(frame)
+
+    def close(self):
+        self._stop.set()
+        self._thread.join(timeout=1.0)
+        self.source.close()
+
+    def get_stats(self):
+        return {
+            'source': self.source.name,
+            'captured': self.captured,
+            'delivered': self.delivered,
+            'dropped': self.dropped,
+            'drop_rate': self.dropped / max(self.captured, 1) * 100
+        }
@@ -0,0 +1,128 @@
+"""
+Content-addressed keypoint cache
+
+Pose inference is the slow part of an analysis, and its result depends only
+on the video's content and on how keypoints were extracted - not on the
+exercise standards or the analyzer. The cache keeps the (frames, 17, 3)
+keypoint array of every analyzed video, keyed by
+
+    video fingerprint   BLAKE2b of the file size, its first and last MB and
+                        evenly spaced blocks in between - renamed or
+                        re-uploaded copies of a video share it, and hashing
+                        a large file reads about 6 MB
+    extraction settings model variant and backend settings, pose confidence
+                        threshold, stride, motion gate and decoder
+
+so re-running a video with another exercise selected or changed thresholds
+goes straight from the cached keypoints to angles and rep analysis.
+
+One .npy file per key under cache/keypoints (or $KEYPOINT_CACHE_DIR), NaN
+rows for frames without a pose. The keypoints are stored as the float32 the
+model returned - not in the quantized utils.pose_store format - so a cache
+hit gives exactly the angles and rep counts of the run that filled it.
+"""
+import hashlib
+import json
+import os
+import tempfile
+from pathlib import Path
+
+import numpy as np
+
+from utils.storage_manager import touch
+
+# Bump when keypoint extraction changes in a way the settings don't capture
+KEYPOINT_CACHE_VERSION = 2
+
+EDGE_BYTES = 1 << 20
+SAMPLE_BYTES = 64 << 10
+SAMPLE_COUNT = 64
+
+_fingerprints = {}
+
+def video_fingerprint(path):
+    """Fast content hash of a video file, memoized per (path, size, mtime)"""
+    stat = os.stat(path)
+    memo_key = (os.path.abspath(path), stat.st_size, stat.st_mtime_ns)
+    fingerprint = _fingerprints.get(memo_key)
+    if fingerprint is not None:
+        return fingerprint
+
+    size = stat.st_size
+    digest = hashlib.blake2b(str(size).encode(), digest_size=20)
+    with open(path, 'rb') as f:
+        if size <= 2 * EDGE_BYTES + SAMPLE_COUNT * SAMPLE_BYTES:
+            digest.update(f.read())
+        else:
+            digest.update(f.read(EDGE_BYTES))
+            step = (size - 2 * EDGE_BYTES) // SAMPLE_COUNT
+            for i in range(SAMPLE_COUNT):
+                f.seek(EDGE_BYTES + i * step)
+                digest.update(f.read(SAMPLE_BYTES))
+            f.seek(size - EDGE_BYTES)
+            digest.update(f.read(EDGE_BYTES))
+
+    fingerprint = _fingerprints[memo_key] = digest.hexdigest()
+    return fingerprint
+
+class KeypointCache:
+    """Keypoint arrays on disk, keyed by video content and extraction settings"""
+    def __init__(self, cache_dir=None):
+        self.cache_dir = Path(cache_dir or os.environ.get('KEYPOINT_CACHE_DIR', 'cache/keypoints'))
+        self.hits = 0
+        self.misses = 0
+
+    def key(self, video_path, settings):
+        """Cache key for keypoints extracted from video_path with settings (a JSON-able dict)"""
+        settings = json.dumps(dict(settings, version=KEYPOINT_CACHE_VERSION), sort_keys=True)
+        digest = hashlib.blake2b(settings.encode(), digest_size=8).hexdigest()
+        return f"{video_fingerprint(video_path)}-{digest}"
+
+    def path(self, key):
+        return self.cache_dir / f"{key}.npy"
+
+    def load(self, key):
+        """(frames, 17, 3) float32 keypoints, NaN for frames without a pose - or None on a miss"""
+        path = self.path(key)
+        try:
+            keypoints = np.load(path)
+        except FileNotFoundError:
+            self.misses += 1
+            return None
+        except (OSError, ValueError) as e:
+            print(f"Ignoring unreadable keypoint cache entry {path}: {e}")
+            self.misses += 1
+            return None
+
+        self.hits += 1
+        touch(path)
+        return keypoints
+
+    def save(self, key, keypoints):
+        """Store per-frame keypoints (an array, or a list with None for frames without a pose)"""
+        array = np.full((len(keypoints), 17, 3), np.nan, dtype=np.float32)
+        for i, frame_keypoints in enumerate(keypoints):
+            if frame_keypoints is not None:
+                array[i] = frame_keypoints
+
+        path = self.path(key)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        # Write then rename, so a concurrent reader never sees half a file; the
+        # temporary name is unique per writer, as sessions share one process
+        fd, temp_path = tempfile.mkstemp(dir=path.parent, prefix=f"{path.name}.", suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                np.save(f, array)
+            os.replace(temp_path, path)
+        except BaseException:
+            Path(temp_path).unlink(missing_ok=True)
+            raise
+        return path
+
+    def get_stats(self):
+        return {'cache_dir': str(self.cache_dir), 'hits': self.hits, 'misses': self.misses}
+
+def cached_keypoints(keypoints):
+    """Per-frame keypoints of a cached array - None for the NaN (no pose) frames"""
+    for frame_keypoints in keypoints:
+        yield None if np.isnan(frame_keypoints[0, 0]) else frame_keypoints
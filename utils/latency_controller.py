@@ -0,0 +1,142 @@
+"""
+Latency-SLO controller for real-time processing
+
+The webcam loop records how long each displayed frame took from capture to
+display. The controller keeps those latencies in a histogram and, when the
+recent 90th percentile misses the target, steps down one degradation level:
+
+    0 full               selected model, every frame annotated and shown
+    1 fast model         a faster MoveNet variant
+    2 small frames       frames downscaled to 480 rows before anything else
+    3 half display rate  every 2nd frame shown
+    4 third display rate every 3rd frame shown
+
+There is no reduced-overlay level: the sprite-cached overlay (utils.overlay)
+costs well under a millisecond per frame, less than any scheme that reuses
+an earlier frame's banner.
+
+Once the recent latencies have comfortable headroom it steps back up. After
+each change it waits for a fresh window of samples, so it never reacts to
+latencies measured at the previous level.
+"""
+from collections import deque
+
+import numpy as np
+
+DEGRADATION_LEVELS = [
+    {'name': 'full', 'fast_model': False, 'max_height': None, 'display_every': 1},
+    {'name': 'fast model', 'fast_model': True, 'max_height': None, 'display_every': 1},
+    {'name': 'small frames', 'fast_model': True, 'max_height': 480, 'display_every': 1},
+    {'name': 'half display rate', 'fast_model': True, 'max_height': 480, 'display_every': 2},
+    {'name': 'third display rate', 'fast_model': True, 'max_height': 480, 'display_every': 3}
+]
+
+# Histogram bucket upper edges in milliseconds
+LATENCY_BUCKETS_MS = (10, 20, 33, 50, 75, 100, 150, 200, 300, 500, 750, 1000, 2000, 5000, float('inf'))
+
+class LatencyHistogram:
+    """Counts of latency samples per bucket, plus the running mean and max"""
+    def __init__(self, buckets=LATENCY_BUCKETS_MS):
+        self.buckets = tuple(buckets)
+        self.counts = [0] * len(self.buckets)
+        self.total = 0
+        self.sum_ms = 0.0
+        self.max_ms = 0.0
+
+    def record(self, latency_ms):
+        self.counts[int(np.searchsorted(self.buckets, latency_ms))] += 1
+        self.total += 1
+        self.sum_ms += latency_ms
+        self.max_ms = max(self.max_ms, latency_ms)
+
+    def percentile(self, p):
+        """Upper bucket edge below which p percent of the samples fall"""
+        if not self.total:
+            return 0.0
+        threshold = self.total * p / 100.0
+        seen = 0
+        for edge, count in zip(self.buckets, self.counts):
+            seen += count
+            if seen >= threshold:
+                return min(edge, self.max_ms)
+        return self.max_ms
+
+    def labels(self):
+        """Bucket labels for display, e.g. '≤33 ms'"""
+        return [f"≤{edge:g} ms" if edge != float('inf') else f">{self.buckets[-2]:g} ms" for edge in self.buckets]
+
+    def get_stats(self):
+        return {
+            'samples': self.total,
+            'mean_ms': self.sum_ms / max(self.total, 1),
+            'p50_ms': self.percentile(50),
+            'p90_ms': self.percentile(90),
+            'p99_ms': self.percentile(99),
+            'max_ms': self.max_ms
+        }
+
+class LatencyController:
+    """
+    Steps the degradation level down when latency misses the target and back up with headroom
+
+    Decisions use the 90th percentile of the last `window` samples; stepping
+    up needs it below headroom * target_ms.
+    """
+    def __init__(self, target_ms=150.0, levels=DEGRADATION_LEVELS, window=30, headroom=0.6):
+        self.target_ms = target_ms
+        self.levels = levels
+        self.window = window
+        self.headroom = headroom
+        self.histogram = LatencyHistogram()
+        self.reset()
+
+    def reset(self):
+        self.level = 0
+        self.recent = deque(maxlen=self.window)
+        self.level_changes = 0
+        self.frames = 0
+        self.last_ms = 0.0
+
+    @property
+    def settings(self):
+        """Work settings of the current level (see DEGRADATION_LEVELS)"""
+        return self.levels[self.level]
+
+    def should_display(self):
+        """Whether the current frame is shown at this level's display rate"""
+        return self.frames % self.settings['display_every'] == 0
+
+    def next_frame(self):
+        self.frames += 1
+
+    def record(self, latency_ms):
+        """Record one frame's capture-to-display latency; returns the level change (-1, 0, 1)"""
+        self.last_ms = latency_ms
+        self.histogram.record(latency_ms)
+        self.recent.append(latency_ms)
+        if len(self.recent) < self.window:
+            return 0
+
+        p90 = float(np.percentile(self.recent, 90))
+        if p90 > self.target_ms and self.level < len(self.levels) - 1:
+            change = 1
+        elif p90 < self.target_ms * self.headroom and self.level > 0:
+            change = -1
+        else:
+            return 0
+
+        self.level += change
+        self.level_changes += 1
+        self.recent.clear()
+        return change
+
+    def get_stats(self):
+        stats = self.histogram.get_stats()
+        stats.update({
+            'last_ms': self.last_ms,
+            'target_ms': self.target_ms,
+            'level': self.level,
+            'level_name': self.settings['name'],
+            'level_changes': self.level_changes
+        })
+        return stats
@@ -0,0 +1,292 @@
+"""
+Real-time analysis session
+
+Runs a live FrameSource through three overlapping stages:
+
+    capture thread    LatestFrameCapture - newest frame wins, stale ones dropped
+    inference thread  motion gate + MoveNet on the newest frame
+    caller's thread   rep analysis, overlay, display
+
+so MoveNet works on frame N+1 while frame N is drawn and displayed. The
+degradation level of a LatencyController (faster model, smaller frames,
+lower display rate) is applied per frame.
+
+Reproduce real-time behavior without a camera or a model:
+
+    python -m utils.live_session [--source synthetic|<video>] [--seconds 10] [--inference-ms 60]
+"""
+import argparse
+import sys
+import time
+
+import cv2
+
+from utils.frame_source import LatestFrameCapture, SyntheticSource, VideoFileSource
+from utils.latency_controller import LatencyController
+from utils.motion_gate import MotionGate
+from utils.overlay import OverlayRenderer
+from utils.pipeline import PipelineStage
+
+LIVE_EXERCISE_NAMES = {
+    'squat': 'SQUAT',
+    'pushup': 'PUSH-UP',
+    'plank': 'PLANK',
+    'lunges': 'LUNGES',
+    'jumping_jacks': 'JUMPING JACKS',
+    'situp': 'SIT-UP',
+    'high_knees': 'HIGH KNEES',
+    'burpees': 'BURPEES',
+    'mountain_climbers': 'MOUNTAIN CLIMBERS',
+    'side_plank': 'SIDE PLANK',
+    'running': 'RUNNING',
+    'crunches': 'CRUNCHES',
+    'leg_raises': 'LEG RAISES',
+    'bicycle_crunches': 'BICYCLE CRUNCHES',
+    'standing_knee_raises': 'KNEE RAISES',
+    'wall_sit': 'WALL SIT',
+    'glute_bridge': 'GLUTE BRIDGE',
+    'jumping': 'JUMPING',
+    'star_jumps': 'STAR JUMPS',
+    'squat_jumps': 'SQUAT JUMPS'
+}
+
+BANNER_HEIGHT = 300
+
+# Per-frame backend stats (cascade escalation flags) kept while live - the
+# stream runs indefinitely, the counters still cover the whole session
+LIVE_HISTORY_FRAMES = 300
+
+def draw_live_overlay(overlay, frame, keypoints, feedback, exercise_type):
+    """Large-print banner for the live view: exercise, feedback and reps, or a no-pose prompt"""
+    if keypoints is None:
+        # No pose detected
+        overlay.text(frame, "NO POSE DETECTED", (30, 70),
+                     cv2.FONT_HERSHEY_DUPLEX, 1.4, (0, 0, 255), 4)
+        overlay.text(frame, "Please step into frame", (30, 120),
+                     cv2.FONT_HERSHEY_DUPLEX, 1.0, (255, 255, 255), 3)
+        return frame
+
+    # Draw semi-transparent background (taller)
+    overlay.banner(frame, 0, BANNER_HEIGHT, (0, 0, 0), 0.7)
+
+    y_offset = 55
+
+    # 1. Exercise Name (Largest, English only, uppercase)
+    name = LIVE_EXERCISE_NAMES.get(exercise_type, exercise_type.upper())
+    overlay.text(frame, name, (30, y_offset),
+                 cv2.FONT_HERSHEY_DUPLEX, 1.6, (255, 255, 0), 4)
+    y_offset += 70
+
+    # 2. Feedback Messages (Larger with icons and colors)
+    for key, message in feedback.items():
+        if key in ['detected', 'reps']:
+            continue
+
+        # Choose color based on feedback
+        if "Perfect" in message or "Good" in message or "Excellent" in message:
+            color = (0, 255, 0)  # Green
+            icon = "✓"
+        elif "Watch" in message or "Adjust" in message or "Keep" in message:
+            color = (0, 165, 255)  # Orange
+            icon = "!"
+        else:
+            color = (0, 0, 255)  # Red
+            icon = "✗"
+
+        # Draw message with icon (larger)
+        overlay.text(frame, f"{icon} {message}", (30, y_offset),
+                     cv2.FONT_HERSHEY_DUPLEX, 1.15, color, 3)
+        y_offset += 52
+
+    # 3. Rep Counter (Largest with green box)
+    if 'reps' in feedback:
+        # Draw green box background
+        cv2.rectangle(frame, (20, y_offset - 38), (300, y_offset + 12),
+                      (0, 255, 0), 3)
+        cv2.rectangle(frame, (22, y_offset - 36), (298, y_offset + 10),
+                      (0, 120, 0), -1)
+
+        # Draw REPS text (white, very large)
+        overlay.text(frame, feedback['reps'], (35, y_offset - 5),
+                     cv2.FONT_HERSHEY_DUPLEX, 1.6, (255, 255, 255), 4)
+
+    return frame
+
+class LiveSession:
+    """Capture, inference and rendering of a live source on overlapping threads"""
+    def __init__(self, source, recognizer, exercise_analyzer, controller=None, fast_recognizer=None,
+                 gate=None, overlay=None, history_frames=LIVE_HISTORY_FRAMES):
+        """
+        Args:
+            source: a utils.frame_source.FrameSource
+            controller: LatencyController, default one with a 150 ms target
+            fast_recognizer: callable returning the recognizer for the
+                             controller's fast-model levels, or None while it
+                             is not ready yet
+            gate: MotionGate, default a new one
+            history_frames: per-frame stats the recognizers keep during the
+                            session; lifted again when it ends, since the
+                            recognizer may be reused for a recorded video
+        """
+        self.source = source
+        self.recognizer = recognizer
+        self.exercise_analyzer = exercise_analyzer
+        self.controller = controller or LatencyController()
+        self.fast_recognizer = fast_recognizer
+        self.gate = gate or MotionGate()
+        self.overlay = overlay or OverlayRenderer()
+        self.history_frames = history_frames
+        self._limited = []
+        self.capture = None
+        self.frames_shown = 0
+
+    def _active_recognizer(self, settings):
+        recognizer = self.recognizer
+        if settings['fast_model'] and self.fast_recognizer is not None:
+            recognizer = self.fast_recognizer() or recognizer
+        if recognizer not in self._limited:
+            recognizer.limit_history(self.history_frames)
+            self._limited.append(recognizer)
+        return recognizer
+
+    def _infer(self):
+        """Inference thread: yield (frame, captured_at, keypoints, recognizer) for the newest frames"""
+        last_keypoints = None
+        while True:
+            item = self.capture.latest()
+            if item is None:
+                return
+            captured, captured_at, index = item
+            settings = self.controller.settings
+
+            # Small-frames level: downscale once, everything after works on the small frame.
+            # A fresh array per frame - several frames are in flight between the threads.
+            max_height = settings['max_height']
+            if max_height and captured.shape[0] > max_height:
+                size = (int(captured.shape[1] * max_height / captured.shape[0]), max_height)
+                frame = cv2.resize(captured, size, interpolation=cv2.INTER_AREA)
+                self.capture.release(captured)
+            else:
+                frame = captured
+
+            recognizer = self._active_recognizer(settings)
+
+            # Extract keypoints - skipped when nothing moved since the last inferred frame
+            if self.gate.needs_inference(frame):
+                recognizer.set_frame_indices([index])
+                keypoints = recognizer.extract_keypoints(frame)
+                if not recognizer.has_pose(keypoints):
+                    keypoints = None
+                last_keypoints = keypoints
+                self.gate.set_person(keypoints)
+            else:
+                keypoints = last_keypoints
+                self.gate.record_skip(keypoints is not None)
+            self.gate.record_pose(keypoints is not None)
+
+            yield frame, captured_at, keypoints, recognizer
+
+            # Drop to an idle rate while nobody is in frame
+            if self.gate.is_idle():
+                time.sleep(0.5)
+
+    def frames(self):
+        """
+        Yield (annotated BGR frame, info) for every frame to display
+
+        info has 'display' (False for frames the current display rate skips),
+        'captured_at' and 'keypoints'. The caller shows the frame before
+        asking for the next one, so the time until then is recorded as the
+        frame's capture-to-display latency.
+        """
+        self.capture = LatestFrameCapture(self.source)
+        inference = PipelineStage('inference', self._infer(), maxsize=1)
+        controller = self.controller
+        try:
+            for frame, captured_at, keypoints, recognizer in inference:
+                feedback = {}
+                if keypoints is not None:
+                    # Calculate angles
+                    angles = recognizer.calculate_angles(keypoints)
+
+                    # Analyze frame
+                    feedback, _ = self.exercise_analyzer.analyze_frame(angles)
+
+                    # Draw skeleton
+                    frame = self.overlay.skeleton(frame, keypoints)
+
+                draw_live_overlay(self.overlay, frame, keypoints, feedback, self.exercise_analyzer.exercise_type)
+
+                display = controller.should_display()
+                yield frame, {'display': display, 'captured_at': captured_at, 'keypoints': keypoints}
+
+                if display:
+                    controller.record((time.perf_counter() - captured_at) * 1000)
+                    self.frames_shown += 1
+                controller.next_frame()
+                self.capture.release(frame)
+        finally:
+            inference.close()
+            self.capture.close()
+            for recognizer in self._limited:
+                recognizer.limit_history(None)
+            self._limited = []
+
+    def get_stats(self):
+        stats = {
+            'latency': self.controller.get_stats(),
+            'gate': self.gate.get_stats(),
+            'frames_shown': self.frames_shown,
+            'reps': self.exercise_analyzer.rep_count
+        }
+        if self.capture is not None:
+            stats['capture'] = self.capture.get_stats()
+        return stats
+
+def main(argv):
+    parser = argparse.ArgumentParser(prog='python -m utils.live_session',
+                                     description='Run the live pipeline headless on a camera-paced source')
+    parser.add_argument('--source', default='synthetic', help="'synthetic' or a video file played in real time")
+    parser.add_argument('--exercise', default='squat')
+    parser.add_argument('--seconds', type=float, default=10.0)
+    parser.add_argument('--target-ms', type=float, default=150.0, help='latency target')
+    parser.add_argument('--inference-ms', type=float, default=0.0,
+                        help='simulated inference time of the synthetic backend')
+    parser.add_argument('--model', action='store_true', help='use MoveNet instead of the synthetic backend')
+    args = parser.parse_args(argv)
+
+    from models.exercise_analyzer import ExerciseAnalyzer
+    from models.synthetic_backend import SyntheticPoseBackend
+    from models.tfhub_recognizer import TFHubExerciseRecognizer
+
+    if args.source == 'synthetic':
+        source = SyntheticSource(args.exercise)
+    else:
+        source = VideoFileSource(args.source, loop=True)
+
+    if args.model:
+        recognizer = TFHubExerciseRecognizer()
+    else:
+        backend = SyntheticPoseBackend(args.exercise, fps=source.fps, delay=args.inference_ms / 1000)
+        recognizer = TFHubExerciseRecognizer(backend=backend)
+
+    session = LiveSession(source, recognizer, ExerciseAnalyzer(exercise_type=args.exercise),
+                          LatencyController(args.target_ms))
+    deadline = time.perf_counter() + args.seconds
+    frames = session.frames()
+    for _ in frames:
+        if time.perf_counter() > deadline:
+            break
+    frames.close()
+
+    stats = session.get_stats()
+    latency, capture = stats['latency'], stats['capture']
+    print(f"{capture['captured']} frames captured from {capture['source']}, {capture['dropped']} dropped "
+          f"({capture['drop_rate']:.1f}%), {stats['frames_shown']} shown, {stats['reps']} reps")
+    print(f"Latency p50 {latency['p50_ms']:.0f} ms, p90 {latency['p90_ms']:.0f} ms, p99 {latency['p99_ms']:.0f} ms "
+          f"(target {latency['target_ms']:.0f} ms), final level {latency['level']} ({latency['level_name']}), "
+          f"{latency['level_changes']} level changes")
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv[1:]))
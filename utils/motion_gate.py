@@ -0,0 +1,154 @@
+import sys
+import time
+
+import cv2
+import numpy as np
+
+class MotionGate:
+    """
+    Cheap pre-inference check that skips MoveNet when nothing in the frame changed
+
+    Each frame is downscaled to a small grayscale thumbnail and compared with
+    the thumbnail of the last frame that went through inference. If only a
+    tiny fraction of pixels changed, the previous result is reused: its
+    keypoints when a person was in frame ("static"), or "no pose" when the
+    scene was empty ("empty"). A frame is forced through inference at least
+    every max_skip frames so slow drift is never missed for long.
+
+    Once set_person() has been given the last inferred pose, the changed
+    fraction is measured inside the box around that person rather than over
+    the whole frame - an athlete far from the camera covers only a few
+    percent of it, and their movement would otherwise stay under
+    motion_fraction.
+    """
+    def __init__(self, width=64, pixel_threshold=12, motion_fraction=0.01, max_skip=30, idle_after=3.0,
+                 person_margin=0.25):
+        self.width = width
+        self.pixel_threshold = pixel_threshold
+        self.motion_fraction = motion_fraction
+        self.max_skip = max_skip
+        self.idle_after = idle_after
+        self.person_margin = person_margin
+        self.reset()
+
+    def reset(self):
+        """Forget the reference frame and counters"""
+        self.reference = None
+        self.region = None
+        self.skipped_in_row = 0
+        self.empty_since = None
+        self.stats = {
+            'frames': 0,
+            'inferred': 0,
+            'skipped_static': 0,
+            'skipped_empty': 0
+        }
+
+    def settings(self):
+        """Thresholds that decide which frames skip inference"""
+        return {
+            'width': self.width,
+            'pixel_threshold': self.pixel_threshold,
+            'motion_fraction': self.motion_fraction,
+            'max_skip': self.max_skip,
+            'person_margin': self.person_margin
+        }
+
+    def set_person(self, keypoints, min_score=0.3):
+        """
+        Measure motion around this pose from now on
+
+        keypoints are (17, 3) normalized [y, x, score] as the recognizer
+        returns them; None (no person) goes back to the whole frame.
+        """
+        points = None if keypoints is None else keypoints[keypoints[:, 2] > min_score, :2]
+        if points is None or len(points) < 2:
+            self.region = None
+            return
+        (y_min, x_min), (y_max, x_max) = points.min(axis=0), points.max(axis=0)
+        pad_y = (y_max - y_min) * self.person_margin
+        pad_x = (x_max - x_min) * self.person_margin
+        self.region = (max(y_min - pad_y, 0.0), max(x_min - pad_x, 0.0),
+                       min(y_max + pad_y, 1.0), min(x_max + pad_x, 1.0))
+
+    def _thumbnail(self, frame):
+        h, w = frame.shape[:2]
+        height = max(1, int(round(h * self.width / w)))
+        small = cv2.resize(frame, (self.width, height), interpolation=cv2.INTER_AREA)
+        small = cv2.cvtColor(small, cv2.COLOR_BGR2GRAY)
+        return cv2.GaussianBlur(small, (3, 3), 0)
+
+    def _changed(self, thumbnail):
+        if thumbnail.shape != self.reference.shape:
+            return True
+        diff = cv2.absdiff(thumbnail, self.reference)
+        if self.region is not None:
+            h, w = diff.shape
+            y_min, x_min, y_max, x_max = self.region
+            top, left = int(y_min * h), int(x_min * w)
+            diff = diff[top:max(int(np.ceil(y_max * h)), top + 2), left:max(int(np.ceil(x_max * w)), left + 2)]
+        return np.count_nonzero(diff > self.pixel_threshold) > self.motion_fraction * diff.size
+
+    def needs_inference(self, frame):
+        """True when the frame differs enough from the last inferred one to run the model"""
+        self.stats['frames'] += 1
+        thumbnail = self._thumbnail(frame)
+
+        if self.reference is None or self.skipped_in_row >= self.max_skip or self._changed(thumbnail):
+            self.reference = thumbnail
+            self.skipped_in_row = 0
+            self.stats['inferred'] += 1
+            return True
+
+        self.skipped_in_row += 1
+        return False
+
+    def record_skip(self, has_pose):
+        """Count a skipped frame as static (pose reused) or empty (no pose)"""
+        if has_pose:
+            self.stats['skipped_static'] += 1
+        else:
+            self.stats['skipped_empty'] += 1
+
+    def record_pose(self, has_pose, now=None):
+        """Track how long the scene has been empty, for idle polling"""
+        now = time.monotonic() if now is None else now
+        if has_pose:
+            self.empty_since = None
+        elif self.empty_since is None:
+            self.empty_since = now
+
+    def is_idle(self, now=None):
+        """True after idle_after seconds without a person in frame"""
+        if self.empty_since is None:
+            return False
+        now = time.monotonic() if now is None else now
+        return now - self.empty_since >= self.idle_after
+
+    def get_stats(self):
+        stats = dict(self.stats)
+        stats['skipped'] = stats['skipped_static'] + stats['skipped_empty']
+        stats['skip_rate'] = stats['skipped'] / max(stats['frames'], 1) * 100
+        return stats
+
+def main(argv):
+    if len(argv) < 1:
+        print("Usage: python -m utils.motion_gate <video> [exercise] [variant]")
+        return 1
+
+    from models.tfhub_recognizer import TFHubExerciseRecognizer
+    from utils.video_processor import VideoProcessor
+
+    exercise_type = argv[1] if len(argv) > 1 else 'squat'
+    recognizer = TFHubExerciseRecognizer(variant=argv[2] if len(argv) > 2 else None)
+
+    result = VideoProcessor().compare_motion_gate(argv[0], recognizer, exercise_type)
+    print(f"dense: {result['dense_reps']} reps in {result['dense_time_s']:.2f}s, "
+          f"gated: {result['gated_reps']} reps in {result['gated_time_s']:.2f}s "
+          f"({result['skip_rate']:.1f}% skipped, {result['speedup']:.2f}x)")
+    if result['rep_difference']:
+        print(f"Gated rep count is off by {result['rep_difference']:+d} - keep the gate off for this kind of video")
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv[1:]))
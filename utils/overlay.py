@@ -0,0 +1,217 @@
+"""
+Overlay renderer
+
+Draws the analysis overlay with as little per-frame work as possible:
+
+- banners are blended over their own rows only (utils.pose_drawing.blend_banner)
+- text is rasterized once per (string, font, scale, layers) into a cached
+  sprite - color plus alpha, with shadow and outline layers baked in - and
+  composited into the frame with two cv2 calls on the text's bounding box
+- the skeleton is drawn with a single polylines call for the bones and one
+  for the joints (utils.pose_drawing.draw_keypoints)
+
+Benchmark the per-frame overlay cost against plain cv2.putText drawing:
+
+    python -m utils.overlay [--frames 300] [--size 1920x1080]
+"""
+import argparse
+import sys
+import time
+from collections import OrderedDict
+
+import cv2
+import numpy as np
+
+from utils.pose_drawing import KEYPOINT_CONNECTIONS, blend_banner, draw_keypoints
+
+class TextSprite:
+    """
+    Pre-rendered text: premultiplied BGR and inverse alpha over the text's bounding box
+
+    layers: sequence of (dx, dy, color, thickness) drawn back to front - e.g. a
+    black shadow offset by (2, 2) under the colored text.
+    """
+    def __init__(self, text, font, scale, layers):
+        max_thickness = max(thickness for _, _, _, thickness in layers)
+        max_offset = max(max(abs(dx), abs(dy)) for dx, dy, _, _ in layers)
+        (width, height), baseline = cv2.getTextSize(text, font, scale, max_thickness)
+        pad = max_thickness + max_offset + 2
+
+        shape = (height + baseline + 2 * pad, width + 2 * pad)
+        color = np.zeros(shape + (3,), dtype=np.float32)
+        alpha = np.zeros(shape, dtype=np.float32)
+        mask = np.zeros(shape, dtype=np.uint8)
+        for dx, dy, layer_color, thickness in layers:
+            mask[:] = 0
+            cv2.putText(mask, text, (pad + dx, pad + height + dy), font, scale, 255, thickness, cv2.LINE_AA)
+            coverage = mask.astype(np.float32) / 255.0
+            color = color * (1.0 - coverage[..., None]) + np.float32(layer_color) * coverage[..., None]
+            alpha = alpha * (1.0 - coverage) + coverage
+
+        # Trim to the pixels the text actually covers
+        rows = np.flatnonzero(alpha.any(axis=1))
+        cols = np.flatnonzero(alpha.any(axis=0))
+        if len(rows) == 0:
+            rows = cols = np.array([0])
+        top, bottom, left, right = rows[0], rows[-1] + 1, cols[0], cols[-1] + 1
+
+        self.color = np.ascontiguousarray(np.round(color[top:bottom, left:right]).astype(np.uint8))
+        inverse = np.round((1.0 - alpha[top:bottom, left:right]) * 255.0).astype(np.uint8)
+        self.inverse_alpha = np.ascontiguousarray(np.repeat(inverse[..., None], 3, axis=2))
+
+        # Sprite position relative to the putText origin (bottom-left of the text)
+        self.offset_x = left - pad
+        self.offset_y = top - pad - height
+        self.text_size = (width, height)
+        self.baseline = baseline
+
+    def draw(self, image, org):
+        """Composite the sprite onto image in place with the text origin at org"""
+        x0, y0 = org[0] + self.offset_x, org[1] + self.offset_y
+        h, w = self.color.shape[:2]
+        image_h, image_w = image.shape[:2]
+
+        # Clip to the frame
+        sx0, sy0 = max(0, -x0), max(0, -y0)
+        sx1, sy1 = min(w, image_w - x0), min(h, image_h - y0)
+        if sx1 <= sx0 or sy1 <= sy0:
+            return image
+
+        roi = image[y0 + sy0:y0 + sy1, x0 + sx0:x0 + sx1]
+        cv2.multiply(roi, self.inverse_alpha[sy0:sy1, sx0:sx1], dst=roi, scale=1.0 / 255.0)
+        cv2.add(roi, self.color[sy0:sy1, sx0:sx1], dst=roi)
+        return image
+
+class OverlayRenderer:
+    """Draws overlay text, banners and skeletons, caching text sprites across frames"""
+    def __init__(self, max_sprites=256):
+        self.max_sprites = max_sprites
+        self.sprites = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def sprite(self, text, font, scale, layers):
+        """Cached TextSprite for a string and style"""
+        key = (text, font, scale, tuple((dx, dy, tuple(color), thickness) for dx, dy, color, thickness in layers))
+        sprite = self.sprites.get(key)
+        if sprite is not None:
+            self.hits += 1
+            self.sprites.move_to_end(key)
+            return sprite
+
+        self.misses += 1
+        sprite = self.sprites[key] = TextSprite(text, font, scale, layers)
+        if len(self.sprites) > self.max_sprites:
+            self.sprites.popitem(last=False)
+        return sprite
+
+    def text(self, image, text, org, font, scale, color, thickness, shadow=None):
+        """
+        Draw text like cv2.putText(..., cv2.LINE_AA), in place
+
+        shadow: optional (dx, dy, color, thickness) drawn under the text
+        """
+        layers = [(0, 0, color, thickness)]
+        if shadow is not None:
+            layers.insert(0, shadow)
+        return self.layered_text(image, text, org, font, scale, layers)
+
+    def layered_text(self, image, text, org, font, scale, layers):
+        """Draw text built from several (dx, dy, color, thickness) layers in one composite"""
+        return self.sprite(text, font, scale, layers).draw(image, org)
+
+    def text_size(self, text, font, scale, thickness):
+        """cv2.getTextSize(...)[0], served from the sprite cache"""
+        return self.sprite(text, font, scale, [(0, 0, (255, 255, 255), thickness)]).text_size
+
+    def banner(self, image, y_start, y_end, color=(0, 0, 0), alpha=0.7):
+        return blend_banner(image, y_start, y_end, color, alpha)
+
+    def skeleton(self, image, keypoints, min_confidence=0.3):
+        return draw_keypoints(image, keypoints, min_confidence)
+
+    def get_stats(self):
+        return {'sprites': len(self.sprites), 'hits': self.hits, 'misses': self.misses}
+
+def _reference_skeleton(image, keypoints, min_confidence=0.3):
+    """Per-connection / per-joint drawing the renderer replaces, for the benchmark"""
+    h, w = image.shape[:2]
+    for a, b in KEYPOINT_CONNECTIONS:
+        y1, x1, conf1 = keypoints[a]
+        y2, x2, conf2 = keypoints[b]
+        if conf1 > min_confidence and conf2 > min_confidence:
+            cv2.line(image, (int(x1 * w), int(y1 * h)), (int(x2 * w), int(y2 * h)), (0, 255, 0), 2)
+    for y, x, conf in keypoints:
+        if conf > min_confidence:
+            cv2.circle(image, (int(x * w), int(y * h)), 5, (0, 255, 255), -1)
+    return image
+
+def _reference_overlay(frame, keypoints, feedback, title):
+    """The overlay drawn with direct cv2 calls and a full-frame banner blend"""
+    _reference_skeleton(frame, keypoints)
+    overlay = frame.copy()
+    cv2.rectangle(overlay, (0, 0), (frame.shape[1], 200), (0, 0, 0), -1)
+    cv2.addWeighted(overlay, 0.7, frame, 0.3, 0, dst=frame)
+    cv2.putText(frame, title, (22, 42), cv2.FONT_HERSHEY_DUPLEX, 0.9, (0, 0, 0), 3, cv2.LINE_AA)
+    cv2.putText(frame, title, (20, 40), cv2.FONT_HERSHEY_DUPLEX, 0.9, (102, 126, 234), 2, cv2.LINE_AA)
+    cv2.putText(frame, title, (20, 40), cv2.FONT_HERSHEY_DUPLEX, 0.9, (255, 255, 255), 1, cv2.LINE_AA)
+    y_offset = 90
+    for message in feedback:
+        cv2.putText(frame, message, (62, y_offset + 2), cv2.FONT_HERSHEY_SIMPLEX, 0.65, (0, 0, 0), 3, cv2.LINE_AA)
+        cv2.putText(frame, message, (60, y_offset), cv2.FONT_HERSHEY_SIMPLEX, 0.65, (255, 255, 255), 2, cv2.LINE_AA)
+        y_offset += 35
+    return frame
+
+def _renderer_overlay(renderer, frame, keypoints, feedback, title):
+    """The same overlay through OverlayRenderer"""
+    renderer.skeleton(frame, keypoints)
+    renderer.banner(frame, 0, 200)
+    renderer.layered_text(frame, title, (20, 40), cv2.FONT_HERSHEY_DUPLEX, 0.9,
+                          [(2, 2, (0, 0, 0), 3), (0, 0, (102, 126, 234), 2), (0, 0, (255, 255, 255), 1)])
+    y_offset = 90
+    for message in feedback:
+        renderer.text(frame, message, (60, y_offset), cv2.FONT_HERSHEY_SIMPLEX, 0.65, (255, 255, 255), 2,
+                      shadow=(2, 2, (0, 0, 0), 3))
+        y_offset += 35
+    return frame
+
+def benchmark(num_frames=300, width=1920, height=1080):
+    """Milliseconds per frame for the reference and the renderer overlay on the same frames"""
+    from models.synthetic_backend import SyntheticPoseBackend
+
+    backend = SyntheticPoseBackend('squat')
+    keypoints = [backend.keypoints_at(i) for i in range(num_frames)]
+    feedback = ["Good depth!", "Keep your back straight", "Reps: 12"]
+    background = np.random.default_rng(0).integers(0, 256, (height, width, 3), dtype=np.uint8)
+    frame = background.copy()
+
+    results = {}
+    renderer = OverlayRenderer()
+    for name, draw in (('reference', lambda f, k: _reference_overlay(f, k, feedback, 'Squat')),
+                       ('renderer', lambda f, k: _renderer_overlay(renderer, f, k, feedback, 'Squat'))):
+        elapsed = 0.0
+        for frame_keypoints in keypoints:
+            np.copyto(frame, background)
+            start = time.perf_counter()
+            draw(frame, frame_keypoints)
+            elapsed += time.perf_counter() - start
+        results[name] = elapsed / num_frames * 1000
+
+    results['speedup'] = results['reference'] / max(results['renderer'], 1e-9)
+    results['sprites'] = renderer.get_stats()
+    return results
+
+def main(argv):
+    parser = argparse.ArgumentParser(prog='python -m utils.overlay', description='Benchmark overlay rendering')
+    parser.add_argument('--frames', type=int, default=300)
+    parser.add_argument('--size', default='1920x1080', help='frame size WIDTHxHEIGHT')
+    args = parser.parse_args(argv)
+
+    width, height = (int(value) for value in args.size.lower().split('x'))
+    results = benchmark(args.frames, width, height)
+    print(f"Overlay at {width}x{height}: reference {results['reference']:.2f} ms/frame, "
+          f"renderer {results['renderer']:.2f} ms/frame ({results['speedup']:.1f}x)")
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv[1:]))
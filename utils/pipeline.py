@@ -0,0 +1,103 @@
+import queue
+import threading
+import time
+
+_DONE = object()
+
+class PipelineStage:
+    """Run an iterator on its own thread and hand its items downstream through a bounded queue
+
+    Items come out in the order the wrapped iterator produced them. Chaining
+    stages (each wrapping the previous one) gives a staged pipeline where decode,
+    inference, rendering and encoding overlap instead of running back to back.
+    """
+    def __init__(self, name, iterable, maxsize=8):
+        self.name = name
+        self.queue = queue.Queue(maxsize=maxsize)
+        self.maxsize = maxsize
+
+        # Stats
+        self.items = 0
+        self.put_stall = 0.0    # producer blocked on a full queue - downstream is the bottleneck
+        self.get_stall = 0.0    # consumer waited on an empty queue - this stage is the bottleneck
+        self.max_depth = 0
+        self._depth_total = 0
+
+        self._error = None
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, args=(iterable,),
+                                        name=f"pipeline-{name}", daemon=True)
+        self._thread.start()
+
+    def _put(self, item):
+        start = time.perf_counter()
+        while not self._stop.is_set():
+            try:
+                self.queue.put(item, timeout=0.1)
+                break
+            except queue.Full:
+                continue
+        self.put_stall += time.perf_counter() - start
+
+    def _run(self, iterable):
+        try:
+            for item in iterable:
+                if self._stop.is_set():
+                    break
+                self._put(item)
+        except Exception as e:
+            self._error = e
+        finally:
+            self._put(_DONE)
+
+    def _get(self):
+        """Next queued item - _DONE once the stage is closed, as the worker then stops without queuing it"""
+        while True:
+            try:
+                return self.queue.get(timeout=0.1)
+            except queue.Empty:
+                if self._stop.is_set():
+                    return _DONE
+
+    def __iter__(self):
+        while True:
+            depth = self.queue.qsize()
+            self.max_depth = max(self.max_depth, depth)
+            self._depth_total += depth
+
+            start = time.perf_counter()
+            item = self._get()
+            self.get_stall += time.perf_counter() - start
+
+            if item is _DONE:
+                if self._error is not None:
+                    raise self._error
+                return
+
+            self.items += 1
+            yield item
+
+    def close(self):
+        """Stop the worker thread and drop anything still queued
+
+        A consumer still iterating the stage on another thread (the next
+        stage's worker) sees the end of the stream instead of waiting forever.
+        """
+        self._stop.set()
+        while True:
+            try:
+                self.queue.get_nowait()
+            except queue.Empty:
+                break
+        self._thread.join(timeout=1.0)
+
+    def stats(self):
+        """Queue depth and stall times for this stage"""
+        return {
+            'items': self.items,
+            'queue_size': self.maxsize,
+            'max_queue_depth': self.max_depth,
+            'avg_queue_depth': self._depth_total / max(self.items, 1),
+            'output_stall_s': round(self.put_stall, 3),
+            'input_stall_s': round(self.get_stall, 3)
+        }
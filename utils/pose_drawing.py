@@ -0,0 +1,58 @@
+import cv2
+import numpy as np
+
+# MoveNet skeleton connections
+KEYPOINT_CONNECTIONS = [
+    (5, 7), (7, 9),    # Left arm
+    (6, 8), (8, 10),   # Right arm
+    (11, 13), (13, 15),  # Left leg
+    (12, 14), (14, 16),  # Right leg
+    (5, 6),             # Shoulders
+    (11, 12),           # Hips
+    (5, 11), (6, 12)    # Torso
+]
+CONNECTION_INDEX = np.array(KEYPOINT_CONNECTIONS)
+
+def blend_banner(image, y_start, y_end, color=(0, 0, 0), alpha=0.7):
+    """
+    Blend a solid color band over rows [y_start, y_end) in place
+    
+    Same result as drawing the band on a full-frame copy and addWeighted-ing
+    it back, without the copy.
+    """
+    roi = image[max(y_start, 0):max(min(y_end, image.shape[0]), 0)]
+    cv2.addWeighted(roi, 1.0 - alpha, roi, 0.0, 0.0, dst=roi)
+    if any(color):
+        cv2.add(roi, tuple(c * alpha for c in color) + (0,), dst=roi)
+    return image
+
+def draw_keypoints(image, keypoints, min_confidence=0.3):
+    """
+    Draw MoveNet keypoints and skeleton on image
+    
+    Kept free of any model state so frames can be rendered from stored
+    keypoints without loading TensorFlow.
+    
+    Args:
+        image: BGR frame, drawn on in place
+        keypoints: (17, 3) array of normalized (y, x, confidence)
+    
+    Returns:
+        the annotated image
+    """
+    h, w = image.shape[:2]
+    
+    points = np.round(keypoints[:, 1::-1] * (w, h)).astype(np.int32)
+    visible = keypoints[:, 2] > min_confidence
+    
+    # Draw connections - one polylines call for every visible bone
+    bones = points[CONNECTION_INDEX[visible[CONNECTION_INDEX].all(axis=1)]]
+    if len(bones):
+        cv2.polylines(image, list(bones), False, (0, 255, 0), 2)
+    
+    # Draw keypoints - a zero-length thick line is a filled circle (radius 5)
+    joints = np.repeat(points[visible][:, None], 2, axis=1)
+    if len(joints):
+        cv2.polylines(image, list(joints), False, (0, 255, 255), 11)
+    
+    return image
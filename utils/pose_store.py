@@ -0,0 +1,328 @@
+"""
+Compact columnar storage for per-frame pose data
+
+Keypoints, confidences, joint angles and feedback of every frame in one
+file, quantized to small integers and split into chunks of CHUNK_FRAMES
+frames, so hours of frames take tens of bytes each and any frame range is
+read straight from a memory map without loading the rest:
+
+    header   32 bytes: magic, format version, frames per chunk, frame count
+             and the offset of the index
+    chunks   per chunk and column, either 'raw' quantized values or 'delta8' -
+             the first frame's values followed by int8 frame-to-frame
+             differences, used when every difference in the chunk fits
+    index    JSON: column encodings, the offset and encoding of every chunk's
+             columns, angle names, the table of distinct feedback dicts the
+             feedback column points into, and caller metadata
+
+Columns and their quantization (half a step is the largest error):
+
+    position    (17, 2) int16, 1/POSITION_SCALE of the frame (~0.13 px at 1080p)
+    confidence  (17,) uint8, 1/CONFIDENCE_SCALE
+    angles      (len(angle_names),) int16, 1/ANGLE_SCALE degree
+    feedback    int32 index into the feedback table
+
+Frames without a pose store MISSING values and read back as NaN.
+
+Print the layout and size of a file:
+
+    python -m utils.pose_store <file.pose>
+"""
+import json
+import mmap
+import os
+import struct
+import sys
+import tempfile
+from pathlib import Path
+
+import numpy as np
+
+MAGIC = b'POSE'
+FORMAT_VERSION = 1
+_HEADER = struct.Struct('<4sHHIQQ4x')
+
+CHUNK_FRAMES = 256
+
+# Joint angles of TFHubExerciseRecognizer.calculate_angles
+ANGLE_NAMES = ('left_elbow', 'right_elbow', 'left_knee', 'right_knee', 'left_hip', 'right_hip')
+
+POSITION_SCALE = 8192
+CONFIDENCE_SCALE = 250
+ANGLE_SCALE = 10
+
+MISSING = {'int16': -32768, 'uint8': 255, 'int32': -1}
+
+def _to_json(value):
+    """json.dumps default for numpy scalars and arrays"""
+    if isinstance(value, np.generic):
+        return value.item()
+    if isinstance(value, np.ndarray):
+        return value.tolist()
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+def _quantize(values, scale):
+    return np.clip(np.round(np.asarray(values, dtype=np.float32) * scale), -32767, 32767).astype(np.int16)
+
+def _encode(values):
+    """(encoding, bytes) for one chunk of a column"""
+    if values.dtype.itemsize > 1 and len(values) > 1:
+        deltas = np.diff(values.astype(np.int64), axis=0)
+        if deltas.size == 0 or np.abs(deltas).max() <= 127:
+            return 'delta8', values[:1].tobytes() + deltas.astype(np.int8).tobytes()
+    return 'raw', values.tobytes()
+
+def _decode(buffer, offset, encoding, dtype, shape, frames):
+    """Values of one chunk's column as an array of (frames,) + shape"""
+    row = int(np.prod(shape))
+    if frames * row == 0:
+        return np.zeros((frames,) + shape, dtype=dtype)
+    if encoding == 'raw':
+        return np.frombuffer(buffer, dtype, frames * row, offset).reshape((frames,) + shape)
+
+    values = np.empty((frames, row), dtype=np.int64)
+    values[0] = np.frombuffer(buffer, dtype, row, offset)
+    if frames > 1:
+        deltas = np.frombuffer(buffer, np.int8, (frames - 1) * row, offset + row * dtype.itemsize)
+        np.cumsum(deltas.reshape(frames - 1, row), axis=0, dtype=np.int64, out=values[1:])
+        values[1:] += values[0]
+    return values.astype(dtype).reshape((frames,) + shape)
+
+class PoseStoreWriter:
+    """
+    Appends frames to a pose store file, one chunk at a time
+
+    Memory use is one chunk regardless of length. The file is written under
+    a temporary name and only appears at path once close() succeeds.
+    """
+    def __init__(self, path, angle_names=ANGLE_NAMES, chunk_frames=CHUNK_FRAMES):
+        """
+        Args:
+            angle_names: angles to keep from each frame's angles dict - others are dropped
+        """
+        self.path = Path(path)
+        self.angle_names = list(angle_names)
+        self.chunk_frames = chunk_frames
+        self.columns = {
+            'position': (np.dtype('int16'), (17, 2), POSITION_SCALE),
+            'confidence': (np.dtype('uint8'), (17,), CONFIDENCE_SCALE),
+            'angles': (np.dtype('int16'), (len(self.angle_names),), ANGLE_SCALE),
+            'feedback': (np.dtype('int32'), (), 1)
+        }
+        self._buffers = {name: np.empty((chunk_frames,) + shape, dtype=dtype)
+                         for name, (dtype, shape, _) in self.columns.items()}
+        self.chunks = []
+        self.frames = 0
+        self._count = 0
+        self.feedback_table = []
+        self._feedback_ids = {}
+
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        # Unique per writer - sessions are threads of one process and may write the same path
+        fd, temp_path = tempfile.mkstemp(dir=self.path.parent, prefix=f"{self.path.name}.", suffix='.tmp')
+        self._temp_path = Path(temp_path)
+        self._file = os.fdopen(fd, 'wb')
+        self._file.write(bytes(_HEADER.size))
+
+    def __len__(self):
+        return self.frames
+
+    def append(self, keypoints, angles=None, feedback=None):
+        """Add one frame - keypoints None (or containing NaN) for a frame without a pose"""
+        i = self._count
+        buffers = self._buffers
+        if keypoints is None or np.isnan(keypoints).any():
+            buffers['position'][i] = MISSING['int16']
+            buffers['confidence'][i] = MISSING['uint8']
+        else:
+            buffers['position'][i] = _quantize(keypoints[:, :2], POSITION_SCALE)
+            buffers['confidence'][i] = np.clip(np.round(keypoints[:, 2] * CONFIDENCE_SCALE), 0, CONFIDENCE_SCALE)
+
+        angles = angles or {}
+        for j, name in enumerate(self.angle_names):
+            value = angles.get(name)
+            if value is None or np.isnan(value):
+                buffers['angles'][i, j] = MISSING['int16']
+            else:
+                buffers['angles'][i, j] = _quantize(value, ANGLE_SCALE)
+
+        buffers['feedback'][i] = MISSING['int32'] if feedback is None else self._feedback_id(feedback)
+
+        self._count += 1
+        self.frames += 1
+        if self._count == self.chunk_frames:
+            self._flush()
+
+    def _feedback_id(self, feedback):
+        key = json.dumps(feedback, sort_keys=True, default=_to_json)
+        feedback_id = self._feedback_ids.get(key)
+        if feedback_id is None:
+            feedback_id = self._feedback_ids[key] = len(self.feedback_table)
+            self.feedback_table.append(feedback)
+        return feedback_id
+
+    def _flush(self):
+        frames = self._count
+        if not frames:
+            return
+        chunk = {'start': self.frames - frames, 'frames': frames, 'columns': {}}
+        for name, buffer in self._buffers.items():
+            encoding, data = _encode(buffer[:frames])
+            chunk['columns'][name] = [self._file.tell(), encoding]
+            self._file.write(data)
+            # Keep every column 8-byte aligned
+            self._file.write(bytes(-len(data) % 8))
+        self.chunks.append(chunk)
+        self._count = 0
+
+    def close(self, meta=None):
+        """Write the index and move the file into place; returns its path"""
+        self._flush()
+        index = {
+            'columns': {name: {'dtype': dtype.name, 'shape': list(shape), 'scale': scale}
+                        for name, (dtype, shape, scale) in self.columns.items()},
+            'chunks': self.chunks,
+            'angle_names': self.angle_names,
+            'feedback_table': self.feedback_table,
+            'meta': meta or {}
+        }
+        index_offset = self._file.tell()
+        self._file.write(json.dumps(index, default=_to_json).encode('utf-8'))
+        self._file.seek(0)
+        self._file.write(_HEADER.pack(MAGIC, FORMAT_VERSION, 0, self.chunk_frames, self.frames, index_offset))
+        self._file.close()
+        os.replace(self._temp_path, self.path)
+        return self.path
+
+    def discard(self):
+        """Abandon the file"""
+        self._file.close()
+        self._temp_path.unlink(missing_ok=True)
+
+class PoseStore:
+    """
+    Memory-mapped reader of a pose store file
+
+    Range reads decode only the chunks the range touches; nothing else of
+    the file is read.
+    """
+    def __init__(self, path):
+        self.path = Path(path)
+        self._file = open(self.path, 'rb')
+        try:
+            self._map = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+            if len(self._map) < _HEADER.size:
+                raise ValueError(f"{path} is not a pose store file")
+            magic, version, _, self.chunk_frames, self.num_frames, index_offset = _HEADER.unpack_from(self._map, 0)
+            if magic != MAGIC:
+                raise ValueError(f"{path} is not a pose store file")
+            if version != FORMAT_VERSION:
+                raise ValueError(f"Unsupported pose store version {version} in {path}")
+            index = json.loads(self._map[index_offset:].decode('utf-8'))
+        except Exception:
+            self.close()
+            raise
+
+        self.columns = {name: (np.dtype(spec['dtype']), tuple(spec['shape']), spec['scale'])
+                        for name, spec in index['columns'].items()}
+        self.chunks = index['chunks']
+        self.angle_names = index['angle_names']
+        self.feedback_table = index['feedback_table']
+        self.meta = index['meta']
+
+    def __len__(self):
+        return self.num_frames
+
+    def _range(self, start, end):
+        end = self.num_frames if end is None else min(end, self.num_frames)
+        start = min(max(start, 0), end)
+        return start, end
+
+    def _column(self, name, start, end):
+        """Raw quantized values of a column for frames [start, end)"""
+        dtype, shape, _ = self.columns[name]
+        start, end = self._range(start, end)
+        if start == end:
+            return np.zeros((0,) + shape, dtype=dtype)
+
+        parts = []
+        for chunk in self.chunks[start // self.chunk_frames:(end - 1) // self.chunk_frames + 1]:
+            offset, encoding = chunk['columns'][name]
+            values = _decode(self._map, offset, encoding, dtype, shape, chunk['frames'])
+            parts.append(values[max(start - chunk['start'], 0):end - chunk['start']])
+        # Copy out, so no array keeps a view of the map
+        return np.concatenate(parts) if len(parts) > 1 else parts[0].copy()
+
+    def has_pose(self, start=0, end=None):
+        """Boolean per frame in [start, end)"""
+        return self._column('confidence', start, end)[:, 0] != MISSING['uint8']
+
+    def keypoints(self, start=0, end=None):
+        """(frames, 17, 3) float32 keypoints of frames [start, end), NaN for frames without a pose"""
+        position = self._column('position', start, end)
+        confidence = self._column('confidence', start, end)
+        keypoints = np.empty((len(position), 17, 3), dtype=np.float32)
+        keypoints[..., :2] = position / np.float32(POSITION_SCALE)
+        keypoints[..., 2] = confidence / np.float32(CONFIDENCE_SCALE)
+        keypoints[confidence[:, 0] == MISSING['uint8']] = np.nan
+        return keypoints
+
+    def angles(self, start=0, end=None):
+        """(frames, len(angle_names)) float32 angles in degrees, NaN where missing"""
+        values = self._column('angles', start, end)
+        angles = values / np.float32(ANGLE_SCALE)
+        angles[values == MISSING['int16']] = np.nan
+        return angles.astype(np.float32)
+
+    def feedback(self, start=0, end=None):
+        """Feedback dict of each frame in [start, end), None where none was stored"""
+        return [self.feedback_table[i] if i >= 0 else None for i in self._column('feedback', start, end).tolist()]
+
+    def blocks(self, start=0, end=None):
+        """(block_start, block_end) ranges of at most one chunk covering [start, end)"""
+        start, end = self._range(start, end)
+        while start < end:
+            block_end = min((start // self.chunk_frames + 1) * self.chunk_frames, end)
+            yield start, block_end
+            start = block_end
+
+    def close(self):
+        if getattr(self, '_map', None) is not None:
+            self._map.close()
+            self._map = None
+        self._file.close()
+
+    def get_stats(self):
+        file_size = self.path.stat().st_size
+        encodings = {name: {} for name in self.columns}
+        for chunk in self.chunks:
+            for name, (_, encoding) in chunk['columns'].items():
+                encodings[name][encoding] = encodings[name].get(encoding, 0) + 1
+        return {
+            'frames': self.num_frames,
+            'chunks': len(self.chunks),
+            'file_size_mb': file_size / (1024 * 1024),
+            'bytes_per_frame': file_size / max(self.num_frames, 1),
+            'feedback_entries': len(self.feedback_table),
+            'encodings': encodings
+        }
+
+def main(argv):
+    if len(argv) != 1:
+        print("usage: python -m utils.pose_store <file.pose>")
+        return 2
+
+    store = PoseStore(argv[0])
+    stats = store.get_stats()
+    store.close()
+    # float32 keypoints and angles, as held in memory
+    dense_bytes = 17 * 3 * 4 + len(store.angle_names) * 4
+    print(f"{stats['frames']} frames in {stats['chunks']} chunks, {stats['file_size_mb']:.2f} MB "
+          f"({stats['bytes_per_frame']:.1f} bytes/frame vs {dense_bytes} as float32 arrays), "
+          f"{stats['feedback_entries']} distinct feedback entries")
+    for name, counts in stats['encodings'].items():
+        print(f"  {name}: " + ", ".join(f"{count} {encoding}" for encoding, count in sorted(counts.items())))
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv[1:]))
@@ -0,0 +1,124 @@
+"""
+CPU resource governor
+
+TensorFlow, OpenCV and FFmpeg each start a thread per core by default, so a
+few analyses running side by side in one Streamlit process put several times
+as many busy threads as cores on the CPU and every job slows to a crawl. The
+governor splits the cores up front:
+
+- TF intra-op threads cover all cores once: the pool is process-wide and
+  shared by every job's inference, and inter-op threads allow one graph
+  call per concurrent job
+- cv2.setNumThreads (also process-wide) gets one job's share of the cores
+- each job's decoder and encoder get thread counts from its share
+- at most max_jobs analyses run at once; further ones wait in FIFO order
+
+so throughput per job drops roughly in proportion to the number of jobs
+instead of collapsing. The process-wide limits are applied by get_governor()
+and have to be in place before the first model loads.
+
+Set MAX_CONCURRENT_ANALYSES to override the number of concurrent jobs.
+"""
+import itertools
+import os
+import threading
+from collections import deque
+from contextlib import contextmanager
+
+import cv2
+
+from models.model_store import set_thread_limits
+
+# Cores a job needs to keep decode, inference and encode busy
+CORES_PER_JOB = 4
+
+def available_cores():
+    """Cores this process may run on"""
+    try:
+        return len(os.sched_getaffinity(0))
+    except AttributeError:
+        return os.cpu_count() or 1
+
+class ResourceGovernor:
+    """Thread budgets and admission control for concurrent video jobs"""
+    def __init__(self, cores=None, max_jobs=None):
+        self.cores = cores or available_cores()
+        self.max_jobs = max_jobs or max(1, self.cores // CORES_PER_JOB)
+        self.job_threads = max(1, self.cores // self.max_jobs)
+
+        self.running = 0
+        self.completed = 0
+        self._queue = deque()
+        self._tickets = itertools.count()
+        self._cond = threading.Condition()
+
+    def configure_process(self):
+        """Apply the process-wide thread limits (TF pools, cv2)"""
+        set_thread_limits(intra_op_threads=self.cores, inter_op_threads=min(self.max_jobs, self.cores),
+                          num_threads=self.cores)
+        cv2.setNumThreads(self.job_threads)
+
+    def budget(self):
+        """Thread counts for one job"""
+        return {
+            'threads': self.job_threads,
+            'decoder_threads': max(1, self.job_threads // 2),
+            'encoder_threads': self.job_threads
+        }
+
+    @contextmanager
+    def job(self, on_wait=None):
+        """
+        Run a job once a slot is free, yielding its budget()
+
+        on_wait(position) is called while the job is queued, with the
+        number of jobs ahead of it (0 = next), about once a second.
+        """
+        ticket = next(self._tickets)
+        with self._cond:
+            self._queue.append(ticket)
+            try:
+                while self._queue[0] != ticket or self.running >= self.max_jobs:
+                    if on_wait:
+                        on_wait(self._queue.index(ticket))
+                    self._cond.wait(timeout=1.0)
+            except BaseException:
+                # Abandoned while queued (e.g. the Streamlit session stopped)
+                self._queue.remove(ticket)
+                self._cond.notify_all()
+                raise
+            self._queue.popleft()
+            self.running += 1
+            self._cond.notify_all()
+
+        try:
+            yield self.budget()
+        finally:
+            with self._cond:
+                self.running -= 1
+                self.completed += 1
+                self._cond.notify_all()
+
+    def get_stats(self):
+        with self._cond:
+            return {
+                'cores': self.cores,
+                'max_jobs': self.max_jobs,
+                'job_threads': self.job_threads,
+                'running': self.running,
+                'queued': len(self._queue),
+                'completed': self.completed
+            }
+
+_governor = None
+_governor_lock = threading.Lock()
+
+def get_governor():
+    """The process-wide governor, configuring the process's thread limits on first use"""
+    global _governor
+    with _governor_lock:
+        if _governor is None:
+            max_jobs = os.environ.get('MAX_CONCURRENT_ANALYSES')
+            _governor = ResourceGovernor(max_jobs=int(max_jobs) if max_jobs else None)
+            _governor.configure_process()
+        return _governor
@@ -0,0 +1,226 @@
+"""
+Whole-result cache
+
+Submitting the same video with the same settings twice - a retry after a
+page refresh, a double click - would redo decoding, inference, rendering
+and encoding. The result cache keeps the output files and analysis_data of
+every finished analysis, keyed by
+
+    video fingerprint    as for utils.keypoint_cache
+    exercise type        plus a fingerprint of its EXERCISE_STANDARDS entry
+    settings             model variant and options, output profile, mode
+    code fingerprint     hash of the modules that shape a result (analysis,
+                         angles, overlay, encoding)
+
+so an entry goes stale by itself when a threshold or the analyzer changes.
+A submission that arrives while the same analysis is still running waits
+for it and then gets its result instead of running it a second time.
+
+Entries live under cache/results (or $RESULT_CACHE_DIR): <key>.json with
+the analysis_data, next to the output files it names. The per-frame
+feedback and angle histories would make every entry as large as the video
+is long, so an entry keeps their summary instead (summarize_histories,
+under 'history_summary'); an analysis-only entry's .pose file still has
+the full histories (utils.analysis_store).
+"""
+import hashlib
+import json
+import os
+import tempfile
+import threading
+import time
+from contextlib import contextmanager
+from pathlib import Path
+
+import numpy as np
+
+from exercise_standards import get_standards_fingerprint
+from utils.keypoint_cache import video_fingerprint
+from utils.storage_manager import touch
+
+# Modules whose code shapes a result, relative to the repository root
+RESULT_MODULES = (
+    'models/exercise_analyzer.py',
+    'models/tfhub_recognizer.py',
+    'models/movenet_backend.py',
+    'models/model_store.py',
+    'utils/crop_region.py',
+    'utils/motion_gate.py',
+    'utils/av_decoder.py',
+    'utils/video_processor.py',
+    'utils/sharding.py',
+    'utils/analysis_store.py',
+    'utils/pose_store.py',
+    'utils/overlay.py',
+    'utils/pose_drawing.py',
+    'utils/av_encoder.py'
+)
+
+# Per-frame lists that grow with the video - entries keep summarize_histories() instead
+HISTORY_KEYS = ('feedback_history', 'angle_history')
+
+# Points kept of an entry's joint-angle series
+ANGLE_SAMPLES = 600
+
+_code_fingerprint = None
+
+def code_fingerprint():
+    """Hash of the RESULT_MODULES sources, computed once per process"""
+    global _code_fingerprint
+    if _code_fingerprint is None:
+        root = Path(__file__).resolve().parent.parent
+        digest = hashlib.blake2b(digest_size=8)
+        for module in RESULT_MODULES:
+            digest.update((root / module).read_bytes())
+        _code_fingerprint = digest.hexdigest()
+    return _code_fingerprint
+
+def _to_json(value):
+    """json.dumps default for numpy scalars and arrays"""
+    if isinstance(value, np.generic):
+        return value.item()
+    if isinstance(value, np.ndarray):
+        return value.tolist()
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+def summarize_histories(analysis_data, max_samples=ANGLE_SAMPLES):
+    """
+    What the results page shows of the per-frame histories, in a size independent of the video length
+
+    Returns {'feedback_counts': {message: frames}, 'feedback_frames': frames
+    with feedback, 'angle_series': {'frames', 'knee', 'elbow'}} - the mean
+    knee and elbow angle of every frame with a pose, or of every n-th one so
+    that at most max_samples remain (None keeps them all).
+    """
+    feedback_history = analysis_data.get('feedback_history', [])
+    counts = {}
+    for feedback in feedback_history:
+        for key, value in feedback.items():
+            if key != 'reps':
+                counts[value] = counts.get(value, 0) + 1
+
+    angle_history = analysis_data.get('angle_history', [])
+    step = max(1, -(-len(angle_history) // max_samples)) if max_samples else 1
+    series = {'frames': [], 'knee': [], 'elbow': []}
+    for frame in range(0, len(angle_history), step):
+        angles = angle_history[frame]
+        series['frames'].append(frame)
+        series['knee'].append((angles.get('left_knee', 0) + angles.get('right_knee', 0)) / 2)
+        series['elbow'].append((angles.get('left_elbow', 0) + angles.get('right_elbow', 0)) / 2)
+
+    return {'feedback_counts': counts, 'feedback_frames': len(feedback_history), 'angle_series': series}
+
+class ResultCache:
+    """Finished analyses on disk, keyed by video, exercise, standards, settings and code"""
+    def __init__(self, cache_dir=None):
+        self.cache_dir = Path(cache_dir or os.environ.get('RESULT_CACHE_DIR', 'cache/results'))
+        self.hits = 0
+        self.misses = 0
+        self._locks = {}
+        self._locks_lock = threading.Lock()
+
+    def key(self, video_path, exercise_type, settings):
+        """Cache key of an analysis of video_path; settings is a JSON-able dict of the run's options"""
+        identity = {
+            'exercise': exercise_type,
+            'standards': get_standards_fingerprint(exercise_type),
+            'code': code_fingerprint(),
+            'settings': settings
+        }
+        digest = hashlib.blake2b(json.dumps(identity, sort_keys=True).encode(), digest_size=8).hexdigest()
+        return f"{video_fingerprint(video_path)}-{digest}"
+
+    def path(self, key, suffix):
+        """Where a result file of an entry goes, e.g. path(key, '.mp4') for the annotated video"""
+        return self.cache_dir / f"{key}{suffix}"
+
+    def load(self, key):
+        """The stored entry ({'output_path', 'analysis_path', 'analysis_data'}), or None
+
+        Entries whose files have disappeared count as misses and are removed.
+        """
+        entry_path = self.path(key, '.json')
+        try:
+            with open(entry_path) as f:
+                entry = json.load(f)
+        except FileNotFoundError:
+            self.misses += 1
+            return None
+        except (OSError, ValueError) as e:
+            print(f"Ignoring unreadable result cache entry {entry_path}: {e}")
+            self.misses += 1
+            return None
+
+        files = [entry[name] for name in ('output_path', 'analysis_path') if entry.get(name)]
+        if not all(os.path.exists(path) for path in files):
+            entry_path.unlink(missing_ok=True)
+            self.misses += 1
+            return None
+
+        self.hits += 1
+        touch(entry_path, *files)
+        return entry
+
+    def save(self, key, analysis_data, output_path=None, analysis_path=None):
+        """Store a finished analysis - its files should be this entry's path(key, ...) files"""
+        entry = {
+            'output_path': str(output_path) if output_path else None,
+            'analysis_path': str(analysis_path) if analysis_path else None,
+            'analysis_data': dict({key: value for key, value in analysis_data.items() if key not in HISTORY_KEYS},
+                                  history_summary=summarize_histories(analysis_data)),
+            'created': time.time()
+        }
+        entry_path = self.path(key, '.json')
+        entry_path.parent.mkdir(parents=True, exist_ok=True)
+        # Unique per writer - sessions are threads of one process
+        fd, temp_path = tempfile.mkstemp(dir=entry_path.parent, prefix=f"{entry_path.name}.", suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'w') as f:
+                json.dump(entry, f, default=_to_json)
+            os.replace(temp_path, entry_path)
+        except (OSError, TypeError) as e:
+            print(f"Could not write result cache entry: {e}")
+            Path(temp_path).unlink(missing_ok=True)
+
+    @contextmanager
+    def claim(self, key, on_wait=None):
+        """
+        Hold the key while its analysis runs
+
+        A second claim of the same key waits until the first is released;
+        on_wait() is called once if it has to. Check load() again after
+        claiming - the other holder may have stored the result meanwhile.
+        """
+        # [lock, claims holding or waiting for it] - dropped with the last claim
+        with self._locks_lock:
+            entry = self._locks.setdefault(key, [threading.Lock(), 0])
+            entry[1] += 1
+        lock = entry[0]
+        try:
+            if not lock.acquire(blocking=False):
+                if on_wait:
+                    on_wait()
+                lock.acquire()
+            try:
+                yield
+            finally:
+                lock.release()
+        finally:
+            with self._locks_lock:
+                entry[1] -= 1
+                if entry[1] == 0:
+                    del self._locks[key]
+
+    def get_stats(self):
+        return {'cache_dir': str(self.cache_dir), 'hits': self.hits, 'misses': self.misses}
+
+_result_cache = None
+_result_cache_lock = threading.Lock()
+
+def get_result_cache():
+    """The process-wide result cache - shared so claim() sees every session's runs"""
+    global _result_cache
+    with _result_cache_lock:
+        if _result_cache is None:
+            _result_cache = ResultCache()
+        return _result_cache
@@ -0,0 +1,260 @@
+import os
+
+import cv2
+
+from utils.av_encoder import DEFAULT_OUTPUT_PROFILE, open_video_writer
+
+def split_frame_ranges(total_frames, num_shards):
+    """
+    Split a video into contiguous frame ranges
+
+    Returns:
+        list of (start, end) tuples. The last range has end=None so it runs to
+        the end of the stream even if the container's frame count is off; a
+        video without a frame count is one range.
+    """
+    if total_frames <= 0:
+        return [(0, None)]
+
+    num_shards = max(1, min(num_shards, total_frames))
+    shard_size = -(-total_frames // num_shards)
+
+    ranges = []
+    for start in range(0, total_frames, shard_size):
+        ranges.append((start, start + shard_size))
+
+    if ranges:
+        ranges[-1] = (ranges[-1][0], None)
+    else:
+        ranges = [(0, None)]
+
+    return ranges
+
+# How far before the target frame seek_frame seeks to
+SEEK_MARGIN = 32
+
+def seek_frame(cap, index):
+    """
+    Position a capture so its next read() returns frame index
+
+    CAP_PROP_POS_FRAMES alone can land a few frames off on some streams, so
+    this seeks to SEEK_MARGIN frames before the target and grabs forward on
+    frame timestamps until the frame just before it. A seek that lands past
+    the target is retried from further back; near the start of the video the
+    frames are simply counted from 0. Returns False when the video ends first.
+    """
+    if index <= 0:
+        return True
+
+    interval_ms = 1000.0 / (cap.get(cv2.CAP_PROP_FPS) or 30.0)
+    target_ms = index * interval_ms
+    margin = SEEK_MARGIN
+    while index - margin > 0:
+        cap.set(cv2.CAP_PROP_POS_FRAMES, index - margin)
+        if not cap.grab():
+            return False
+        if cap.get(cv2.CAP_PROP_POS_MSEC) < target_ms - interval_ms / 2:
+            while cap.get(cv2.CAP_PROP_POS_MSEC) < target_ms - 1.5 * interval_ms:
+                if not cap.grab():
+                    return False
+            return True
+        margin *= 4
+
+    cap.set(cv2.CAP_PROP_POS_FRAMES, 0)
+    for _ in range(index):
+        if not cap.grab():
+            return False
+    return True
+
+def _open_at(video_path, start):
+    cap = cv2.VideoCapture(video_path)
+    seek_frame(cap, start)
+    return cap
+
+def check_shard_frames(ranges, shard_counts, spans=()):
+    """
+    Compare the frames each shard read with what a serial read gives
+
+    Every shard but the last must have read exactly its range, and spans -
+    the shards' first and last frame timestamps from _read_range - must show
+    each shard starting one frame after the one before it ends. The last
+    shard runs to the end of the stream, however many frames the container
+    claims. Returns a list of problems, empty when the shards line up.
+    """
+    problems = []
+    for (start, end), count in zip(ranges, shard_counts):
+        if end is not None and count != end - start:
+            problems.append(f"shard at frame {start} read {count} of {end - start} frames")
+
+    for (start, _), before, after in zip(ranges[1:], spans, spans[1:]):
+        if not before or not after:
+            continue
+        gap_ms = after['first_ms'] - before['last_ms']
+        if not 0.5 * after['interval_ms'] < gap_ms < 1.5 * after['interval_ms']:
+            problems.append(f"shard at frame {start} starts {gap_ms:.1f} ms after the previous one ends "
+                            f"(one frame is {after['interval_ms']:.1f} ms)")
+    return problems
+
+def _read_range(cap, start, end, span=None):
+    """
+    Yield frames [start, end) from a capture positioned at start
+
+    span, a dict, gets the timestamps of the first and last frame read
+    ('first_ms', 'last_ms') and the frame interval, for check_shard_frames.
+    """
+    if span is not None:
+        span['interval_ms'] = 1000.0 / (cap.get(cv2.CAP_PROP_FPS) or 30.0)
+    index = start
+    while end is None or index < end:
+        ret, frame = cap.read()
+        if not ret:
+            break
+
+        if span is not None:
+            span['last_ms'] = cap.get(cv2.CAP_PROP_POS_MSEC)
+            span.setdefault('first_ms', span['last_ms'])
+        yield frame
+        index += 1
+
+def _limit_threads(num_threads):
+    """Keep each worker to its share of the cores - models pick the limits up when they load"""
+    cv2.setNumThreads(num_threads)
+
+    from models.model_store import set_thread_limits
+    set_thread_limits(intra_op_threads=num_threads, inter_op_threads=1, num_threads=num_threads)
+
+def infer_shard(video_path, start, end, batch_size, num_threads, recognizer_config, exercise_type):
+    """
+    Worker process: run pose inference on frames [start, end)
+
+    Builds its own recognizer as TFHubExerciseRecognizer(**recognizer_config) -
+    MoveNet settings, or a picklable pose backend such as
+    models.synthetic_backend.SyntheticPoseBackend. Only pose inference runs
+    here - rep counting is replayed serially by the parent so analyzer state
+    crosses shard boundaries exactly as in a single-process run.
+
+    Returns:
+        (list of (keypoints, angles) per frame with (None, {}) where detection
+        failed, the frames' span as from _read_range)
+    """
+    _limit_threads(num_threads)
+
+    from models.tfhub_recognizer import TFHubExerciseRecognizer
+    from utils.video_processor import VideoProcessor
+
+    recognizer = TFHubExerciseRecognizer(**recognizer_config)
+    recognizer.reset()
+    recognizer.set_exercise(exercise_type)
+    processor = VideoProcessor()
+
+    cap = _open_at(video_path, start)
+    span = {}
+    frames = ((frame, True, None) for frame in _read_range(cap, start, end, span))
+
+    detections = processor._detect_frames(frames, recognizer, batch_size, first_index=start)
+
+    results = []
+    for _, (exercise, confidence, keypoints, angles) in detections:
+        if keypoints is not None and angles:
+            results.append((keypoints, angles))
+        else:
+            results.append((None, {}))
+
+    cap.release()
+    return results, span
+
+def render_shard(video_path, start, end, frame_results, selected_exercise, segment_path,
+                 output_profile=DEFAULT_OUTPUT_PROFILE, num_threads=1):
+    """
+    Worker process: render annotated frames [start, end) into a segment file
+
+    Args:
+        frame_results: list of (keypoints, feedback) per frame from the parent's
+                       serial analysis pass - no model is loaded here
+        output_profile: utils.av_encoder output profile for the segment
+        num_threads: this worker's share of the cores, for OpenCV and the encoder
+
+    Returns:
+        (segment path, the frames' span as from _read_range)
+    """
+    cv2.setNumThreads(num_threads)
+
+    from utils.video_processor import VideoProcessor
+    processor = VideoProcessor()
+
+    cap = _open_at(video_path, start)
+    fps = cap.get(cv2.CAP_PROP_FPS)
+    width = int(cap.get(cv2.CAP_PROP_FRAME_WIDTH))
+    height = int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT))
+
+    out = open_video_writer(segment_path, width, height, fps, output_profile, threads=num_threads)
+
+    span = {}
+    analyzed = (
+        (frame, keypoints, feedback)
+        for frame, (keypoints, feedback) in zip(_read_range(cap, start, end, span), frame_results)
+    )
+    for frame in processor._render_frames(analyzed, selected_exercise):
+        out.write(frame)
+
+    cap.release()
+    out.release()
+    return str(segment_path), span
+
+def concat_segments(segment_paths, output_path):
+    """Join rendered segments into one MP4, stream-copying packets when PyAV is available"""
+    try:
+        import av
+    except ImportError:
+        return _concat_reencode(segment_paths, output_path)
+
+    offset = 0
+    with av.open(str(output_path), 'w', options={'movflags': '+faststart'}) as dst:
+        out_stream = None
+        for path in segment_paths:
+            with av.open(str(path)) as src:
+                in_stream = src.streams.video[0]
+                if out_stream is None:
+                    out_stream = dst.add_stream_from_template(in_stream)
+
+                # Shift each segment's timestamps to start where the previous one ended
+                segment_end = offset
+                for packet in src.demux(in_stream):
+                    if packet.dts is None:
+                        continue
+
+                    packet.dts += offset
+                    packet.pts = packet.dts if packet.pts is None else packet.pts + offset
+                    segment_end = max(segment_end, packet.pts + (packet.duration or 0))
+
+                    packet.stream = out_stream
+                    dst.mux(packet)
+
+                offset = segment_end
+
+    return str(output_path)
+
+def _concat_reencode(segment_paths, output_path):
+    """Fallback concat that decodes and re-encodes every segment with OpenCV"""
+    out = None
+    for path in segment_paths:
+        cap = cv2.VideoCapture(str(path))
+        if out is None:
+            fourcc = cv2.VideoWriter_fourcc(*'mp4v')
+            size = (int(cap.get(cv2.CAP_PROP_FRAME_WIDTH)), int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT)))
+            out = cv2.VideoWriter(str(output_path), fourcc, cap.get(cv2.CAP_PROP_FPS), size)
+
+        for frame in _read_range(cap, 0, None):
+            out.write(frame)
+        cap.release()
+
+    if out is not None:
+        out.release()
+    return str(output_path)
+
+def default_num_workers():
+    """One worker per available core"""
+    try:
+        return len(os.sched_getaffinity(0))
+    except AttributeError:
+        return os.cpu_count() or 1
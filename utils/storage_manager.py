@@ -0,0 +1,190 @@
+"""
+Disk-budgeted storage lifecycle
+
+Uploads, annotated videos and the keypoint / result caches all grow with
+use. The storage manager keeps them within a disk budget:
+
+- every file under the managed areas is an artifact with a size and a
+  last-used time (the later of its atime and mtime; touch() marks a file
+  used explicitly, since many filesystems do not keep atime current)
+- ensure_free(n) evicts least-recently-used artifacts until n more bytes
+  fit in the budget and the disk keeps min_free_bytes spare, and reports
+  whether that worked - call it before writing anything large, so a job
+  is refused up front instead of running out of disk mid-encode
+- files a session is still showing are pinned by that session and never
+  evicted; pins expire after pin_ttl seconds, since browser sessions end
+  without notice
+- files still being written (*.tmp, *.part) are left alone
+
+Configure with STORAGE_BUDGET_GB (default 20) and STORAGE_MIN_FREE_GB
+(default 2).
+"""
+import os
+import shutil
+import threading
+import time
+from pathlib import Path
+
+GB = 1024 ** 3
+
+# Managed directories, by area name
+DEFAULT_AREAS = {
+    'uploads': 'uploads',
+    'outputs': 'outputs',
+    'keypoints': 'cache/keypoints',
+    'results': 'cache/results'
+}
+
+IN_FLIGHT_SUFFIXES = ('.tmp', '.part')
+
+PIN_TTL = 3600
+
+def touch(*paths):
+    """Mark files as used now (sets atime, keeps mtime); missing paths and None are ignored"""
+    now = time.time()
+    for path in paths:
+        if not path:
+            continue
+        try:
+            os.utime(path, (now, os.stat(path).st_mtime))
+        except OSError:
+            pass
+
+def _env_gb(name, default):
+    value = os.environ.get(name)
+    return float(value) * GB if value else default * GB
+
+class StorageManager:
+    """LRU eviction of uploads, outputs and caches within a disk budget"""
+    def __init__(self, budget_bytes=None, min_free_bytes=None, areas=None, pin_ttl=PIN_TTL):
+        self.budget_bytes = budget_bytes or _env_gb('STORAGE_BUDGET_GB', 20)
+        self.min_free_bytes = min_free_bytes if min_free_bytes is not None else _env_gb('STORAGE_MIN_FREE_GB', 2)
+        self.areas = {name: Path(path) for name, path in (areas or DEFAULT_AREAS).items()}
+        self.pin_ttl = pin_ttl
+
+        self.evicted = 0
+        self.evicted_bytes = 0
+        self.refused = 0
+        self._pins = {}
+        self._lock = threading.Lock()
+
+    def artifacts(self):
+        """Every managed file as {'path', 'area', 'size', 'last_used'}, least recently used first"""
+        artifacts = []
+        for area, root in self.areas.items():
+            for directory, _, filenames in os.walk(root):
+                for filename in filenames:
+                    if filename.endswith(IN_FLIGHT_SUFFIXES):
+                        continue
+                    path = os.path.join(directory, filename)
+                    try:
+                        stat = os.stat(path)
+                    except OSError:
+                        continue
+                    artifacts.append({
+                        'path': os.path.abspath(path),
+                        'area': area,
+                        'size': stat.st_size,
+                        'last_used': max(stat.st_atime, stat.st_mtime)
+                    })
+        artifacts.sort(key=lambda artifact: artifact['last_used'])
+        return artifacts
+
+    def pin(self, owner, paths):
+        """Protect paths from eviction on behalf of owner, replacing what owner pinned before"""
+        with self._lock:
+            self._pins[owner] = (time.time(), {os.path.abspath(path) for path in paths if path})
+
+    def unpin(self, owner):
+        with self._lock:
+            self._pins.pop(owner, None)
+
+    def _pinned(self):
+        expired_before = time.time() - self.pin_ttl
+        for owner in [owner for owner, (pinned_at, _) in self._pins.items() if pinned_at < expired_before]:
+            del self._pins[owner]
+        return set().union(*(paths for _, paths in self._pins.values()))
+
+    def _disk_free(self):
+        root = next((root for root in self.areas.values() if root.exists()), Path('.'))
+        return shutil.disk_usage(root).free
+
+    def ensure_free(self, needed_bytes=0):
+        """
+        Evict least-recently-used artifacts until needed_bytes more fit
+
+        Returns False when pinned files leave too little room - nothing
+        large should be written then.
+        """
+        with self._lock:
+            pinned = self._pinned()
+            artifacts = self.artifacts()
+            used = sum(artifact['size'] for artifact in artifacts)
+            free = self._disk_free()
+
+            candidates = iter([artifact for artifact in artifacts if artifact['path'] not in pinned])
+            while used + needed_bytes > self.budget_bytes or free - needed_bytes < self.min_free_bytes:
+                artifact = next(candidates, None)
+                if artifact is None:
+                    self.refused += 1
+                    print(f"Storage: cannot free {needed_bytes / GB:.2f} GB - "
+                          f"{used / GB:.2f} GB used, {free / GB:.2f} GB free on disk")
+                    return False
+                if self._evict(artifact):
+                    used -= artifact['size']
+                    free += artifact['size']
+            return True
+
+    def _evict(self, artifact):
+        try:
+            os.remove(artifact['path'])
+        except FileNotFoundError:
+            return True
+        except OSError as e:
+            print(f"Storage: could not evict {artifact['path']}: {e}")
+            return False
+
+        self.evicted += 1
+        self.evicted_bytes += artifact['size']
+        # Drop a hash-prefix directory the file leaves empty
+        directory = os.path.dirname(artifact['path'])
+        if directory != os.path.abspath(self.areas[artifact['area']]):
+            try:
+                os.rmdir(directory)
+            except OSError:
+                pass
+        return True
+
+    def get_stats(self):
+        artifacts = self.artifacts()
+        by_area = {area: 0 for area in self.areas}
+        for artifact in artifacts:
+            by_area[artifact['area']] += artifact['size']
+        with self._lock:
+            pinned = len(self._pinned())
+        return {
+            'budget_gb': self.budget_bytes / GB,
+            'used_gb': sum(by_area.values()) / GB,
+            'used_gb_by_area': {area: size / GB for area, size in by_area.items()},
+            'files': len(artifacts),
+            'pinned': pinned,
+            'disk_free_gb': self._disk_free() / GB,
+            'evicted': self.evicted,
+            'evicted_gb': self.evicted_bytes / GB,
+            'refused': self.refused
+        }
+
+def estimate_job_bytes(video_path):
+    """Disk space to reserve for analyzing video_path: an annotated copy of about its size plus cache files"""
+    return int(os.path.getsize(video_path) * 1.2) + 64 * 1024 ** 2
+
+_manager = None
+_manager_lock = threading.Lock()
+
+def get_storage_manager():
+    """The process-wide storage manager - shared so every session's pins are respected"""
+    global _manager
+    with _manager_lock:
+        if _manager is None:
+            _manager = StorageManager()
+        return _manager
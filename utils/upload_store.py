@@ -0,0 +1,89 @@
+"""
+Content-addressed upload storage
+
+Every uploaded video comes in through UploadStore.ingest:
+
+- the upload is copied in CHUNK_BYTES pieces, so memory use stays at one
+  chunk whatever the file size
+- a SHA-256 of the content is computed on the way through
+- the file is written under a temporary name and renamed into place, so a
+  half-written upload is never visible
+- it is stored as <root>/<hash[:2]>/<hash><ext>, never under the
+  client-supplied name: two users uploading different "video.mp4" files
+  get separate files, and the same video uploaded twice is stored once
+
+The root is uploads/ (or $UPLOAD_DIR).
+"""
+import hashlib
+import os
+import re
+from pathlib import Path
+
+from utils.storage_manager import touch
+
+CHUNK_BYTES = 1 << 20
+
+class UploadStore:
+    """Uploaded files stored once per content hash"""
+    def __init__(self, root=None, chunk_bytes=CHUNK_BYTES):
+        self.root = Path(root or os.environ.get('UPLOAD_DIR', 'uploads'))
+        self.chunk_bytes = chunk_bytes
+        self.stored = 0
+        self.deduplicated = 0
+
+    def _extension(self, filename):
+        """Lower-case extension of the client's filename, if it is a plain one"""
+        suffix = Path(filename or '').suffix.lower()
+        return suffix if re.fullmatch(r'\.[a-z0-9]{1,8}', suffix) else ''
+
+    def path_for(self, digest, extension=''):
+        return self.root / digest[:2] / f"{digest}{extension}"
+
+    def ingest(self, fileobj, filename=None):
+        """
+        Store a binary file object's content, returning (path, sha256 hex digest)
+
+        fileobj is read from its start in chunks (Streamlit's UploadedFile,
+        an open file, ...); filename only contributes the extension.
+        """
+        incoming = self.root / '.incoming'
+        incoming.mkdir(parents=True, exist_ok=True)
+        temp_path = incoming / f"{os.getpid()}-{id(fileobj)}-{os.urandom(4).hex()}.part"
+
+        if hasattr(fileobj, 'seek'):
+            fileobj.seek(0)
+        digest = hashlib.sha256()
+        try:
+            with open(temp_path, 'wb') as f:
+                while True:
+                    chunk = fileobj.read(self.chunk_bytes)
+                    if not chunk:
+                        break
+                    digest.update(chunk)
+                    f.write(chunk)
+                f.flush()
+                os.fsync(f.fileno())
+
+            path = self.path_for(digest.hexdigest(), self._extension(filename))
+            if path.exists():
+                # Same content stored before - keep that copy
+                temp_path.unlink()
+                touch(path)
+                self.deduplicated += 1
+            else:
+                path.parent.mkdir(parents=True, exist_ok=True)
+                os.replace(temp_path, path)
+                self.stored += 1
+        except BaseException:
+            temp_path.unlink(missing_ok=True)
+            raise
+
+        return str(path), digest.hexdigest()
+
+    def ingest_path(self, source_path):
+        """Store a local file, as ingest()"""
+        with open(source_path, 'rb') as f:
+            return self.ingest(f, Path(source_path).name)
+
+    def get_stats(self):
+        return {'root': str(self.root), 'stored': self.stored, 'deduplicated': self.deduplicated}
@@ -1,23 +1,68 @@
 import cv2
 import os
+import time
 import tempfile
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
 from pathlib import Path
 
+from models.exercise_analyzer import ExerciseAnalyzer
+from models.model_store import preferred_variant, tuned_settings
+from utils.pipeline import PipelineStage
+from utils.motion_gate import MotionGate
+from utils.overlay import OverlayRenderer
+from utils.frame_pool import FramePool, AllocationProbe
+from utils.av_decoder import AVFrameReader, av_available
+from utils.av_encoder import DEFAULT_OUTPUT_PROFILE, open_video_writer, writer_stats
+from utils.analysis_store import AnalysisRecorder, StoredAnalysis, load_analysis
+from utils.keypoint_cache import KeypointCache, cached_keypoints
+from utils.upload_store import UploadStore
+from utils.storage_manager import get_storage_manager
+from utils.sharding import (split_frame_ranges, infer_shard, render_shard,
+                            concat_segments, default_num_workers, check_shard_frames, seek_frame)
+
+# Exercise names for display
+EXERCISE_DISPLAY_NAMES = {
+    'squat': 'Squat  ',
+    'pushup': 'Pushup ',
+    'plank': 'Plank',
+    'lunges': 'Lunges ',
+    'jumping_jacks': 'Jumping Jacks ',
+    'situp': 'Situp ',
+    'high_knees': 'High Knees ',
+    'running': 'Running ',
+    'walking': 'Walking ',
+    'burpees': 'Burpees ',
+    'mountain_climbers': 'Mountain Climbers ',
+    'side_plank': 'Side Plank ',
+    'crunches': 'Crunches ',
+    'leg_raises': 'Leg Raises ',
+    'bicycle_crunches': 'Bicycle Crunches ',
+    'standing_knee_raises': 'Knee Raises ',
+    'wall_sit': 'Wall Sit ',
+    'glute_bridge': 'Glute Bridge ',
+    'jumping': 'Jumping ',
+    'star_jumps': 'Star Jumps ',
+    'squat_jumps': 'Squat Jumps '
+}
+
 class VideoProcessor:
-    def __init__(self):
+    def __init__(self, keypoint_cache=True):
+        """
+        Args:
+            keypoint_cache: a utils.keypoint_cache.KeypointCache, True for the
+                            default one, or None to always run the model
+        """
         self.temp_dir = tempfile.gettempdir()
+        self.overlay = OverlayRenderer()
+        self.keypoint_cache = KeypointCache() if keypoint_cache is True else keypoint_cache
+        self.upload_store = UploadStore()
         
     def save_uploaded_file(self, uploaded_file):
-        """Save uploaded file to uploads directory"""
+        """Save uploaded file to uploads directory, stored by content hash (see utils.upload_store)"""
         try:
-            upload_dir = Path("uploads")
-            upload_dir.mkdir(exist_ok=True)
-            
-            file_path = upload_dir / uploaded_file.name
-            with open(file_path, 'wb') as f:
-                f.write(uploaded_file.getbuffer())
-            
-            return str(file_path)
+            file_path, _ = self.upload_store.ingest(uploaded_file, uploaded_file.name)
+            return file_path
         except Exception as e:
             print(f"Error saving file: {e}")
             return None
@@ -37,69 +82,261 @@ class VideoProcessor:
         cap.release()
         return properties
     
-    def process_video_tfhub(self, video_path, tfhub_recognizer, exercise_analyzer, progress_callback=None):
-        """Process video with TFHub recognizer - Enhanced accuracy and professional overlay"""
-        cap = cv2.VideoCapture(video_path)
+    def auto_batch_size(self, width, height, memory_budget_mb=64, max_batch=16, tuned_batch=None):
+        """Pick how many decoded frames to hold per model call for this resolution
         
-        fps = int(cap.get(cv2.CAP_PROP_FPS))
-        width = int(cap.get(cv2.CAP_PROP_FRAME_WIDTH))
-        height = int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT))
-        total_frames = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
+        tuned_batch: the machine's fastest batch size from models.autotune, used
+                     as long as it fits the memory budget
+        """
+        frame_bytes = max(width * height * 3, 1)
+        batch_size = (memory_budget_mb * 1024 * 1024) // frame_bytes
+        if tuned_batch:
+            max_batch = tuned_batch
+        return int(max(1, min(max_batch, batch_size)))
+    
+    def _read_frames(self, cap, stride=1, retrieve_skipped=True, pool=None):
+        """Yield (frame, is_key, None) in order - every stride-th frame is a key frame for inference
         
-        output_dir = Path("outputs")
-        output_dir.mkdir(exist_ok=True)
+        Frames between key frames are only grabbed, not decoded to BGR, unless
+        retrieve_skipped is set because something downstream needs their pixels;
+        without it they come through as None. With a FramePool frames are
+        decoded into recycled buffers. The third item is the pre-scaled model
+        input, which only the PyAV decoder produces (see utils.av_decoder).
+        """
+        index = 0
+        while cap.isOpened():
+            is_key = index % stride == 0
+            buffer = pool.acquire() if pool is not None and (is_key or retrieve_skipped) else None
+            if is_key:
+                ret, frame = cap.read(buffer)
+            else:
+                ret, frame = cap.grab(), None
+                if ret and retrieve_skipped:
+                    ret, frame = cap.retrieve(buffer)
+            
+            if not ret:
+                if pool is not None:
+                    pool.release(buffer)
+                break
+            
+            yield frame, is_key, None
+            index += 1
+    
+    def _detect_frames(self, frames, tfhub_recognizer, batch_size, gate=None, first_index=0, stride=1):
+        """Yield (frame, detection) pairs in order, running the model on batches of key frames
         
-        output_filename = f"analyzed_{Path(video_path).stem}.mp4"
-        output_path = output_dir / output_filename
+        frames yields (frame, is_key, model_input); non-key frames pass through
+        with detection None. When the decoder supplied a model_input it goes to
+        the model (and the motion gate) instead of the full frame.
+        With a MotionGate, key frames where nothing moved reuse the previous
+        detection instead of going to the model. Each batch goes with the
+        source frame indices of its frames, counted from first_index.
         
-        fourcc = cv2.VideoWriter_fourcc(*'mp4v')
-        out = cv2.VideoWriter(str(output_path), fourcc, fps, (width, height))
+        At most batch_size * stride frames are buffered - the memory budget
+        auto_batch_size picked - so frames the gate holds back flush the
+        batch early instead of piling up while nothing moves.
+        """
+        max_pending = batch_size * max(stride, 1)
+        state = {'last': None, 'prepared': False}
+        pending, key_frames, key_indices = [], [], []
+        for index, (frame, is_key, model_input) in enumerate(frames, first_index):
+            image = frame if model_input is None else model_input
+            if is_key and gate is not None and not gate.needs_inference(image):
+                kind = 'hold'
+            else:
+                kind = 'infer' if is_key else 'skip'
+            
+            pending.append((frame, kind))
+            if kind == 'infer':
+                # Only frames queued for the model decide what kind of input the batch is
+                state['prepared'] = model_input is not None
+                key_frames.append(image)
+                key_indices.append(index)
+            
+            if len(key_frames) >= batch_size or len(pending) >= max_pending:
+                yield from self._flush_batch(pending, key_frames, key_indices, tfhub_recognizer, gate, state)
+                pending, key_frames, key_indices = [], [], []
         
-        analysis_data = {
-            'frames_analyzed': 0,
-            'frames_with_pose': 0,
-            'feedback_history': [],
-            'angle_history': []
-        }
+        if pending:
+            yield from self._flush_batch(pending, key_frames, key_indices, tfhub_recognizer, gate, state)
+    
+    def _flush_batch(self, pending, key_frames, key_indices, tfhub_recognizer, gate, state):
+        prepared = state['prepared']
+        if key_frames:
+            tfhub_recognizer.set_frame_indices(key_indices)
+        if len(key_frames) == 1:
+            detections = iter([tfhub_recognizer.detect_exercise(key_frames[0], prepared)])
+        else:
+            detections = iter(tfhub_recognizer.detect_exercise_batch(key_frames, prepared) if key_frames else [])
         
-        frame_count = 0
+        for frame, kind in pending:
+            if kind == 'infer':
+                detection = state['last'] = next(detections)
+                if gate is not None:
+                    gate.set_person(detection[2])
+            elif kind == 'hold':
+                detection = state['last'] or ('no_pose', 0.0, None, {})
+                gate.record_skip(detection[2] is not None)
+            else:
+                detection = None
+            
+            yield frame, detection
+    
+    def _interpolate_detections(self, detections, tfhub_recognizer):
+        """Fill in detections for skipped frames by interpolating keypoints between key frames"""
+        previous = None
+        skipped = []
+        for frame, detection in detections:
+            if detection is None:
+                skipped.append(frame)
+                continue
+            
+            yield from self._fill_skipped(skipped, previous, detection, tfhub_recognizer)
+            skipped = []
+            previous = detection
+            yield frame, detection
         
-        # Exercise names for display
-        exercise_names = {
-            'squat': 'Squat  ',
-            'pushup': 'Pushup ',
-            'plank': 'Plank',
-            'lunges': 'Lunges ',
-            'jumping_jacks': 'Jumping Jacks ',
-            'situp': 'Situp ',
-            'high_knees': 'High Knees ',
-            'running': 'Running ',
-            'walking': 'Walking ',
-            'burpees': 'Burpees ',
-            'mountain_climbers': 'Mountain Climbers ',
-            'side_plank': 'Side Plank ',
-            'crunches': 'Crunches ',
-            'leg_raises': 'Leg Raises ',
-            'bicycle_crunches': 'Bicycle Crunches ',
-            'standing_knee_raises': 'Knee Raises ',
-            'wall_sit': 'Wall Sit ',
-            'glute_bridge': 'Glute Bridge ',
-            'jumping': 'Jumping ',
-            'star_jumps': 'Star Jumps ',
-            'squat_jumps': 'Squat Jumps '
-        }
+        # Frames after the last key frame hold its keypoints
+        yield from self._fill_skipped(skipped, previous, None, tfhub_recognizer)
+    
+    def _fill_skipped(self, skipped, before, after, tfhub_recognizer):
+        for i, frame in enumerate(skipped, 1):
+            t = i / (len(skipped) + 1)
+            yield frame, self._interpolate_detection(before, after, t, tfhub_recognizer)
+    
+    def _interpolate_detection(self, before, after, t, tfhub_recognizer):
+        """Linear keypoint interpolation between two key-frame detections at fraction t"""
+        keypoints_before = before[2] if before is not None else None
+        keypoints_after = after[2] if after is not None else None
         
-        selected_exercise = exercise_names.get(exercise_analyzer.exercise_type, exercise_analyzer.exercise_type)
+        if keypoints_before is None and keypoints_after is None:
+            return 'unknown', 0.0, None, {}
         
-        while cap.isOpened():
-            ret, frame = cap.read()
+        if keypoints_before is None:
+            keypoints = keypoints_after
+        elif keypoints_after is None:
+            keypoints = keypoints_before
+        else:
+            keypoints = (1 - t) * keypoints_before + t * keypoints_after
+        
+        exercise, confidence = (before if before is not None else after)[:2]
+        return exercise, confidence, keypoints, tfhub_recognizer.calculate_angles(keypoints)
+    
+    def _keypoint_cache_key(self, video_path, tfhub_recognizer, stride, motion_gate, decoder):
+        """Keypoint cache key of a run, or None without a cache - call after set_exercise()"""
+        if self.keypoint_cache is None:
+            return None
+        
+        settings = dict(tfhub_recognizer.cache_settings(), stride=stride,
+                        motion_gate=motion_gate.settings() if motion_gate else None,
+                        # Prepared (decoder-scaled) model input differs slightly from cv2.resize
+                        prepared=decoder == 'pyav' and av_available() and tfhub_recognizer.accepts_prepared())
+        try:
+            return self.keypoint_cache.key(video_path, settings)
+        except OSError as e:
+            print(f"Keypoint cache disabled for {video_path}: {e}")
+            return None
+    
+    def _cached_detections(self, frames, keypoints, tfhub_recognizer):
+        """Yield (frame, detection) pairs from cached keypoints; frames None yields frame None"""
+        if frames is None:
+            frames = ((None, True, None) for _ in range(len(keypoints)))
+        for (frame, _, _), frame_keypoints in zip(frames, cached_keypoints(keypoints)):
+            yield frame, tfhub_recognizer.detection_from_cached(frame_keypoints)
+    
+    def _collect_keypoints(self, detections, collected):
+        """Pass detections through, appending each frame's keypoints (None without a pose) to collected"""
+        for frame, detection in detections:
+            collected['keypoints'].append(detection[2])
+            if detection[0] == 'error':
+                collected['errors'] += 1
+            yield frame, detection
+    
+    def _store_keypoints(self, cache_key, collected, frame_count):
+        """Cache a complete, error-free run's keypoints"""
+        keypoints = collected['keypoints']
+        if collected['errors'] or not frame_count or len(keypoints) != frame_count:
+            return
+        try:
+            self.keypoint_cache.save(cache_key, keypoints)
+        except OSError as e:
+            print(f"Could not write keypoint cache: {e}")
+    
+    def _render_overlay(self, frame, keypoints, feedback, selected_exercise):
+        """Draw skeleton and professional overlay on a frame, in place"""
+        overlay = self.overlay
+        shadow = (2, 2, (0, 0, 0), 3)
+        if keypoints is None:
+            # No pose detected overlay
+            overlay.banner(frame, 0, 70, (239, 68, 68), 0.7)
             
-            if not ret:
-                break
+            overlay.text(frame, "× No Pose Detected", (25, 45),
+                         cv2.FONT_HERSHEY_DUPLEX, 0.9, (255, 255, 255), 2, shadow=shadow)
+            return frame
+        
+        # Draw keypoints
+        frame = overlay.skeleton(frame, keypoints)
+        
+        # Semi-transparent background
+        overlay.banner(frame, 0, 200, (0, 0, 0), 0.7)
+        
+        y_offset = 40
+        
+        # Exercise name with shadow effect - one cached sprite for all three layers
+        overlay.layered_text(frame, selected_exercise, (20, y_offset), cv2.FONT_HERSHEY_DUPLEX, 0.9,
+                             [shadow, (0, 0, (102, 126, 234), 2), (0, 0, (255, 255, 255), 1)])
+        y_offset += 50
+        
+        # Feedback with icons and colors
+        for key, message in feedback.items():
+            if key in ['reps']:
+                continue
             
-            # Detect with TFHub
-            exercise, confidence, keypoints, angles = tfhub_recognizer.detect_exercise(frame)
+            if "Perfect" in message or "Good" in message or "Excellent" in message:
+                color = (16, 185, 129)  # Green
+                icon = "✓"
+            elif "Watch" in message or "Adjust" in message or "Keep" in message:
+                color = (245, 158, 11)  # Orange
+                icon = "!"
+            else:
+                color = (239, 68, 68)  # Red
+                icon = "×"
+            
+            # Draw icon
+            overlay.text(frame, icon, (25, y_offset),
+                         cv2.FONT_HERSHEY_SIMPLEX, 0.7, color, 3)
             
+            # Draw message with shadow
+            overlay.text(frame, message, (60, y_offset),
+                         cv2.FONT_HERSHEY_SIMPLEX, 0.65, (255, 255, 255), 2, shadow=shadow)
+            y_offset += 35
+        
+        # Rep counter with background box
+        if 'reps' in feedback:
+            rep_text = feedback['reps']
+            
+            # Get text size
+            text_size = overlay.text_size(rep_text, cv2.FONT_HERSHEY_DUPLEX, 1.0, 2)
+            box_width = text_size[0] + 30
+            
+            # Draw box with gradient effect
+            cv2.rectangle(frame, (15, y_offset - 30), (15 + box_width, y_offset + 10),
+                         (102, 126, 234), -1)
+            cv2.rectangle(frame, (15, y_offset - 30), (15 + box_width, y_offset + 10),
+                         (255, 255, 255), 2)
+            
+            # Draw rep text
+            overlay.text(frame, rep_text, (27, y_offset - 5),
+                         cv2.FONT_HERSHEY_DUPLEX, 1.0, (255, 255, 255), 2)
+        
+        return frame
+    
+    def _analyze_frames(self, detections, exercise_analyzer, analysis_data, recorder=None):
+        """Run the exercise analyzer on each detection, yielding (frame, keypoints, feedback) in order
+        
+        recorder: a utils.analysis_store.AnalysisRecorder that keeps every frame's result
+        """
+        for frame, (exercise, confidence, keypoints, angles) in detections:
             if keypoints is not None and angles:
                 analysis_data['frames_with_pose'] += 1
                 
@@ -108,93 +345,620 @@ class VideoProcessor:
                 
                 analysis_data['feedback_history'].append(feedback)
                 analysis_data['angle_history'].append(angles)
-                
-                # Draw keypoints
-                frame = tfhub_recognizer.draw_keypoints(frame, keypoints)
-                
-                # Professional overlay
-                h, w = frame.shape[:2]
-                
-                # Semi-transparent background
-                overlay = frame.copy()
-                cv2.rectangle(overlay, (0, 0), (w, 200), (0, 0, 0), -1)
-                cv2.addWeighted(overlay, 0.7, frame, 0.3, 0, frame)
-                
-                y_offset = 40
-                
-                # Exercise name with shadow effect
-                cv2.putText(frame, selected_exercise, (22, y_offset + 2),
-                           cv2.FONT_HERSHEY_DUPLEX, 0.9, (0, 0, 0), 3, cv2.LINE_AA)
-                cv2.putText(frame, selected_exercise, (20, y_offset),
-                           cv2.FONT_HERSHEY_DUPLEX, 0.9, (102, 126, 234), 2, cv2.LINE_AA)
-                cv2.putText(frame, selected_exercise, (20, y_offset),
-                           cv2.FONT_HERSHEY_DUPLEX, 0.9, (255, 255, 255), 1, cv2.LINE_AA)
-                y_offset += 50
-                
-                # Feedback with icons and colors
-                for key, message in feedback.items():
-                    if key in ['reps']:
-                        continue
-                    
-                    if "Perfect" in message or "Good" in message or "Excellent" in message:
-                        color = (16, 185, 129)  # Green
-                        icon = "✓"
-                    elif "Watch" in message or "Adjust" in message or "Keep" in message:
-                        color = (245, 158, 11)  # Orange
-                        icon = "!"
-                    else:
-                        color = (239, 68, 68)  # Red
-                        icon = "×"
-                    
-                    # Draw icon
-                    cv2.putText(frame, icon, (25, y_offset),
-                               cv2.FONT_HERSHEY_SIMPLEX, 0.7, color, 3, cv2.LINE_AA)
-                    
-                    # Draw message with shadow
-                    cv2.putText(frame, message, (62, y_offset + 2),
-                               cv2.FONT_HERSHEY_SIMPLEX, 0.65, (0, 0, 0), 3, cv2.LINE_AA)
-                    cv2.putText(frame, message, (60, y_offset),
-                               cv2.FONT_HERSHEY_SIMPLEX, 0.65, (255, 255, 255), 2, cv2.LINE_AA)
-                    y_offset += 35
-                
-                # Rep counter with background box
-                if 'reps' in feedback:
-                    rep_text = feedback['reps']
-                    
-                    # Get text size
-                    text_size = cv2.getTextSize(rep_text, cv2.FONT_HERSHEY_DUPLEX, 1.0, 2)[0]
-                    box_width = text_size[0] + 30
-                    
-                    # Draw box with gradient effect
-                    cv2.rectangle(frame, (15, y_offset - 30), (15 + box_width, y_offset + 10),
-                                 (102, 126, 234), -1)
-                    cv2.rectangle(frame, (15, y_offset - 30), (15 + box_width, y_offset + 10),
-                                 (255, 255, 255), 2)
-                    
-                    # Draw rep text
-                    cv2.putText(frame, rep_text, (27, y_offset - 5),
-                               cv2.FONT_HERSHEY_DUPLEX, 1.0, (255, 255, 255), 2, cv2.LINE_AA)
             else:
-                # No pose detected overlay
-                overlay = frame.copy()
-                cv2.rectangle(overlay, (0, 0), (w, 70), (239, 68, 68), -1)
-                cv2.addWeighted(overlay, 0.7, frame, 0.3, 0, frame)
-                
-                cv2.putText(frame, "× No Pose Detected", (27, 47),
-                           cv2.FONT_HERSHEY_DUPLEX, 0.9, (0, 0, 0), 3, cv2.LINE_AA)
-                cv2.putText(frame, "× No Pose Detected", (25, 45),
-                           cv2.FONT_HERSHEY_DUPLEX, 0.9, (255, 255, 255), 2, cv2.LINE_AA)
+                keypoints, angles, feedback = None, {}, {}
+            
+            if recorder is not None:
+                recorder.add(keypoints, angles, feedback)
             
+            yield frame, keypoints, feedback
+    
+    def _render_frames(self, analyzed, selected_exercise):
+        """Yield annotated frames for a stream of (frame, keypoints, feedback)"""
+        for frame, keypoints, feedback in analyzed:
+            yield self._render_overlay(frame, keypoints, feedback, selected_exercise)
+    
+    def _write_frames(self, frames, out, pool=None):
+        """Encode frames to the output video, yielding once per written frame"""
+        for frame in frames:
             out.write(frame)
-            analysis_data['frames_analyzed'] += 1
+            if pool is not None:
+                pool.release(frame)
+            yield
+    
+    def _drain(self, written, total_frames, progress_callback, probe=None):
+        """Consume the written-frame stream, reporting progress from the calling thread"""
+        frame_count = 0
+        if probe is not None:
+            probe.begin_frame()
+        for _ in written:
             frame_count += 1
+            if probe is not None:
+                probe.end_frame()
+                probe.begin_frame()
             
             if progress_callback:
                 progress = int((frame_count / total_frames) * 100)
                 progress_callback(progress)
         
+        return frame_count
+    
+    def _open_capture(self, video_path, budget=None):
+        """cv2.VideoCapture limited to the budget's decoder threads (OpenCV 4.6+ with FFmpeg)"""
+        threads = budget['decoder_threads'] if budget else None
+        if threads and hasattr(cv2, 'CAP_PROP_N_THREADS'):
+            return cv2.VideoCapture(str(video_path), cv2.CAP_ANY, [cv2.CAP_PROP_N_THREADS, threads])
+        return cv2.VideoCapture(str(video_path))
+    
+    def _open_av_reader(self, video_path, tfhub_recognizer, full_frames, budget=None):
+        """PyAV reader for video_path, or None to decode with OpenCV
+        
+        Key frames come pre-scaled to the model input when the recognizer's
+        backend accepts that (not with person tracking, which crops the full frame).
+        """
+        if not av_available():
+            print("PyAV not installed - decoding with OpenCV")
+            return None
+        
+        model_size = tfhub_recognizer.input_size if tfhub_recognizer.accepts_prepared() else None
+        return AVFrameReader(video_path, model_size=model_size, full_frames=full_frames,
+                             thread_count=budget['decoder_threads'] if budget else 0)
+    
+    def process_video_tfhub(self, video_path, tfhub_recognizer, exercise_analyzer, progress_callback=None,
+                            batch_size=None, pipelined=False, queue_size=8, stride=1, compare_dense=False,
+                            motion_gate=None, reuse_buffers=True, measure_allocations=False, decoder='cv2',
+                            output_profile=DEFAULT_OUTPUT_PROFILE, budget=None, output_path=None):
+        """Process video with TFHub recognizer - Enhanced accuracy and professional overlay
+        
+        Args:
+            batch_size: frames per MoveNet call; None picks one from the video resolution,
+                        1 runs the original frame-by-frame path
+            pipelined: run decode, inference, render and encode as separate threads
+                       connected by bounded queues of queue_size frames. Stage queue
+                       depth and stall times are returned in analysis_data['pipeline_stats'].
+                       progress_callback is still called from the calling thread.
+        
+        When the recognizer runs in cascade mode, escalation rate and blended
+        model cost per frame are returned in analysis_data['cascade'].
+        
+        stride: run MoveNet on every stride-th frame only and interpolate
+                keypoints for the frames in between. With compare_dense the
+                rep count is also checked against a dense analysis-only run
+                (see compare_decimation).
+        
+        motion_gate: a utils.motion_gate.MotionGate (or True for the defaults)
+                     that skips MoveNet on frames where nothing moved since
+                     the last inferred frame. Skip counts are returned in
+                     analysis_data['gate'], with compare_dense also the rep
+                     count of a dense run (see compare_motion_gate).
+        
+        reuse_buffers: decode into a pool of recycled frame buffers and draw the
+                       overlay in place, so the steady state allocates no frames
+        measure_allocations: trace Python-heap allocations per written frame
+                             into analysis_data['allocations'] (slows processing)
+        
+        decoder: 'cv2' or 'pyav' - PyAV decodes with FFmpeg frame/slice threading
+                 and has libswscale scale key frames straight to the model input
+                 in RGB, next to the full-resolution BGR frame the overlay is
+                 drawn on. Falls back to OpenCV when PyAV is not installed.
+        
+        output_profile: utils.av_encoder.OUTPUT_PROFILES name (or settings dict)
+                        for the annotated video - H.264 via PyAV at the profile's
+                        resolution, frame rate and quality. Encoder, size and
+                        encode time are returned in analysis_data['output'].
+        
+        budget: thread budget from utils.resource_governor ('decoder_threads',
+                'encoder_threads'); None lets the codecs use every core
+        
+        output_path: where to write the annotated video, default
+                     outputs/analyzed_<video name>.mp4
+        
+        Keypoints of a video analyzed before with the same model and settings
+        come from self.keypoint_cache - MoveNet does not run, frames are only
+        decoded to draw on. analysis_data['keypoint_cache'] is 'hit' or 'miss'.
+        """
+        cap = self._open_capture(video_path, budget)
+        
+        fps = cap.get(cv2.CAP_PROP_FPS)
+        width = int(cap.get(cv2.CAP_PROP_FRAME_WIDTH))
+        height = int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT))
+        total_frames = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
+        
+        if batch_size is None:
+            # Skipped frames are buffered alongside each batch of key frames
+            batch_size = max(1, self.auto_batch_size(width, height, tuned_batch=tfhub_recognizer.batch_size) // stride)
+        
+        tfhub_recognizer.reset()
+        tfhub_recognizer.set_exercise(exercise_analyzer.exercise_type)
+        
+        if motion_gate is True:
+            motion_gate = MotionGate()
+        if motion_gate:
+            motion_gate.reset()
+        
+        cache_key = self._keypoint_cache_key(video_path, tfhub_recognizer, stride, motion_gate, decoder)
+        cached = self.keypoint_cache.load(cache_key) if cache_key else None
+        collected = {'keypoints': [], 'errors': 0}
+        
+        # Cached keypoints need plain full frames, which OpenCV decodes just as well
+        reader = None
+        if decoder == 'pyav' and cached is None:
+            reader = self._open_av_reader(video_path, tfhub_recognizer, full_frames=True, budget=budget)
+        if reader is not None:
+            cap.release()
+        
+        # PyAV hands out its own arrays, so only the OpenCV path pools buffers
+        pool = FramePool((height, width, 3)) if reuse_buffers and reader is None else None
+        probe = AllocationProbe() if measure_allocations else None
+        if probe is not None:
+            probe.start()
+        
+        if output_path is None:
+            output_dir = Path("outputs")
+            output_dir.mkdir(exist_ok=True)
+            
+            output_filename = f"analyzed_{Path(video_path).stem}.mp4"
+            output_path = output_dir / output_filename
+        else:
+            output_path = Path(output_path)
+            output_path.parent.mkdir(parents=True, exist_ok=True)
+        
+        out = open_video_writer(output_path, width, height, fps, output_profile,
+                                threads=budget['encoder_threads'] if budget else 0)
+        
+        analysis_data = {
+            'frames_analyzed': 0,
+            'frames_with_pose': 0,
+            'feedback_history': [],
+            'angle_history': [],
+            'batch_size': batch_size,
+            'stride': stride,
+            'decoder': 'pyav' if reader is not None else 'cv2'
+        }
+        if cache_key:
+            analysis_data['keypoint_cache'] = 'hit' if cached is not None else 'miss'
+        
+        selected_exercise = EXERCISE_DISPLAY_NAMES.get(exercise_analyzer.exercise_type, exercise_analyzer.exercise_type)
+        
+        def detect(frames):
+            if cached is not None:
+                return self._cached_detections(frames, cached, tfhub_recognizer)
+            detections = self._detect_frames(frames, tfhub_recognizer, batch_size, motion_gate, stride=stride)
+            if stride > 1:
+                detections = self._interpolate_detections(detections, tfhub_recognizer)
+            if cache_key:
+                detections = self._collect_keypoints(detections, collected)
+            return detections
+        
+        if cached is not None:
+            frames = self._read_frames(cap, pool=pool)
+        else:
+            frames = reader.frames(stride) if reader is not None else self._read_frames(cap, stride, pool=pool)
+        if pipelined:
+            stages = []
+            try:
+                stages.append(PipelineStage('decode', frames, queue_size))
+                detections = detect(stages[-1])
+                stages.append(PipelineStage('inference', detections, queue_size))
+                analyzed = self._analyze_frames(stages[-1], exercise_analyzer, analysis_data)
+                stages.append(PipelineStage('render', self._render_frames(analyzed, selected_exercise), queue_size))
+                stages.append(PipelineStage('encode', self._write_frames(stages[-1], out, pool), queue_size))
+                frame_count = self._drain(stages[-1], total_frames, progress_callback, probe)
+            finally:
+                for stage in stages:
+                    stage.close()
+            analysis_data['pipeline_stats'] = {stage.name: stage.stats() for stage in stages}
+        else:
+            analyzed = self._analyze_frames(detect(frames), exercise_analyzer, analysis_data)
+            rendered = self._render_frames(analyzed, selected_exercise)
+            frame_count = self._drain(self._write_frames(rendered, out, pool), total_frames, progress_callback, probe)
+        
+        if cache_key and cached is None:
+            self._store_keypoints(cache_key, collected, frame_count)
+        
+        cap.release()
+        if reader is not None:
+            reader.close()
+        out.release()
+        
+        analysis_data['output'] = writer_stats(out, output_path)
+        analysis_data['frames_analyzed'] = frame_count
+        analysis_data['cascade'] = tfhub_recognizer.get_cascade_stats()
+        if motion_gate and cached is None:
+            analysis_data['gate'] = motion_gate.get_stats()
+            if compare_dense:
+                analysis_data['gate']['dense_comparison'] = self.compare_motion_gate(
+                    video_path, tfhub_recognizer, exercise_analyzer.exercise_type,
+                    MotionGate(**motion_gate.settings()), batch_size
+                )
+        if pool is not None:
+            analysis_data['frame_buffers_allocated'] = pool.allocated
+        if probe is not None:
+            probe.stop()
+            analysis_data['allocations'] = probe.get_stats()
+        backend_stats = tfhub_recognizer.get_backend_stats()
+        if 'tracking' in backend_stats:
+            analysis_data['tracking'] = backend_stats['tracking']
+        analysis_data['summary'] = exercise_analyzer.get_summary()
+        analysis_data['total_frames'] = total_frames
+        analysis_data['detection_rate'] = (analysis_data['frames_with_pose'] / max(analysis_data['frames_analyzed'], 1)) * 100
+        
+        if stride > 1 and cached is None:
+            frames_inferred = -(-frame_count // stride)
+            analysis_data['decimation'] = {
+                'stride': stride,
+                'frames_inferred': frames_inferred,
+                'frames_interpolated': frame_count - frames_inferred
+            }
+            if compare_dense:
+                analysis_data['decimation']['dense_comparison'] = self.compare_decimation(
+                    video_path, tfhub_recognizer, exercise_analyzer.exercise_type, stride, batch_size
+                )
+        
+        return str(output_path), analysis_data
+    
+    def _analyze_only(self, video_path, tfhub_recognizer, exercise_analyzer, stride=1, batch_size=None, decoder='cv2',
+                      motion_gate=None, recorder=None, progress_callback=None, budget=None, use_cache=False):
+        """Run inference and analysis without rendering - skipped frames are never retrieved
+        
+        With decoder='pyav' no full-resolution frame is converted at all when the
+        backend takes model-size input.
+        
+        use_cache: take the keypoints from self.keypoint_cache when it has them -
+                   then no frame is decoded - and store them there otherwise
+        """
+        cap = self._open_capture(video_path, budget)
+        total_frames = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
+        
+        if batch_size is None:
+            width = int(cap.get(cv2.CAP_PROP_FRAME_WIDTH))
+            height = int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT))
+            batch_size = max(1, self.auto_batch_size(width, height, tuned_batch=tfhub_recognizer.batch_size) // stride)
+        
+        tfhub_recognizer.reset()
+        tfhub_recognizer.set_exercise(exercise_analyzer.exercise_type)
+        
+        analysis_data = {
+            'frames_analyzed': 0,
+            'frames_with_pose': 0,
+            'feedback_history': [],
+            'angle_history': []
+        }
+        
+        cache_key = self._keypoint_cache_key(video_path, tfhub_recognizer, stride, motion_gate, decoder) if use_cache else None
+        cached = self.keypoint_cache.load(cache_key) if cache_key else None
+        collected = {'keypoints': [], 'errors': 0}
+        if cache_key:
+            analysis_data['keypoint_cache'] = 'hit' if cached is not None else 'miss'
+        
+        reader = None
+        pool = None
+        if cached is not None:
+            detections = self._cached_detections(None, cached, tfhub_recognizer)
+        else:
+            reader = self._open_av_reader(video_path, tfhub_recognizer, full_frames=False, budget=budget) if decoder == 'pyav' else None
+            if reader is not None:
+                frames = reader.frames(stride, retrieve_skipped=False)
+            else:
+                pool = FramePool((int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT)), int(cap.get(cv2.CAP_PROP_FRAME_WIDTH)), 3))
+                frames = self._read_frames(cap, stride, retrieve_skipped=False, pool=pool)
+            detections = self._detect_frames(frames, tfhub_recognizer, batch_size, motion_gate, stride=stride)
+            if stride > 1:
+                detections = self._interpolate_detections(detections, tfhub_recognizer)
+            if cache_key:
+                detections = self._collect_keypoints(detections, collected)
+        
+        def release(analyzed):
+            for frame, _, _ in analyzed:
+                if pool is not None:
+                    pool.release(frame)
+                yield
+        
+        analyzed = self._analyze_frames(detections, exercise_analyzer, analysis_data, recorder)
+        analysis_data['frames_analyzed'] = self._drain(release(analyzed), max(total_frames, 1), progress_callback)
+        if cache_key and cached is None:
+            self._store_keypoints(cache_key, collected, analysis_data['frames_analyzed'])
+        
+        cap.release()
+        if reader is not None:
+            reader.close()
+        
+        analysis_data['summary'] = exercise_analyzer.get_summary()
+        return analysis_data
+    
+    def analyze_video(self, video_path, tfhub_recognizer, exercise_analyzer, progress_callback=None,
+                      batch_size=None, stride=1, motion_gate=None, decoder='cv2', analysis_path=None, budget=None):
+        """Analysis-only mode: count reps and check form without drawing or encoding anything
+        
+        Keypoints, joint angles and feedback of every frame are saved with the
+        summary (see utils.analysis_store), so render_analysis can produce the
+        annotated video - all of it or a time range - later without running
+        the model again. Arguments are as for process_video_tfhub; keypoints
+        cached by an earlier run of the video skip decoding and the model.
+        
+        Returns:
+            (analysis_path, analysis_data) - analysis_data as from process_video_tfhub
+        """
+        cap = cv2.VideoCapture(video_path)
+        video = {
+            'video_path': str(video_path),
+            'fps': cap.get(cv2.CAP_PROP_FPS),
+            'width': int(cap.get(cv2.CAP_PROP_FRAME_WIDTH)),
+            'height': int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT))
+        }
+        total_frames = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
+        cap.release()
+        
+        if motion_gate is True:
+            motion_gate = MotionGate()
+        if motion_gate:
+            motion_gate.reset()
+        
+        if analysis_path is None:
+            output_dir = Path("outputs")
+            output_dir.mkdir(exist_ok=True)
+            analysis_path = output_dir / f"analysis_{Path(video_path).stem}.pose"
+        
+        # Frames stream to disk as they are analyzed
+        recorder = AnalysisRecorder(analysis_path)
+        try:
+            analysis_data = self._analyze_only(video_path, tfhub_recognizer, exercise_analyzer, stride, batch_size,
+                                               decoder, motion_gate, recorder, progress_callback, budget,
+                                               use_cache=True)
+        except BaseException:
+            recorder.discard()
+            raise
+        
+        analysis_data['total_frames'] = total_frames
+        analysis_data['stride'] = stride
+        analysis_data['detection_rate'] = (analysis_data['frames_with_pose'] / max(analysis_data['frames_analyzed'], 1)) * 100
+        analysis_data['cascade'] = tfhub_recognizer.get_cascade_stats()
+        if motion_gate and analysis_data.get('keypoint_cache') != 'hit':
+            analysis_data['gate'] = motion_gate.get_stats()
+        
+        stored = {key: value for key, value in analysis_data.items()
+                  if key not in ('feedback_history', 'angle_history')}
+        recorder.save(dict(video, exercise_type=exercise_analyzer.exercise_type,
+                           variant=tfhub_recognizer.variant, analysis=stored))
+        analysis_data['analysis_path'] = str(analysis_path)
+        
+        return str(analysis_path), analysis_data
+    
+    def render_output_path(self, analysis, start_time=None, end_time=None, video_path=None):
+        """Where render_analysis writes a range by default: outputs/analyzed_<video name>[_<start>-<end>s].mp4"""
+        start, end = analysis.frame_range(start_time, end_time)
+        video_path = video_path or analysis.meta['video_path']
+        suffix = '' if (start, end) == (0, len(analysis)) else f"_{start / analysis.fps:.1f}-{end / analysis.fps:.1f}s"
+        return Path("outputs") / f"analyzed_{Path(video_path).stem}{suffix}.mp4"
+    
+    def render_analysis(self, analysis, start_time=None, end_time=None, output_profile=DEFAULT_OUTPUT_PROFILE,
+                        video_path=None, output_path=None, progress_callback=None, budget=None):
+        """Draw the annotated video from a stored analysis - no inference runs
+        
+        Args:
+            analysis: path written by analyze_video, or a loaded StoredAnalysis
+            start_time, end_time: range to render in seconds, default the whole video
+            video_path: source video, default the one that was analyzed
+            budget: thread budget from utils.resource_governor, as for process_video_tfhub
+        
+        Returns:
+            (output_path, output) - output as analysis_data['output'] of process_video_tfhub
+        """
+        opened = not isinstance(analysis, StoredAnalysis)
+        if opened:
+            analysis = load_analysis(analysis)
+        meta = analysis.meta
+        video_path = video_path or meta['video_path']
+        start, end = analysis.frame_range(start_time, end_time)
+        
+        if output_path is None:
+            output_path = self.render_output_path(analysis, start_time, end_time, video_path)
+        output_path = Path(output_path)
+        output_path.parent.mkdir(parents=True, exist_ok=True)
+        
+        cap = self._open_capture(video_path, budget)
+        # Land exactly on the range start - a frame off would draw each frame's
+        # keypoints on a neighbouring frame
+        seek_frame(cap, start)
+        
+        pool = FramePool((meta['height'], meta['width'], 3))
+        out = open_video_writer(output_path, meta['width'], meta['height'], analysis.fps, output_profile,
+                                threads=budget['encoder_threads'] if budget else 0)
+        selected_exercise = EXERCISE_DISPLAY_NAMES.get(meta['exercise_type'], meta['exercise_type'])
+        
+        analyzed = (
+            (frame, keypoints, feedback)
+            for (frame, _, _), (keypoints, feedback) in zip(self._read_frames(cap, pool=pool),
+                                                            analysis.frame_results(start, end))
+        )
+        written = self._write_frames(self._render_frames(analyzed, selected_exercise), out, pool)
+        self._drain(written, max(end - start, 1), progress_callback)
+        
         cap.release()
         out.release()
+        if opened:
+            analysis.close()
+        
+        return str(output_path), writer_stats(out, output_path)
+    
+    def compare_decimation(self, video_path, tfhub_recognizer, exercise_type, stride, batch_size=None):
+        """Rep counts and timing of a stride-k decimated run against a dense run on the same video"""
+        results = {}
+        for name, run_stride in (('dense', 1), ('decimated', stride)):
+            start = time.perf_counter()
+            data = self._analyze_only(video_path, tfhub_recognizer, ExerciseAnalyzer(exercise_type),
+                                      run_stride, batch_size)
+            results[name] = {
+                'reps': data['summary']['total_reps'],
+                'time_s': time.perf_counter() - start
+            }
+        
+        return {
+            'stride': stride,
+            'dense_reps': results['dense']['reps'],
+            'decimated_reps': results['decimated']['reps'],
+            'rep_difference': results['decimated']['reps'] - results['dense']['reps'],
+            'dense_time_s': results['dense']['time_s'],
+            'decimated_time_s': results['decimated']['time_s'],
+            'speedup': results['dense']['time_s'] / max(results['decimated']['time_s'], 1e-6)
+        }
+    
+    def compare_motion_gate(self, video_path, tfhub_recognizer, exercise_type, motion_gate=None, batch_size=None):
+        """Rep counts and timing of a motion-gated run against a dense run on the same video
+        
+        Check a gate's thresholds with this before relying on them - a gate
+        that skips too eagerly holds the pose through slow reps and loses them.
+        """
+        motion_gate = motion_gate if isinstance(motion_gate, MotionGate) else MotionGate()
+        results = {}
+        for name, gate in (('dense', None), ('gated', motion_gate)):
+            if gate is not None:
+                gate.reset()
+            start = time.perf_counter()
+            data = self._analyze_only(video_path, tfhub_recognizer, ExerciseAnalyzer(exercise_type),
+                                      batch_size=batch_size, motion_gate=gate)
+            results[name] = {
+                'reps': data['summary']['total_reps'],
+                'time_s': time.perf_counter() - start
+            }
+        
+        return {
+            'settings': motion_gate.settings(),
+            'skip_rate': motion_gate.get_stats()['skip_rate'],
+            'dense_reps': results['dense']['reps'],
+            'gated_reps': results['gated']['reps'],
+            'rep_difference': results['gated']['reps'] - results['dense']['reps'],
+            'dense_time_s': results['dense']['time_s'],
+            'gated_time_s': results['gated']['time_s'],
+            'speedup': results['dense']['time_s'] / max(results['gated']['time_s'], 1e-6)
+        }
+    
+    def process_video_sharded(self, video_path, exercise_analyzer, progress_callback=None,
+                              num_workers=None, batch_size=None, variant='thunder',
+                              output_profile=DEFAULT_OUTPUT_PROFILE, recognizer_config=None):
+        """Process a long video across worker processes
+        
+        Pose inference runs on contiguous frame ranges in parallel, each worker
+        with its own recognizer. The analyzer then replays every frame in order
+        in this process - it is cheap next to inference and keeps rep_stage,
+        frame_buffer and cooldown_frames continuous across shard boundaries, so
+        rep counts match a serial run. Rendering is sharded again from the
+        stored keypoints and feedback, and the segments are joined into one MP4.
+        
+        variant selects the MoveNet model each worker loads from the model store.
+        recognizer_config, when given, replaces it: the TFHubExerciseRecognizer
+        arguments each worker builds its recognizer from - e.g. {'backend':
+        SyntheticPoseBackend()} for a model-free run, since the config is
+        pickled to the workers.
+        output_profile is applied to every rendered segment, as in process_video_tfhub.
+        
+        The frames each shard read are returned in analysis_data['shard_frames'].
+        Shards whose frames do not line up with a serial read - wrong count, or
+        a timestamp gap or overlap at a boundary - raise RuntimeError rather
+        than draw keypoints on the wrong frames.
+        
+        Returns the same (output_path, analysis_data) as process_video_tfhub.
+        """
+        props = self.get_video_properties(video_path)
+        total_frames = props['frame_count']
+        
+        num_workers = num_workers or default_num_workers()
+        ranges = split_frame_ranges(total_frames, num_workers)
+        threads_per_worker = max(1, default_num_workers() // len(ranges))
+        
+        recognizer_config = recognizer_config or {'variant': variant}
+        if batch_size is None:
+            backend = recognizer_config.get('backend')
+            tuned_batch = backend.batch_size if backend is not None else tuned_settings(
+                recognizer_config.get('variant') or preferred_variant()).get('batch_size')
+            batch_size = self.auto_batch_size(props['width'], props['height'], tuned_batch=tuned_batch)
+        
+        output_dir = Path("outputs")
+        output_dir.mkdir(exist_ok=True)
+        output_path = output_dir / f"analyzed_{Path(video_path).stem}.mp4"
+        
+        def report(done, start_pct, span_pct):
+            if progress_callback:
+                progress_callback(int(start_pct + span_pct * done / len(ranges)))
+        
+        ctx = multiprocessing.get_context('spawn')
+        with ProcessPoolExecutor(max_workers=len(ranges), mp_context=ctx) as pool:
+            # 1. Parallel pose inference
+            futures = [
+                pool.submit(infer_shard, video_path, start, end, batch_size, threads_per_worker,
+                            recognizer_config, exercise_analyzer.exercise_type)
+                for start, end in ranges
+            ]
+            shard_detections, shard_spans = [], []
+            for done, future in enumerate(futures, 1):
+                detections, span = future.result()
+                shard_detections.append(detections)
+                shard_spans.append(span)
+                report(done, 0, 70)
+            
+            # Keypoints of misaligned shards would be drawn on the wrong frames
+            shard_counts = [len(detections) for detections in shard_detections]
+            problems = check_shard_frames(ranges, shard_counts, shard_spans)
+            if problems:
+                raise RuntimeError(f"Sharded reads of {video_path} do not line up with a serial read "
+                                   f"({'; '.join(problems)}) - process it with process_video_tfhub")
+            
+            # 2. Serial analysis over the stitched keypoint stream
+            analysis_data = {
+                'frames_analyzed': 0,
+                'frames_with_pose': 0,
+                'feedback_history': [],
+                'angle_history': [],
+                'batch_size': batch_size,
+                'shards': len(ranges),
+                'shard_frames': shard_counts
+            }
+            shard_frames = []
+            for detections in shard_detections:
+                analyzed = self._analyze_frames(
+                    ((None, (None, 0.0, keypoints, angles)) for keypoints, angles in detections),
+                    exercise_analyzer, analysis_data
+                )
+                shard_frames.append([(keypoints, feedback) for _, keypoints, feedback in analyzed])
+                analysis_data['frames_analyzed'] += len(detections)
+            
+            # 3. Parallel rendering from stored results
+            selected_exercise = EXERCISE_DISPLAY_NAMES.get(exercise_analyzer.exercise_type, exercise_analyzer.exercise_type)
+            segment_dir = Path(tempfile.mkdtemp(prefix="segments_", dir=output_dir))
+            segment_files = [str(segment_dir / f"segment_{i:04d}.mp4") for i in range(len(ranges))]
+            # Finished segments wait under outputs/ until the concat - pinned so
+            # eviction for another session's job cannot delete one mid-run
+            storage = get_storage_manager()
+            pin_owner = f"shards-{segment_dir.name}"
+            storage.pin(pin_owner, segment_files)
+            futures = [
+                pool.submit(render_shard, video_path, start, end, frame_results,
+                            selected_exercise, segment_file, output_profile, threads_per_worker)
+                for (start, end), frame_results, segment_file in zip(ranges, shard_frames, segment_files)
+            ]
+            segment_paths, render_spans = [], []
+            for done, future in enumerate(futures, 1):
+                segment_path, span = future.result()
+                segment_paths.append(segment_path)
+                render_spans.append(span)
+                storage.pin(pin_owner, segment_files)  # renews the pin on long runs
+                report(done, 70, 25)
+        
+        try:
+            # Rendering must have read the frames inference did
+            for (start, _), inferred, rendered in zip(ranges, shard_spans, render_spans):
+                if inferred and rendered and abs(inferred['first_ms'] - rendered['first_ms']) > inferred['interval_ms'] / 2:
+                    raise RuntimeError(f"Rendering the shard at frame {start} of {video_path} started "
+                                       f"{rendered['first_ms'] - inferred['first_ms']:.1f} ms away from its inference")
+            concat_segments(segment_paths, output_path)
+        finally:
+            for path in segment_paths:
+                self.cleanup_temp_files(path)
+            segment_dir.rmdir()
+            storage.unpin(pin_owner)
+        
+        if progress_callback:
+            progress_callback(100)
         
         analysis_data['summary'] = exercise_analyzer.get_summary()
         analysis_data['total_frames'] = total_frames